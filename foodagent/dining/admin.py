@@ -1,6 +1,6 @@
 # dining/admin.py
 from django.contrib import admin
-from .models import Restaurant, Tag, MenuItem, Cart, CartItem, Order, OrderItem, EventLog
+from .models import Restaurant, Tag, MenuItem, Cart, CartItem, Order, OrderItem, EventLog, TasteProfile, RollupCheckpoint, RecommendationSlate, IntentCacheEntry, GeocodeCache, Place, PlaceCoverage
 admin.site.register(Restaurant)
 admin.site.register(Tag)
 admin.site.register(MenuItem)
@@ -8,4 +8,11 @@ admin.site.register(Cart)
 admin.site.register(CartItem)
 admin.site.register(Order)
 admin.site.register(OrderItem)
-admin.site.register(EventLog)
\ No newline at end of file
+admin.site.register(EventLog)
+admin.site.register(TasteProfile)
+admin.site.register(RollupCheckpoint)
+admin.site.register(RecommendationSlate)
+admin.site.register(IntentCacheEntry)
+admin.site.register(GeocodeCache)
+admin.site.register(Place)
+admin.site.register(PlaceCoverage)
\ No newline at end of file
@@ -1,26 +1,55 @@
 # dining/agent_graph.py
-import re
-from typing import List, Optional, TypedDict, Literal
+"""
+LLM tool-calling agent (AGENT_ENGINE = "graph").
+
+The graph and the chat model are built once per process. Tools run
+in-process against the DB: read-only calls from one LLM turn run in
+parallel, cart writes run in order against the request's cart, which
+graph_agent_events() binds through a context variable (the LLM never
+chooses whose cart it is). AGENT_MAX_ITERATIONS caps LLM turns per
+message to bound latency and token spend; a turn that hits the cap while
+still asking for tools gets one last tool-less call to write the reply.
+"""
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List, Optional, TypedDict
 from decimal import Decimal
-from django.db.models import Q
-from django.contrib.auth.models import AnonymousUser
 
-from .models import MenuItem, Cart, CartItem, Tag
-from .views import get_guest_token
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics, outbound
+from .cartops import apply_ops
+from .models import MenuItem, Cart, CartItem
+from .search import search_ids
 
 # --- LangChain/LangGraph ---
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI   # pip install langchain-openai
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 
 # Set your model env var: OPENAI_API_KEY
 LLM_MODEL = "gpt-4o-mini"  # or "gpt-4o" / any chat model you have
 
+SYSTEM_PROMPT = (
+    "You are a food ordering assistant. Use search_menu to find dishes and only add "
+    "items whose ids came from a search result. Use show_cart to check the cart. "
+    "Keep replies short."
+)
+
+# The cart tools act on, and the item ids added to it; set per request by graph_agent_events
+_current_cart: contextvars.ContextVar = contextvars.ContextVar("agent_cart", default=None)
+_added_ids: contextvars.ContextVar = contextvars.ContextVar("agent_added", default=None)
+
 # State the graph carries
 class AgentState(TypedDict):
-    messages: List[dict]           # [{"role":"user"/"assistant"/"tool","content":str}]
+    messages: Annotated[list, add_messages]
     actions_done: List[str]
-    cart_summary: Optional[dict]
+    iterations: int
 
 # ---- Tools (these run inside Django) ----
 @tool
@@ -32,75 +61,251 @@ def search_menu(query: str = "", diet: List[str] = [], features: List[str] = [],
     """
     qs = MenuItem.objects.filter(is_available=True)
     text = query.strip().lower()
+    ranked = None
     if text:
-        qs = qs.filter(Q(name__icontains=text) | Q(description__icontains=text) |
-                       Q(tags__name__icontains=text)).distinct()
+        # Full-text index does the matching + BM25 ranking; the ORM only applies filters
+        ranked = search_ids(text, limit=200)
+        qs = qs.filter(id__in=ranked)
     for d in diet:
         qs = qs.filter(tags__name__iexact=d)
     for f in features:
         qs = qs.filter(tags__name__iexact=f)
     if price_cap is not None:
         qs = qs.filter(price__lte=Decimal(str(price_cap)))
-    qs = qs.order_by("-popularity")[:8]
-    return [{"id": x.id, "name": x.name, "price": float(x.price)} for x in qs]
+    if ranked is None:
+        rows = list(qs.order_by("-popularity_score")[:8])
+    else:
+        pos = {iid: i for i, iid in enumerate(ranked)}
+        rows = sorted(qs, key=lambda x: pos[x.id])[:8]
+    return [{"id": x.id, "name": x.name, "price": float(x.price)} for x in rows]
 
 @tool
-def add_to_cart(item_id: int, qty: int = 1, user_is_auth: bool = False,
-                guest_token: str = "") -> str:
+def add_to_cart(item_id: int, qty: int = 1) -> str:
     """
-    Add a menu item to the active cart (user or guest).
+    Add a menu item to the customer's cart.
     """
-    try:
-        item = MenuItem.objects.get(id=item_id, is_available=True)
-    except MenuItem.DoesNotExist:
+    cart = _current_cart.get()
+    if cart is None:
+        return "No cart for this conversation."
+    qty = max(1, min(int(qty), 20))
+    result = apply_ops(cart, [{"op": "add", "menu_item": item_id, "qty": qty}])
+    if result["rejected"]:
         return "Item not found."
-    # Build or get cart
-    if user_is_auth:
-        # Will be replaced by the view passing the real user; we just use guest route if False
-        pass
-    # We'll bind the user/guest in the wrapper (see run_order_agent below)
-    return f"ADDED:{item_id}:{qty}"
+    added = _added_ids.get()
+    if added is not None:
+        added.append(int(item_id))
+    return f"Added {qty} x #{item_id}."
 
 @tool
 def show_cart() -> dict:
-    """Placeholder; the view injects a real summary after execution."""
-    return {"info": "cart will be summarized by server"}
+    """Current cart lines and total."""
+    cart = _current_cart.get()
+    if cart is None:
+        return {"items": [], "total": 0.0}
+    return cart_summary(cart)
 
 TOOLS = [search_menu, add_to_cart, show_cart]
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
+# Safe to run concurrently within one LLM turn; everything else runs in call order
+READ_ONLY_TOOLS = {"search_menu", "show_cart"}
+
+
+def cart_summary(cart: Cart) -> dict:
+    rows = CartItem.objects.filter(cart=cart).values_list("menu_item_id", "menu_item__name", "menu_item__price", "qty")
+    items = [{"id": iid, "name": name, "price": float(price), "qty": qty} for iid, name, price, qty in rows]
+    return {"items": items, "total": round(sum(i["price"] * i["qty"] for i in items), 2)}
+
+
+# --- Tool execution ---
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=getattr(settings, "AGENT_TOOL_WORKERS", 4),
+                                           thread_name_prefix="agent-tool")
+    return _pool
+
+def _invoke_tool(tc) -> ToolMessage:
+    fn = TOOLS_BY_NAME.get(tc["name"])
+    with metrics.timer(f"agent.tool.{tc['name']}"):
+        try:
+            out = fn.invoke(tc["args"]) if fn else f"Unknown tool {tc['name']}."
+        except Exception as e:
+            # Let the model see the failure and recover instead of killing the turn
+            out = f"Tool error: {e}"
+    content = out if isinstance(out, str) else json.dumps(out)
+    return ToolMessage(content=content, name=tc["name"], tool_call_id=tc["id"])
+
+def _invoke_in_thread(ctx, tc):
+    try:
+        return ctx.run(_invoke_tool, tc)
+    finally:
+        close_old_connections()
+
+def execute_tool_calls(tool_calls) -> list:
+    """
+    ToolMessages in the same order as tool_calls. Read-only calls ahead of
+    the first write run concurrently; from the first write on, everything
+    runs in call order, so [add_to_cart, show_cart] shows the added item.
+    """
+    results = [None] * len(tool_calls)
+    parallel = []
+    for i, tc in enumerate(tool_calls):
+        if tc["name"] not in READ_ONLY_TOOLS:
+            break
+        parallel.append(i)
+    if len(parallel) > 1:
+        pool = _get_pool()
+        # Each worker gets a copy of this context so it sees the bound cart
+        futures = {i: pool.submit(_invoke_in_thread, contextvars.copy_context(), tool_calls[i]) for i in parallel}
+    else:
+        futures = {}
+    for i, tc in enumerate(tool_calls):
+        if i not in futures:
+            results[i] = _invoke_tool(tc)
+    for i, fut in futures.items():
+        results[i] = fut.result()
+    return results
+
 
 # --- Build the graph ---
+def _max_iterations():
+    return getattr(settings, "AGENT_MAX_ITERATIONS", 4)
+
 def build_graph():
-    llm = ChatOpenAI(model=LLM_MODEL, temperature=0).bind_tools(TOOLS)
+    chat = ChatOpenAI(model=LLM_MODEL, temperature=0,
+                      base_url=getattr(settings, "OPENAI_BASE_URL", "") or None,
+                      api_key=getattr(settings, "OPENAI_API_KEY", "") or None,
+                      timeout=outbound.timeouts()[1],
+                      max_retries=getattr(settings, "OUTBOUND_RETRIES", 2))
+    llm = chat.bind_tools(TOOLS)
     graph = StateGraph(AgentState)
 
     def call_agent(state: AgentState):
-        msgs = state["messages"]
-        resp = llm.invoke(msgs)
-        # LangChain returns a message with .tool_calls if any
-        return {"messages": msgs + [resp]}
+        with metrics.timer("agent.llm"):
+            resp = llm.invoke(state["messages"])
+        return {"messages": [resp], "iterations": state.get("iterations", 0) + 1}
 
     def route(state: AgentState):
         last = state["messages"][-1]
         # If the LLM asked to call tools, go run them; else end.
         if getattr(last, "tool_calls", None):
+            if state.get("iterations", 0) >= _max_iterations():
+                metrics.incr("agent.iteration_cap")
+                return "wrap_up"
             return "tools"
         return END
 
+    def wrap_up(state: AgentState):
+        # Out of turns with tool calls still pending: drop them (an unanswered
+        # tool call is an API error) and have the model report what was done
+        done = ", ".join(state.get("actions_done", [])) or "none"
+        with metrics.timer("agent.llm"):
+            resp = chat.invoke([*state["messages"][:-1], SystemMessage(
+                f"Tool budget for this message is used up (actions taken: {done}). "
+                "Without calling tools, tell the user briefly what was done and what is left for them to ask."
+            )])
+        return {"messages": [resp]}
+
     def run_tools(state: AgentState):
-        last = state["messages"][-1]
-        actions_done = state.get("actions_done", [])
-        new_msgs = []
-        for tc in last.tool_calls:
-            name = tc["name"]
-            args = tc["args"]
-            # Tools run later in wrapper to attach user/guest context;
-            # here we just echo a placeholder tool result message.
-            new_msgs.append({"role": "tool", "name": name, "content": str(args)})
-        return {"messages": state["messages"] + new_msgs, "actions_done": actions_done}
+        calls = state["messages"][-1].tool_calls
+        done = list(state.get("actions_done", []))
+        done.extend(tc["name"] for tc in calls)
+        return {"messages": execute_tool_calls(calls), "actions_done": done}
 
     graph.add_node("agent", call_agent)
     graph.add_node("tools", run_tools)
+    graph.add_node("wrap_up", wrap_up)
     graph.set_entry_point("agent")
-    graph.add_conditional_edges("agent", route, {"tools":"tools", END: END})
+    graph.add_conditional_edges("agent", route, {"tools":"tools", "wrap_up": "wrap_up", END: END})
     graph.add_edge("tools", "agent")
-    return graph.compile()
\ No newline at end of file
+    graph.add_edge("wrap_up", END)
+    return graph.compile()
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """Compiled graph (and its LLM client), built once per process."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
+
+
+def _history(session) -> list:
+    """Summary + recent turns from memory.py, as chat messages."""
+    from .memory import build_context
+    kinds = {"system": SystemMessage, "user": HumanMessage, "assistant": AIMessage}
+    return [kinds[m["role"]](m["content"]) for m in build_context(session) if m["role"] in kinds]
+
+def _search_results(content) -> list:
+    try:
+        rows = json.loads(content)
+    except (TypeError, ValueError):
+        return []
+    return [r for r in rows if isinstance(r, dict) and "id" in r] if isinstance(rows, list) else []
+
+def graph_agent_events(request, message: str, session=None):
+    """
+    The graph agent as the same (event, data) steps as
+    agent_runner.order_agent_events: prefs -> suggestion* (search_menu hits,
+    as each tool turn finishes) -> cart -> login_required | checkout | error
+    (when something was added) -> follow_up. Wrap in remembered() to store
+    the exchange; with a session, earlier turns go into the prompt.
+    """
+    from .agent_runner import _get_or_create_cart_for_request, checkout_events
+    from .engine import hydrate
+    from .nlu import parse
+    from .serializers import MenuItemSerializer
+    yield "prefs", {"detected_prefs": parse(message).prefs()}
+
+    cart = _get_or_create_cart_for_request(request)
+    history = _history(session) if session is not None else []
+    added, shown, actions, reply = [], set(), [], ""
+    # Tools read the cart from this context; it never leaks into the caller's
+    ctx = contextvars.copy_context()
+    ctx.run(_current_cart.set, cart)
+    ctx.run(_added_ids.set, added)
+    steps = ctx.run(
+        get_graph().stream,
+        {"messages": [SystemMessage(SYSTEM_PROMPT), *history, HumanMessage(message)],
+         "actions_done": [], "iterations": 0},
+        # Backstop for the iteration cap: each turn is an agent + tools step, plus wrap_up
+        config={"recursion_limit": 2 * _max_iterations() + 2},
+        stream_mode="updates",
+    )
+    while True:
+        update = ctx.run(next, steps, None)
+        if update is None:
+            break
+        for node, out in update.items():
+            out = out or {}
+            actions = out.get("actions_done", actions)
+            for msg in out.get("messages", []):
+                if isinstance(msg, ToolMessage) and msg.name == "search_menu":
+                    ids = [r["id"] for r in _search_results(msg.content) if r["id"] not in shown]
+                    shown.update(ids)
+                    for m in hydrate(ids):
+                        yield "suggestion", MenuItemSerializer(m).data
+                elif isinstance(msg, AIMessage) and not msg.tool_calls and isinstance(msg.content, str):
+                    reply = msg.content
+
+    items = hydrate(list(dict.fromkeys(added)))
+    yield "cart", {"added": MenuItemSerializer(items, many=True).data, "cart": cart_summary(cart),
+                   "actions": actions}
+    if items:
+        yield from checkout_events(request, reply)
+    else:
+        yield "follow_up", {"follow_up": reply or "Done."}
+
+def run_graph_agent(request, message: str, session=None) -> dict:
+    """graph_agent_events() folded into one dict, like agent_runner.run_order_agent()."""
+    from .agent_runner import collect_events, remembered
+    return collect_events(remembered(session, message, graph_agent_events(request, message, session)))
@@ -4,8 +4,10 @@ from django.urls import reverse
 from urllib.parse import urlencode
 
 from .models import MenuItem, Cart, CartItem
-from .agent import parse_message, search_candidates, rank, is_order_intent
+from .agent import search_candidates, rank
+from .nlu import parse
 from .checkout import create_checkout_session_for_cart
+from .cartops import apply_ops
 
 def _get_or_create_cart_for_request(request):
     # if you already have a helper, you can reuse it; this is inline to avoid circular imports
@@ -18,17 +20,82 @@ def _get_or_create_cart_for_request(request):
     return cart
 
 def _add_items(cart, items: List[MenuItem], qty:int=1):
-    added = []
-    for m in items:
-        ci, created = CartItem.objects.get_or_create(cart=cart, menu_item=m, defaults={"qty": qty})
-        if not created:
-            ci.qty += qty
-            ci.save()
-        added.append(m)
-    return added
-
-def run_order_agent(request, message: str) -> Dict[str, Any]:
-    intents, prefs = parse_message(message)
+    # One batch for the whole order: constant queries however many items
+    apply_ops(cart, [{"op": "add", "menu_item": m.id, "qty": qty} for m in items])
+    return list(items)
+
+def remembered(session, message: str, events):
+    """
+    Pass events through, then store the user turn and the assistant's reply
+    (with the item ids it showed/added) in the session in one write.
+    """
+    if session is None:
+        yield from events
+        return
+    from .memory import append_turns
+    yield "session", {"conversation_id": session.id}
+    reply, payload = "", {}
+    for event, data in events:
+        if event == "suggestion":
+            payload.setdefault("suggestions", []).append(data["id"])
+        elif event == "cart":
+            payload.setdefault("added", []).extend(m["id"] for m in data.get("added", []))
+        elif event == "follow_up":
+            reply = data.get("follow_up", "")
+        yield event, data
+    append_turns(session, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply, "payload": payload or None},
+    ])
+
+
+def _resolve_ordinals(session, ordinals) -> List[MenuItem]:
+    """'the first two' -> the first two items the agent last suggested in this session."""
+    from .engine import hydrate
+    from .memory import last_suggestions
+    shown = last_suggestions(session) if session is not None else []
+    ids = []
+    for pos in ordinals:
+        if -len(shown) <= pos < len(shown):
+            ids.append(shown[pos])
+    return [m for m in hydrate(list(dict.fromkeys(ids))) if m.is_available]
+
+
+def suggest_events(message: str):
+    """Discovery only: yields ("prefs"|"suggestion"|"follow_up", data) as each piece is ready."""
+    from .serializers import MenuItemSerializer
+    parsed = parse(message)
+    prefs = parsed.prefs()
+    yield "prefs", {"detected_prefs": prefs}
+    picks = rank(search_candidates(prefs), prefs)
+    if not picks:
+        from .recommender import blended_recommendations
+        picks = blended_recommendations(n=8)
+    for m in picks:
+        yield "suggestion", MenuItemSerializer(m).data
+    yield "follow_up", {"follow_up": "Want to add one to your cart or refine (e.g., less spicy, under $12)?"}
+
+
+def order_agent_events(request, message: str, session=None):
+    """
+    The order agent as a sequence of (event, data) steps:
+    prefs -> suggestion* -> cart -> login_required | checkout | error -> follow_up.
+    Streamed as-is over SSE; run_order_agent() folds them into one dict.
+    With a session, "order the first two" refers to the last suggestions shown.
+    """
+    from .serializers import MenuItemSerializer
+    parsed = parse(message)  # one parse for the whole request
+    prefs = parsed.prefs()
+    yield "prefs", {"detected_prefs": prefs}
+
+    if parsed.ordinals:
+        to_add = _resolve_ordinals(session, parsed.ordinals)
+        if not to_add:
+            yield "follow_up", {"follow_up": "I'm not sure which items you mean. Ask for suggestions first, or order by #ID."}
+            return
+        yield from _order_items(request, to_add)
+        return
+
     candidates = search_candidates(prefs)
     picks = rank(candidates, prefs)  # list[MenuItem]
 
@@ -38,51 +105,62 @@ def run_order_agent(request, message: str) -> Dict[str, Any]:
         picks = blended_recommendations(user=request.user if request.user.is_authenticated else None, n=5)
 
     # --- Suggest mode (no order words) ---
-    if not is_order_intent(message):
+    if not parsed.is_order:
         # Return top suggestions only
-        from .serializers import MenuItemSerializer
-        data = MenuItemSerializer(picks[:6], many=True).data
-        return {
-            "detected_prefs": prefs,
-            "suggestions": data,
-            "follow_up": "Say 'order the first two' or 'order the spicy noodles' to add to cart."
-        }
+        for m in picks[:6]:
+            yield "suggestion", MenuItemSerializer(m).data
+        yield "follow_up", {"follow_up": "Say 'order the first two' or 'order the spicy noodles' to add to cart."}
+        return
 
     # --- Order mode ---
-    cart = _get_or_create_cart_for_request(request)
-
     # simple: add top 1–2 items (you can improve by parsing quantities/indices)
     to_add = picks[:2] if len(picks) >= 2 else picks[:1]
-    _add_items(cart, to_add, qty=1)
+    yield from _order_items(request, to_add)
+
 
+def _order_items(request, to_add: List[MenuItem]):
     from .serializers import MenuItemSerializer
-    added_data = MenuItemSerializer(to_add, many=True).data
+    cart = _get_or_create_cart_for_request(request)
+    _add_items(cart, to_add, qty=1)
+    yield "cart", {"added": MenuItemSerializer(to_add, many=True).data}
+    yield from checkout_events(request)
+
 
+def checkout_events(request, reply: str = ""):
+    """
+    After items were added: login_required | checkout | error, then follow_up
+    (reply if given, else a stock line). Shared by the rules and graph agents.
+    """
     # If not logged in: do NOT create Checkout; ask to sign in
     if not request.user.is_authenticated:
         login_url  = reverse("account_login") + "?" + urlencode({"next": "/cart/"})
         google_url = "/accounts/google/login/?" + urlencode({"process": "login", "next": "/cart/"})
-        return {
-            "added": added_data,
-            "follow_up": "I’ve added items to your cart. Please sign in to continue to payment.",
-            "require_login": True,
-            "login_url": login_url,
-            "google_login_url": google_url,
-        }
+        yield "login_required", {"require_login": True, "login_url": login_url, "google_login_url": google_url}
+        yield "follow_up", {"follow_up": reply or "I’ve added items to your cart. Please sign in to continue to payment."}
+        return
 
     # Logged in: create Stripe Checkout session and return url
     try:
         checkout_url, sid = create_checkout_session_for_cart(request, fulfillment="pickup")
-        return {
-            "added": added_data,
-            "follow_up": "Great choice! Opening checkout…",
-            "checkout_url": checkout_url,
-            "session_id": sid,
-        }
     except Exception as e:
         # Don’t break the chat flow if Stripe fails
-        return {
-            "added": added_data,
-            "error": str(e),
-            "follow_up": "Items added. You can review and pay from your cart."
-        }
\ No newline at end of file
+        yield "error", {"error": str(e)}
+        yield "follow_up", {"follow_up": reply or "Items added. You can review and pay from your cart."}
+        return
+    yield "checkout", {"checkout_url": checkout_url, "session_id": sid}
+    yield "follow_up", {"follow_up": reply or "Great choice! Opening checkout…"}
+
+
+def collect_events(events) -> Dict[str, Any]:
+    """Fold (event, data) steps into the single JSON body the non-streaming APIs return."""
+    out: Dict[str, Any] = {}
+    for event, data in events:
+        if event == "suggestion":
+            out.setdefault("suggestions", []).append(data)
+        else:
+            out.update(data)
+    return out
+
+
+def run_order_agent(request, message: str, session=None) -> Dict[str, Any]:
+    return collect_events(remembered(session, message, order_agent_events(request, message, session)))
@@ -0,0 +1,236 @@
+# dining/benchmark.py
+"""
+Offline replay harness for recommender strategies.
+
+Splits history at a cutoff: what each actor did before it becomes their
+profile, what they bought after it is the ground truth. Every registered
+strategy is called once per actor and measured for latency, DB queries per
+call and hit-rate@k. Register new engines with @strategy("name").
+
+Replaying history, the strategies must not see the answers: run(as_of=...)
+pins a recommender engine whose popularity comes from events before the
+cutoff only, and a co-occurrence model trained on that same slice.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.db import connection
+
+from . import cooccurrence, engine
+from .agent import rank, search_candidates
+from .engine import RecommenderEngine, get_engine
+from .models import EventLog, MenuItem, OrderItem
+from .popularity import _half_life_days
+from .recommender import (EVENT_WEIGHTS, TASTE_TOP_N, _decay_factor, _event_actor_key,
+                          blended_recommendations, content_based_from_tags, popularity_top_n)
+
+
+@dataclass
+class Actor:
+    key: str
+    history: list = field(default_factory=list)   # item ids before the cutoff, oldest first
+    tags: list = field(default_factory=list)      # top tags inferred from history only
+    targets: set = field(default_factory=set)     # item ids purchased after the cutoff
+
+
+# ---------- strategies ----------
+STRATEGIES = {}
+
+
+def strategy(name):
+    def deco(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return deco
+
+
+@strategy("popularity")
+def _popularity(actor, k):
+    return [m.id for m in popularity_top_n(k)]
+
+
+@strategy("tags")
+def _tags(actor, k):
+    return [m.id for m in content_based_from_tags(actor.tags, k)]
+
+
+@strategy("blended")
+def _blended(actor, k):
+    return [m.id for m in blended_recommendations(n=k, prefs=actor.tags)]
+
+
+@strategy("also_ordered")
+def _also_ordered(actor, k):
+    seeds = list(dict.fromkeys(reversed(actor.history)))[:20]
+    return [m.id for m in blended_recommendations(n=k, mode="also_ordered", seed_items=seeds, prefs=actor.tags)]
+
+
+@strategy("agent")
+def _agent(actor, k):
+    # The chat agent's path; inferred tags have no kind, and candidates match any of them
+    prefs = {"cuisine": [], "diet": [], "features": list(actor.tags), "price_cap": None, "allergens": []}
+    return [m.id for m in rank(search_candidates(prefs, k=k), prefs)][:k]
+
+
+# ---------- datasets ----------
+def _item_tags():
+    eng = get_engine()
+    names = {col: name for name, col in eng.tag_cols.items()}
+    m = eng.matrix.tocsr()
+    return {int(eng.item_ids[i]): [names[c] for c in m.indices[m.indptr[i]:m.indptr[i + 1]]]
+            for i in range(len(eng.item_ids))}
+
+
+def _infer_tags(events, item_tags):
+    counts = Counter()
+    for iid, etype in events:
+        for name in item_tags.get(iid, ()):
+            counts[name] += EVENT_WEIGHTS.get(etype, 1.0)
+    return [name for name, _ in counts.most_common(TASTE_TOP_N)]
+
+
+def history_split(cutoff=0.8):
+    """Event time at the `cutoff` quantile of EventLog, or None without events."""
+    total = EventLog.objects.count()
+    if not total:
+        return None
+    return EventLog.objects.order_by("ts").values_list("ts", flat=True)[min(total - 1, int(total * cutoff))]
+
+
+def actors_from_history(cutoff=0.8, max_actors=None, target_events=("buy",)) -> list[Actor]:
+    """Replay real EventLog/Order history split at the `cutoff` quantile of event time."""
+    split = history_split(cutoff)
+    if split is None:
+        return []
+    item_tags = _item_tags()
+
+    before = defaultdict(list)
+    targets = defaultdict(set)
+    rows = EventLog.objects.filter(menu_item__isnull=False).order_by("ts") \
+        .values_list("user_id", "guest_token", "menu_item_id", "event_type", "ts")
+    for user_id, guest, iid, etype, t in rows.iterator(chunk_size=5000):
+        key = _event_actor_key(user_id, guest)
+        if not key:
+            continue
+        if t < split:
+            before[key].append((iid, etype))
+        elif etype in target_events:
+            targets[key].add(iid)
+    # Completed orders are purchases too, even when no 'buy' event was logged
+    orders = OrderItem.objects.filter(order__created_at__gte=split, order__status="paid") \
+        .values_list("order__user_id", "order__guest_token", "menu_item_id")
+    for user_id, guest, iid in orders.iterator(chunk_size=5000):
+        key = _event_actor_key(user_id, guest)
+        if key:
+            targets[key].add(iid)
+
+    actors = [
+        Actor(key=key, history=[iid for iid, _ in before[key]],
+              tags=_infer_tags(before[key], item_tags), targets=targets[key])
+        for key in targets if before.get(key)
+    ]
+    return actors[:max_actors] if max_actors else actors
+
+
+def synthetic_actors(n=500, history_len=8, seed=0) -> list[Actor]:
+    """Actors with one favourite tag: history and (mostly) targets come from it."""
+    rng = random.Random(seed)
+    item_tags = _item_tags()
+    by_tag = defaultdict(list)
+    for iid, names in item_tags.items():
+        for name in names:
+            by_tag[name].append(iid)
+    tags = [t for t, ids in by_tag.items() if len(ids) >= 2]
+    all_ids = list(item_tags)
+    if not tags:
+        return []
+    actors = []
+    for i in range(n):
+        fav = rng.choice(tags)
+        pool = by_tag[fav]
+        history = [rng.choice(pool) for _ in range(history_len)]
+        target = rng.choice(pool) if rng.random() < 0.8 else rng.choice(all_ids)
+        events = [(iid, rng.choice(("view", "click", "add"))) for iid in history]
+        actors.append(Actor(key=f"s:{i}", history=history,
+                            tags=_infer_tags(events, item_tags), targets={target}))
+    return actors
+
+
+# ---------- state as of the cutoff ----------
+def engine_as_of(as_of) -> RecommenderEngine:
+    """The live engine with popularity replayed from the seeded prior and events before as_of."""
+    live = RecommenderEngine.build()
+    prior = dict(MenuItem.objects.values_list("id", "popularity"))
+    pop = np.array([prior.get(int(i), 0.0) for i in live.item_ids], dtype=np.float64)
+    hl = _half_life_days()
+    gains = defaultdict(float)
+    rows = EventLog.objects.filter(ts__lt=as_of, menu_item__isnull=False) \
+        .values_list("menu_item_id", "event_type", "ts")
+    for iid, etype, ts in rows.iterator(chunk_size=5000):
+        gains[iid] += EVENT_WEIGHTS.get(etype, 1.0) * _decay_factor(ts, as_of, hl)
+    if gains:
+        ids = np.array(list(gains), dtype=np.int64)
+        pos = np.searchsorted(live.item_ids, ids)
+        ok = pos < len(live.item_ids)
+        ok[ok] = live.item_ids[pos[ok]] == ids[ok]
+        pop[pos[ok]] += np.array(list(gains.values()))[ok]
+    return RecommenderEngine(live.item_ids, live.tag_cols, live.matrix, pop, live.available, live.prices)
+
+
+def cooccurrence_as_of(as_of) -> cooccurrence.CooccurrenceModel:
+    item_ids, matrix, _ = cooccurrence.fit(until=as_of)
+    return cooccurrence.CooccurrenceModel(item_ids, matrix, mtime=None)
+
+
+# ---------- runner ----------
+class _QueryCounter:
+    def __init__(self):
+        self.n = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.n += 1
+        return execute(sql, params, many, context)
+
+
+def run(actors, k=8, names=None, as_of=None) -> dict:
+    """
+    Per-strategy report. With as_of (replayed history), strategies see
+    popularity and co-occurrence built from events before it only.
+    """
+    names = names or list(STRATEGIES)
+    with ExitStack() as stack:
+        if as_of is not None:
+            stack.enter_context(engine.pinned(engine_as_of(as_of)))
+            stack.enter_context(cooccurrence.pinned(cooccurrence_as_of(as_of)))
+        return _run(actors, k, names)
+
+
+def _run(actors, k, names) -> dict:
+    report = {}
+    for name in names:
+        fn = STRATEGIES[name]
+        if actors:
+            fn(actors[0], k)  # warm caches / build engine outside the timings
+        lat, queries, hits = [], [], 0
+        for actor in actors:
+            qc = _QueryCounter()
+            with connection.execute_wrapper(qc):
+                t0 = time.perf_counter()
+                ids = fn(actor, k)
+                lat.append((time.perf_counter() - t0) * 1000)
+            queries.append(qc.n)
+            hits += bool(actor.targets.intersection(ids[:k]))
+        lat = np.array(lat) if lat else np.zeros(1)
+        report[name] = {
+            "calls": len(actors),
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+            "queries_per_call": round(float(np.mean(queries)), 2) if queries else 0.0,
+            f"hit_rate@{k}": round(hits / len(actors), 4) if actors else 0.0,
+        }
+    return report
@@ -7,10 +7,14 @@ from django.db import transaction
 from django.conf import settings
 import stripe
 
+from . import outbound
 from .models import Cart, CartItem, Order
 from .checkout import _get_or_create_cart  # reuse your helper
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+if getattr(settings, "STRIPE_API_BASE", ""):
+    stripe.api_base = settings.STRIPE_API_BASE  # e.g. the local fakes (dining/fakes.py)
+outbound.configure_stripe()
 
 def _get_customer_id(user):
     # Adjust to your app: user.profile.stripe_customer_id, or user.stripe_customer_id, etc.
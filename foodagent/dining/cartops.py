@@ -0,0 +1,105 @@
+# dining/cartops.py
+"""
+Batch cart mutations.
+
+apply_ops() takes any number of add/set/remove operations for one cart and
+applies them in a single transaction with a fixed number of queries,
+however many items are involved:
+
+    validate ids (1) -> delete (1) -> absolute upsert (1)
+    -> relative F() update (1) + insert missing rows (1) -> EventLog (1)
+
+It relies on the (cart, menu_item) unique constraint on CartItem.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Least
+
+from .models import CartItem, EventLog, MenuItem
+
+OPS = ("add", "set", "remove")
+MAX_QTY = 99
+MAX_ID = 2 ** 63 - 1   # SQLite/Postgres bigint; larger ids overflow the bind
+
+
+class CartOpError(ValueError):
+    """A malformed operation; nothing is applied."""
+
+
+def _normalize(ops):
+    """
+    Fold the ops into one final effect per menu item, in order:
+    {menu_item_id: ("delta", n) | ("abs", n)}; abs 0 means remove.
+    """
+    final = {}
+    for i, op in enumerate(ops):
+        kind = (op.get("op") or "add") if isinstance(op, dict) else None
+        if kind not in OPS:
+            raise CartOpError(f"op {i}: expected one of {', '.join(OPS)}")
+        try:
+            mid = int(op["menu_item"])
+            qty = int(op.get("qty", 1 if kind == "add" else 0))
+        except (KeyError, TypeError, ValueError):
+            raise CartOpError(f"op {i}: menu_item and an integer qty are required")
+        if not 0 < mid <= MAX_ID:
+            raise CartOpError(f"op {i}: unknown menu_item")
+        if kind == "remove":
+            final[mid] = ("abs", 0)
+        elif kind == "set":
+            final[mid] = ("abs", max(0, min(qty, MAX_QTY)))
+        else:
+            if not 1 <= qty <= MAX_QTY:
+                raise CartOpError(f"op {i}: add needs 1 <= qty <= {MAX_QTY}")
+            mode, cur = final.get(mid, ("delta", 0))
+            final[mid] = (mode, min(cur + qty, MAX_QTY))
+    return final
+
+
+def apply_ops(cart, ops, log_events=True) -> dict:
+    """
+    Apply ops atomically to cart. Unknown/unavailable items are skipped and
+    reported; removes always apply. Returns {"applied", "rejected", "added"}.
+    """
+    final = _normalize(ops)
+    if not final:
+        return {"applied": 0, "rejected": [], "added": []}
+
+    growing = [mid for mid, (mode, n) in final.items() if n > 0]
+    valid = set(MenuItem.objects.filter(id__in=growing, is_available=True).values_list("id", flat=True)) \
+        if growing else set()
+    rejected = [mid for mid in growing if mid not in valid]
+
+    removes = [mid for mid, (mode, n) in final.items() if mode == "abs" and n == 0]
+    sets = {mid: n for mid, (mode, n) in final.items() if mode == "abs" and n > 0 and mid in valid}
+    deltas = {mid: n for mid, (mode, n) in final.items() if mode == "delta" and mid in valid}
+
+    with transaction.atomic():
+        if removes:
+            CartItem.objects.filter(cart=cart, menu_item_id__in=removes).delete()
+        if sets:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, menu_item_id=mid, qty=n) for mid, n in sets.items()],
+                update_conflicts=True, unique_fields=["cart", "menu_item"], update_fields=["qty"],
+            )
+        if deltas:
+            # Existing rows: qty += n (capped) in one UPDATE; then insert the rest (existing ones conflict and are skipped)
+            CartItem.objects.filter(cart=cart, menu_item_id__in=list(deltas)).update(
+                qty=Least(F("qty") + Case(*[When(menu_item_id=mid, then=Value(n)) for mid, n in deltas.items()],
+                                          default=Value(0), output_field=IntegerField()),
+                          Value(MAX_QTY)),
+            )
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, menu_item_id=mid, qty=n) for mid, n in deltas.items()],
+                ignore_conflicts=True,
+            )
+        if log_events and deltas:
+            events = EventLog.objects.bulk_create([
+                EventLog(user_id=cart.user_id, guest_token="" if cart.user_id else cart.guest_token,
+                         menu_item_id=mid, event_type="add")
+                for mid in deltas
+            ])
+            # bulk_create skips post_save, so fold them into taste profiles here
+            from .recommender import record_taste_events
+            record_taste_events(events)
+
+    return {"applied": len(final) - len(rejected), "rejected": rejected, "added": list(deltas)}
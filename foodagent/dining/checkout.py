@@ -12,10 +12,14 @@ from django.db import transaction
 
 import stripe
 
+from . import outbound
 from .models import Cart, CartItem, Order
 from .views import get_guest_token  # helper for guest carts (used by cart page)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+if getattr(settings, "STRIPE_API_BASE", ""):
+    stripe.api_base = settings.STRIPE_API_BASE  # e.g. the local fakes (dining/fakes.py)
+outbound.configure_stripe()
 
 
 # -----------------------------
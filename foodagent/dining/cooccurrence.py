@@ -0,0 +1,222 @@
+# dining/cooccurrence.py
+"""
+Item-item co-occurrence model ("people who ordered X also ordered Y").
+
+Training streams OrderItem rows (one basket per order) and add/buy EventLog
+rows (one basket per user or guest) in chunks, accumulating pair counts
+into a SciPy sparse matrix. Counts are cosine-normalised, cut to the top-k
+neighbours per item and saved as a compact CSR .npz. Serving loads the
+file once per process and reloads it when the file changes.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EventLog, MenuItem, OrderItem
+
+
+def _model_path():
+    return str(getattr(settings, "COOCCURRENCE_MODEL_PATH", "cooccurrence.npz"))
+
+
+# ---------- training ----------
+def _grouped(rows, key_len):
+    """Group a stream of (*key, item_id) rows, sorted by key, into baskets."""
+    cur, basket = None, []
+    for row in rows:
+        key, iid = row[:key_len], row[key_len]
+        if key != cur:
+            if basket:
+                yield basket
+            cur, basket = key, []
+        basket.append(iid)
+    if basket:
+        yield basket
+
+
+def _order_baskets(chunk_size, since=None, until=None):
+    qs = OrderItem.objects.all()
+    if since:
+        qs = qs.filter(order__created_at__gte=since)
+    if until:
+        qs = qs.filter(order__created_at__lt=until)
+    rows = qs.order_by("order_id").values_list("order_id", "menu_item_id").iterator(chunk_size=chunk_size)
+    return _grouped(rows, 1)
+
+
+def _event_baskets(chunk_size, since=None, until=None):
+    qs = EventLog.objects.filter(event_type__in=("add", "buy"), menu_item__isnull=False)
+    if since:
+        qs = qs.filter(ts__gte=since)
+    if until:
+        qs = qs.filter(ts__lt=until)
+    rows = qs.order_by("user_id", "guest_token", "id") \
+        .values_list("user_id", "guest_token", "menu_item_id").iterator(chunk_size=chunk_size)
+    return _grouped(rows, 2)
+
+
+def fit(chunk_size=10000, top_k=20, max_basket=50, since=None, until=None):
+    """
+    (item_ids, csr similarity matrix, basket count) from history in
+    [since, until). Memory is bounded by pair nnz, not event count.
+    """
+    item_ids = np.array(MenuItem.objects.order_by("id").values_list("id", flat=True), dtype=np.int64)
+    n = len(item_ids)
+
+    counts = np.zeros(n, dtype=np.float64)
+    pairs = sparse.csr_matrix((n, n), dtype=np.float32)
+    buf_r, buf_c, buffered = [], [], 0
+    n_baskets = 0
+
+    def flush():
+        nonlocal pairs, buf_r, buf_c, buffered
+        if buffered:
+            r = np.concatenate(buf_r)
+            c = np.concatenate(buf_c)
+            pairs = pairs + sparse.csr_matrix((np.ones(len(r), dtype=np.float32), (r, c)), shape=(n, n))
+            buf_r, buf_c, buffered = [], [], 0
+
+    for basket in chain(_order_baskets(chunk_size, since, until), _event_baskets(chunk_size, since, until)):
+        # Keep the most recent distinct items so one heavy user can't blow up pair counts
+        ids = np.array(list(dict.fromkeys(basket))[-max_basket:], dtype=np.int64)
+        pos = np.searchsorted(item_ids, ids)
+        ok = pos < n
+        pos, ids = pos[ok], ids[ok]
+        pos = pos[item_ids[pos] == ids]   # drop items deleted since the event
+        if len(pos) < 2:
+            continue
+        n_baskets += 1
+        counts[pos] += 1
+        a = np.repeat(pos, len(pos))
+        b = np.tile(pos, len(pos))
+        keep = a != b
+        buf_r.append(a[keep])
+        buf_c.append(b[keep])
+        buffered += int(keep.sum())
+        if buffered >= chunk_size * 10:
+            flush()
+    flush()
+
+    # Cosine normalisation: c_ij / sqrt(c_i * c_j)
+    norm = np.sqrt(np.maximum(counts, 1.0)).astype(np.float32)
+    inv = sparse.diags(1.0 / norm)
+    sim = (inv @ pairs @ inv).tocsr()
+
+    indptr, indices, data = [0], [], []
+    for i in range(n):
+        lo, hi = sim.indptr[i], sim.indptr[i + 1]
+        cols, vals = sim.indices[lo:hi], sim.data[lo:hi]
+        if len(vals) > top_k:
+            keep = np.argpartition(-vals, top_k - 1)[:top_k]
+            cols, vals = cols[keep], vals[keep]
+        order = np.argsort(-vals, kind="stable")
+        indices.append(cols[order].astype(np.int32))
+        data.append(vals[order].astype(np.float32))
+        indptr.append(indptr[-1] + len(order))
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+         np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+         np.array(indptr, dtype=np.int64)),
+        shape=(n, n),
+    )
+    return item_ids, matrix, n_baskets
+
+
+def train(chunk_size=10000, top_k=20, max_basket=50, since_days=None) -> dict:
+    """Build and save the model."""
+    since = timezone.now() - timedelta(days=since_days) if since_days else None
+    item_ids, matrix, n_baskets = fit(chunk_size, top_k, max_basket, since=since)
+
+    path = _model_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp,
+        item_ids=item_ids,
+        indptr=matrix.indptr.astype(np.int64),
+        indices=matrix.indices.astype(np.int32),
+        data=matrix.data.astype(np.float32),
+    )
+    os.replace(tmp, path)  # readers never see a half-written file
+    return {"items": len(item_ids), "baskets": n_baskets, "neighbours": int(matrix.nnz), "path": path}
+
+
+# ---------- serving ----------
+class CooccurrenceModel:
+    def __init__(self, item_ids, matrix, mtime):
+        self.item_ids = item_ids
+        self.matrix = matrix   # csr float32[n, n], top-k similar items per row
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.stat(path).st_mtime
+        with np.load(path) as z:
+            item_ids = z["item_ids"]
+            n = len(item_ids)
+            matrix = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=(n, n))
+        return cls(item_ids, matrix, mtime)
+
+    def _positions(self, ids):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if not ids.size or not self.item_ids.size:
+            return np.zeros(0, dtype=np.int64)
+        pos = np.searchsorted(self.item_ids, ids)
+        pos = pos[pos < len(self.item_ids)]
+        return pos[np.isin(self.item_ids[pos], ids)]
+
+    def similar(self, seed_ids, n=8) -> list[int]:
+        """Item ids most co-ordered with the seeds, seeds excluded, best first."""
+        pos = self._positions(seed_ids)
+        if not pos.size or n <= 0:
+            return []
+        score = np.asarray(self.matrix[pos].sum(axis=0)).ravel()
+        score[pos] = 0.0
+        cand = np.flatnonzero(score > 0)
+        if not cand.size:
+            return []
+        k = min(n, cand.size)
+        top = cand[np.argpartition(-score[cand], k - 1)[:k]]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return self.item_ids[top].tolist()
+
+
+_model = None
+_model_lock = threading.Lock()
+_pinned = None   # offline replay: serve this model instead of the file
+
+
+def get_model():
+    """The current model, or None if none has been trained yet."""
+    global _model
+    if _pinned is not None:
+        return _pinned
+    path = _model_path()
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if _model is None or _model.mtime != mtime:
+        with _model_lock:
+            if _model is None or _model.mtime != mtime:
+                _model = CooccurrenceModel.load(path)
+    return _model
+
+
+@contextmanager
+def pinned(model: CooccurrenceModel):
+    """Serve model from get_model() inside the block (benchmark replay; not for requests)."""
+    global _pinned
+    prev, _pinned = _pinned, model
+    try:
+        yield model
+    finally:
+        _pinned = prev
@@ -0,0 +1,205 @@
+# dining/engine.py
+"""
+In-process recommender engine.
+
+Holds the whole menu as arrays (item x tag sparse matrix, popularity vector,
+availability mask) so scoring every item against a preference vector is one
+sparse mat-vec instead of an M2M join per request. Rebuilt lazily after
+MenuItem/Tag changes (see signals.py) or when older than RECOMMENDER_ENGINE_TTL.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+
+from .models import MenuItem
+
+
+class RecommenderEngine:
+    def __init__(self, item_ids, tag_cols, matrix, popularity, available, prices):
+        self.item_ids = item_ids          # int64[n_items], sorted
+        self.tag_cols = tag_cols          # tag name -> column in matrix
+        self.matrix = matrix              # csr float32[n_items, n_tags], 1 where item has tag
+        self.popularity = popularity      # float64[n_items]
+        self.available = available        # bool[n_items]
+        self.prices = prices              # float64[n_items]
+        self.built_at = time.monotonic()
+
+        # Candidate index: one packed bitmap per lower-cased tag name, plus a
+        # price-sorted position array so a price cap is a binary search
+        n = len(item_ids)
+        csc = matrix.tocsc()
+        self.tag_bits = {}
+        for name, col in tag_cols.items():
+            rows = csc.indices[csc.indptr[col]:csc.indptr[col + 1]]
+            key = name.lower()
+            bits = np.zeros(n, dtype=bool)
+            bits[rows] = True
+            packed = np.packbits(bits)
+            self.tag_bits[key] = (self.tag_bits[key] | packed) if key in self.tag_bits else packed
+        self._available_bits = np.packbits(available)
+        self._price_order = np.argsort(prices, kind="stable")
+        self._sorted_prices = prices[self._price_order]
+
+        # Popularity squashed into [0, 1) so one tag match always outranks it
+        pop = popularity.astype(np.float64)
+        span = (pop.max() - pop.min()) if pop.size else 0.0
+        self._pop_norm = ((pop - pop.min()) / span * 0.999) if span > 0 else np.zeros_like(pop)
+        # Hot list: available items by popularity, so popularity_top_n is a slice
+        avail_idx = np.flatnonzero(available)
+        self._popular_order = avail_idx[np.argsort(-self._pop_norm[avail_idx], kind="stable")]
+
+    @classmethod
+    def build(cls):
+        # One snapshot for both reads, so every tag row's item is in item_ids
+        with transaction.atomic():
+            rows = list(MenuItem.objects.order_by("id").values_list("id", "popularity_score", "is_available", "price"))
+            links = list(MenuItem.tags.through.objects.values_list("menuitem_id", "tag__name"))
+        item_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        popularity = np.array([r[1] for r in rows], dtype=np.float64)
+        available = np.array([r[2] for r in rows], dtype=bool)
+        prices = np.array([float(r[3]) for r in rows], dtype=np.float64)
+
+        tag_cols, r_idx, c_idx = {}, [], []
+        for iid, name in links:
+            col = tag_cols.setdefault(name, len(tag_cols))
+            r_idx.append(iid)
+            c_idx.append(col)
+        r_idx = np.array(r_idx, dtype=np.int64)
+        c_idx = np.array(c_idx, dtype=np.int64)
+        r_pos = np.searchsorted(item_ids, r_idx)
+        # Without snapshot isolation (SQLite autocommit elsewhere), drop links to unseen items
+        ok = r_pos < len(item_ids)
+        ok[ok] = item_ids[r_pos[ok]] == r_idx[ok]
+        r_pos, c_idx = r_pos[ok], c_idx[ok]
+        matrix = sparse.csr_matrix(
+            (np.ones(len(r_pos), dtype=np.float32), (r_pos, c_idx)),
+            shape=(len(item_ids), len(tag_cols)),
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0  # same name under two kinds still counts once
+        return cls(item_ids, tag_cols, matrix, popularity, available, prices)
+
+    def is_stale(self, ttl: float) -> bool:
+        return ttl > 0 and (time.monotonic() - self.built_at) > ttl
+
+    def preference_vector(self, tags) -> np.ndarray:
+        pref = np.zeros(len(self.tag_cols), dtype=np.float32)
+        for name in tags or ():
+            col = self.tag_cols.get(name)
+            if col is not None:
+                pref[col] = 1.0
+        return pref
+
+    def top_n(self, tags=(), n=8) -> list[int]:
+        """Item ids of the n best available items: tag overlap first, then popularity."""
+        if n <= 0 or not self.item_ids.size:
+            return []
+        pref = self.preference_vector(tags)
+        if not pref.any():
+            return self.item_ids[self._popular_order[:n]].tolist()
+
+        score = self.matrix @ pref + self._pop_norm
+        score[~self.available] = -np.inf
+        k = min(n, int(self.available.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return self.item_ids[top].tolist()
+
+    def candidates(self, include=(), exclude=(), price_cap=None, k=8) -> list[int]:
+        """
+        Ids of the k most popular available items carrying ANY of `include`
+        (case-insensitive; no filter when empty), NONE of `exclude`, priced
+        at or under price_cap. Pure bitmap OR / AND-NOT over packed arrays.
+        """
+        n = len(self.item_ids)
+        if not n or k <= 0:
+            return []
+        acc = self._available_bits.copy()
+        if include:
+            want = np.zeros_like(acc)
+            for name in include:
+                bits = self.tag_bits.get((name or "").lower())
+                if bits is not None:
+                    want |= bits
+            acc &= want
+        for name in exclude or ():
+            bits = self.tag_bits.get((name or "").lower())
+            if bits is not None:
+                acc &= ~bits
+        if price_cap is not None:
+            cut = np.searchsorted(self._sorted_prices, float(price_cap), side="right")
+            ok = np.zeros(n, dtype=bool)
+            ok[self._price_order[:cut]] = True
+            acc &= np.packbits(ok)
+
+        pos = np.flatnonzero(np.unpackbits(acc, count=n))
+        if not pos.size:
+            return []
+        if pos.size > k:
+            pos = pos[np.argpartition(-self._pop_norm[pos], k - 1)[:k]]
+        pos = pos[np.argsort(-self._pop_norm[pos], kind="stable")]
+        return self.item_ids[pos].tolist()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_pinned = None   # offline replay: serve this engine instead of the live one
+
+
+def get_engine() -> RecommenderEngine:
+    global _engine
+    if _pinned is not None:
+        return _pinned
+    ttl = getattr(settings, "RECOMMENDER_ENGINE_TTL", 300)
+    eng = _engine
+    if eng is None or eng.is_stale(ttl):
+        with _engine_lock:
+            if _engine is None or _engine.is_stale(ttl):
+                _engine = RecommenderEngine.build()
+            eng = _engine
+    return eng
+
+
+def invalidate_engine():
+    """Drop this process's engine; the next caller rebuilds it."""
+    global _engine
+    _engine = None
+
+
+@contextmanager
+def pinned(engine: RecommenderEngine):
+    """Serve engine from get_engine() inside the block (benchmark replay; not for requests)."""
+    global _pinned
+    prev, _pinned = _pinned, engine
+    try:
+        yield engine
+    finally:
+        _pinned = prev
+
+
+def hydrate(ids) -> list[MenuItem]:
+    """Load MenuItems for ids (tags prefetched), preserving order."""
+    if not ids:
+        return []
+    objs = MenuItem.objects.filter(id__in=ids).prefetch_related("tags").in_bulk()
+    return [objs[i] for i in ids if i in objs]
+
+
+def hydrate_available(ids, n=None) -> list[MenuItem]:
+    """
+    hydrate() minus items that are no longer available. Signals only reset
+    the engine of the process that saved the item, so another worker's
+    engine can still list it; seeing one means ours is stale, so rebuild.
+    """
+    items = hydrate(ids)
+    live = [m for m in items if m.is_available]
+    if len(live) < len(items):
+        invalidate_engine()
+    return live[:n] if n is not None else live
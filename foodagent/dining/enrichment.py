@@ -0,0 +1,128 @@
+# dining/enrichment.py
+"""
+Background menu/highlight enrichment for websearch results.
+
+tavily_enrich() takes seconds per place, so it never runs inline: after a
+search answers, the top ENRICH_TOP_K places without menus are queued to a
+small bounded pool (ENRICH_WORKERS threads, at most ENRICH_QUEUE_MAX
+waiting; the rest are dropped and retried by a later search). Answers are
+cached per place for ENRICH_CACHE_TTL, so later searches get them inline
+and the page polls /api/websearch/enrich/ for the ones still in flight.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+EMPTY_TTL = 6 * 3600   # nothing found / provider error: try again sooner
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting("WEBSEARCH_CACHE_ALIAS", "default")]
+
+
+def place_key(place: dict) -> str:
+    """Stable id for a result: Google place_id, else name + address."""
+    if place.get("place_id"):
+        return f"g-{place['place_id']}"[:80]
+    raw = f"{place.get('name') or ''}|{place.get('address') or ''}".lower()
+    return "n-" + hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _ckey(key: str) -> str:
+    return f"enrich:{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+def lookup(keys) -> dict:
+    """{key: {"menus", "highlights"}} for the keys already enriched (one cache round trip)."""
+    keys = list(keys)
+    found = _cache().get_many([_ckey(k) for k in keys])
+    return {k: found[_ckey(k)] for k in keys if _ckey(k) in found}
+
+
+def apply(place: dict, data: dict):
+    if data.get("menus") and not place.get("menus"):
+        place["menus"] = data["menus"]
+    if data.get("highlights"):
+        place["highlights"] = data["highlights"]
+
+
+# ---------- worker pool ----------
+_pool = None
+_pool_lock = threading.Lock()
+_queued = set()   # keys waiting or running
+_queued_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_setting("ENRICH_WORKERS", 4),
+                                           thread_name_prefix="enrich")
+    return _pool
+
+
+def _enrich(key, name, city):
+    from .tavily import tavily_enrich
+    try:
+        with metrics.timer("enrich.tavily"):
+            data = tavily_enrich(name, city) or {}
+        data = {"menus": data.get("menus") or [], "highlights": data.get("highlights") or ""}
+        ttl = _setting("ENRICH_CACHE_TTL", 3 * 24 * 3600) if (data["menus"] or data["highlights"]) else EMPTY_TTL
+        _cache().set(_ckey(key), data, timeout=ttl)
+        metrics.incr("enrich.done")
+    except Exception:
+        metrics.incr("enrich.error")
+    finally:
+        with _queued_lock:
+            _queued.discard(key)
+
+
+def enqueue(places) -> list:
+    """Queue places (dicts with "key") for enrichment; returns the keys now pending."""
+    limit = _setting("ENRICH_QUEUE_MAX", 64)
+    pending = []
+    for p in places:
+        with _queued_lock:
+            if p["key"] in _queued:
+                pending.append(p["key"])
+                continue
+            if len(_queued) >= limit:
+                metrics.incr("enrich.dropped")
+                continue
+            _queued.add(p["key"])
+        _get_pool().submit(_enrich, p["key"], p.get("name") or "", p.get("address") or "")
+        pending.append(p["key"])
+    return pending
+
+
+def enrich_results(results) -> tuple:
+    """
+    (results, pending keys): copies of results carrying "enrich_key", with
+    cached menus/highlights filled in; the top-K still missing are queued.
+    """
+    if not _setting("TAVILY_API_KEY", ""):
+        return results, []
+    out = [dict(r, enrich_key=place_key(r)) for r in results]
+    known = lookup(r["enrich_key"] for r in out if not r.get("menus"))
+    missing = []
+    for r in out:
+        data = known.get(r["enrich_key"])
+        if data is not None:
+            apply(r, data)
+        elif not r.get("menus"):
+            missing.append(r)
+    top_k = _setting("ENRICH_TOP_K", 6)
+    pending = enqueue([{"key": r["enrich_key"], "name": r.get("name"), "address": r.get("address")}
+                       for r in missing[:top_k]]) if top_k > 0 else []
+    return out, pending
@@ -0,0 +1,364 @@
+# dining/fakes.py
+"""
+Deterministic stand-ins for every third-party API the app calls.
+
+One stdlib HTTP server answers, by path prefix:
+
+    /google/...     Places text search (paginated), details, photo
+    /tavily/...     search
+    /nominatim/...  reverse, search
+    /gemini/...     models/<m>:generateContent (REST transport)
+    /openai/...     v1/chat/completions (tool calls included)
+    /stripe/...     checkout sessions, customers, payment intents
+
+Payloads depend only on the request, so runs are reproducible. Each
+provider has its own latency distribution, error rate and optional canned
+payload (see ProviderProfile). Point the app here with
+FAKE_PROVIDERS_URL=http://127.0.0.1:8765 (settings.py); start it with
+`manage.py fake_providers`.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROVIDERS = ("google", "tavily", "nominatim", "gemini", "openai", "stripe")
+
+CUISINES = ["Thai", "Mexican", "Indian", "Italian", "Japanese", "Korean", "Chinese", "Mediterranean",
+            "Vietnamese", "BBQ", "Burger", "Pizza", "Vegan", "Sushi", "Ramen", "Greek"]
+STREETS = ["Main St", "Washington St", "University Ave", "Hall of Fame Ave", "Perkins Rd", "6th Ave", "Duck St"]
+
+
+# ---------- latency / errors ----------
+def parse_latency(spec: str):
+    """
+    "fixed:50" | "uniform:20:80" | "normal:100:25" | "lognormal:120:0.5" (median ms, sigma)
+    -> callable(rng) returning milliseconds.
+    """
+    kind, *args = (spec or "fixed:0").split(":")
+    try:
+        a = [float(x) for x in args]
+    except ValueError:
+        raise ValueError(f"bad latency spec {spec!r}")
+    import math
+    dists = {
+        "fixed": lambda r: a[0],
+        "uniform": lambda r: r.uniform(a[0], a[1]),
+        "normal": lambda r: max(0.0, r.gauss(a[0], a[1])),
+        "lognormal": lambda r: r.lognormvariate(math.log(max(a[0], 0.001)), a[1]),
+    }
+    need = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+    if kind not in dists or len(a) != need[kind]:
+        raise ValueError(f"bad latency spec {spec!r}")
+    return dists[kind]
+
+
+@dataclass
+class ProviderProfile:
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_status: int = 500
+    payload: dict = None      # canned body for the provider's main endpoint, returned as-is
+    _sample: object = field(default=None, repr=False)
+
+    def sample_ms(self, rng) -> float:
+        if self._sample is None:
+            self._sample = parse_latency(self.latency)
+        return self._sample(rng)
+
+
+def load_profiles(config: dict = None) -> dict:
+    """{provider: ProviderProfile} from {"google": {"latency": ..., "error_rate": ...}, ...}."""
+    profiles = {p: ProviderProfile() for p in PROVIDERS}
+    for name, cfg in (config or {}).items():
+        if name not in profiles:
+            raise ValueError(f"unknown provider {name!r}; expected one of {', '.join(PROVIDERS)}")
+        profiles[name] = ProviderProfile(**cfg)
+    return profiles
+
+
+# ---------- deterministic data ----------
+def _h(*parts) -> int:
+    return int(hashlib.sha256("\x00".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+
+
+def _place(query: str, i: int, lat: float, lng: float) -> dict:
+    h = _h(query, i)
+    cuisine = CUISINES[h % len(CUISINES)]
+    # Within ~3 km of the search point
+    dlat = ((h >> 8) % 600 - 300) / 10000.0
+    dlng = ((h >> 18) % 600 - 300) / 10000.0
+    pid = f"fake_{h:x}"
+    return {
+        "place_id": pid,
+        "name": f"{cuisine} {['House', 'Kitchen', 'Grill', 'Bistro', 'Express', 'Corner'][(h >> 4) % 6]} #{i + 1}",
+        "rating": round(3.0 + (h % 21) / 10.0, 1),
+        "user_ratings_total": 10 + h % 2000,
+        "price_level": 1 + (h >> 3) % 4,
+        "formatted_address": f"{100 + h % 900} {STREETS[(h >> 5) % len(STREETS)]}, Stillwater, OK",
+        "geometry": {"location": {"lat": round(lat + dlat, 6), "lng": round(lng + dlng, 6)}},
+        "types": ["restaurant", cuisine.lower(), "food"],
+        "photos": [{"photo_reference": f"ph_{pid}", "width": 800, "height": 600}],
+        "opening_hours": {"open_now": bool(h & 1)},
+    }
+
+
+def _png(seed: str, w=64, h=48) -> bytes:
+    """Solid-colour PNG, colour derived from seed (stdlib only)."""
+    c = _h(seed)
+    px = bytes([(c >> 16) & 255, (c >> 8) & 255, c & 255])
+    raw = b"".join(b"\x00" + px * w for _ in range(h))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+GOOGLE_PAGE = 20
+GOOGLE_MAX = 60
+GOOGLE_TOKEN_DELAY = 2.0  # like the real API, a next_page_token is INVALID_REQUEST for ~2 s
+
+
+def google(method, path, q, body):
+    if path.endswith("/place/textsearch/json"):
+        token = (q.get("pagetoken") or [""])[0]
+        if token:
+            query, lat, lng, offset, issued = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+            if time.time() - float(issued) < GOOGLE_TOKEN_DELAY:
+                return 200, {"status": "INVALID_REQUEST", "results": []}
+            lat, lng, offset = float(lat), float(lng), int(offset)
+        else:
+            query = (q.get("query") or [""])[0]
+            lat, lng = (float(x) for x in ((q.get("location") or ["36.127,-97.0737"])[0]).split(","))
+            offset = 0
+        total = 5 + _h(query) % (GOOGLE_MAX - 4)
+        results = [_place(query, i, lat, lng) for i in range(offset, min(offset + GOOGLE_PAGE, total))]
+        out = {"status": "OK" if results else "ZERO_RESULTS", "results": results}
+        if offset + GOOGLE_PAGE < total:
+            out["next_page_token"] = base64.urlsafe_b64encode(
+                f"{query}|{lat}|{lng}|{offset + GOOGLE_PAGE}|{time.time():.3f}".encode()).decode()
+        return 200, out
+    if path.endswith("/place/details/json"):
+        pid = (q.get("place_id") or [""])[0]
+        h = _h(pid)
+        return 200, {"status": "OK", "result": {
+            "place_id": pid,
+            "website": f"https://example.com/{pid}",
+            "formatted_phone_number": f"(405) 555-{h % 10000:04d}",
+            "opening_hours": {"weekday_text": ["Monday: 11:00 AM – 9:00 PM"]},
+        }}
+    if path.endswith("/place/photo"):
+        ref = (q.get("photoreference") or q.get("photo_reference") or [""])[0]
+        w = max(16, min(int((q.get("maxwidth") or ["400"])[0]), 1600))
+        return 200, ("image/png", _png(ref, w, w * 3 // 4))
+    if path.endswith("/geocode/json"):
+        addr = (q.get("address") or [""])[0]
+        h = _h(addr)
+        return 200, {"status": "OK", "results": [{
+            "formatted_address": addr,
+            "geometry": {"location": {"lat": 36.0 + (h % 3000) / 10000.0, "lng": -97.2 + ((h >> 12) % 3000) / 10000.0}},
+        }]}
+    return 404, {"status": "NOT_FOUND"}
+
+
+def tavily(method, path, q, body):
+    query = (body or {}).get("query", "")
+    n = int((body or {}).get("max_results") or 5)
+    results = []
+    for i in range(n):
+        h = _h(query, i)
+        slug = f"{CUISINES[h % len(CUISINES)].lower()}-{h % 1000}"
+        kind = ["menu", "nutrition", "order", "reviews", "about"][(h >> 3) % 5]
+        results.append({
+            "title": f"{slug.replace('-', ' ').title()} | {kind.title()}",
+            "url": f"https://example.com/{slug}/{kind}",
+            "content": f"{query} — fake result {i + 1}. Popular dishes, prices and opening hours.",
+            "score": round(1 - i / (n + 1), 3),
+        })
+    out = {"query": query, "results": results}
+    if (body or {}).get("include_answer"):
+        out["answer"] = f"Fake summary for: {query}"
+    return 200, out
+
+
+def nominatim(method, path, q, body):
+    if path.endswith("/reverse"):
+        lat, lon = (q.get("lat") or ["0"])[0], (q.get("lon") or ["0"])[0]
+        h = _h(lat, lon)
+        return 200, {"lat": lat, "lon": lon, "display_name": "Stillwater, OK", "address": {
+            "house_number": str(100 + h % 900), "road": STREETS[h % len(STREETS)],
+            "city": "Stillwater", "state": "Oklahoma", "postcode": "74074",
+        }}
+    if path.endswith("/search"):
+        text = (q.get("q") or [""])[0]
+        h = _h(text)
+        return 200, [{"lat": str(36.0 + (h % 3000) / 10000.0), "lon": str(-97.2 + ((h >> 12) % 3000) / 10000.0),
+                      "display_name": text or "Stillwater, OK"}]
+    return 404, {"error": "not found"}
+
+
+def gemini(method, path, q, body):
+    if ":generateContent" not in path:
+        return 404, {"error": {"code": 404, "message": "not found"}}
+    parts = [p.get("text", "") for c in (body or {}).get("contents", []) for p in c.get("parts", [])]
+    prompt = (parts[-1] if parts else "").lower()
+    cuisines = [c.lower() for c in CUISINES if c.lower() in prompt]
+    intent = {
+        "healthy": any(w in prompt for w in ("healthy", "salad", "light")),
+        "mood": None,
+        "cuisines": cuisines,
+        "budget": 1 if any(w in prompt for w in ("cheap", "budget")) else None,
+        "keyword": " ".join(cuisines) or prompt[:40] or "restaurant",
+    }
+    return 200, {"candidates": [{"content": {"role": "model", "parts": [{"text": json.dumps(intent)}]},
+                                 "finishReason": "STOP", "index": 0}],
+                 "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": 30}}
+
+
+def openai(method, path, q, body):
+    if not path.endswith("/chat/completions"):
+        return 404, {"error": {"message": "not found"}}
+    msgs = (body or {}).get("messages", [])
+    last = msgs[-1] if msgs else {}
+    tools = {t.get("function", {}).get("name") for t in (body or {}).get("tools", [])}
+    h = _h(json.dumps(msgs, sort_keys=True))
+    if last.get("role") == "user" and "search_menu" in tools:
+        # First turn: search for what the user asked, like a real tool-calling model would
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{h:x}", "type": "function",
+            "function": {"name": "search_menu", "arguments": json.dumps({"query": str(last.get("content", ""))[:60]})},
+        }]}
+        finish = "tool_calls"
+    else:
+        message = {"role": "assistant", "content": "Here are a few options I found. Want me to add one?"}
+        finish = "stop"
+    return 200, {"id": f"chatcmpl-{h:x}", "object": "chat.completion", "created": int(time.time()),
+                 "model": (body or {}).get("model", "fake"),
+                 "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                 "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}}
+
+
+def _form_metadata(form: dict) -> dict:
+    return {m.group(1): v[0] for k, v in form.items() if (m := re.fullmatch(r"metadata\[(\w+)\]", k))}
+
+
+def stripe(method, path, q, body):
+    form = body if isinstance(body, dict) else {}
+    if m := re.search(r"/v1/checkout/sessions/([\w-]+)$", path):
+        return 200, {"id": m.group(1), "object": "checkout.session", "payment_status": "paid",
+                     "status": "complete", "metadata": {}}
+    if path.endswith("/v1/checkout/sessions") and method == "POST":
+        sid = f"cs_test_{_h(json.dumps(form, sort_keys=True)):x}"
+        return 200, {"id": sid, "object": "checkout.session", "url": f"https://checkout.stripe.test/pay/{sid}",
+                     "payment_status": "unpaid", "status": "open", "metadata": _form_metadata(form)}
+    if m := re.search(r"/v1/customers/([\w-]+)$", path):
+        return 200, {"id": m.group(1), "object": "customer", "invoice_settings": {"default_payment_method": {
+            "id": "pm_fake_visa", "object": "payment_method", "type": "card",
+            "card": {"brand": "visa", "last4": "4242", "exp_month": 12, "exp_year": 2030}}}}
+    if path.endswith("/v1/payment_intents") and method == "POST":
+        pid = f"pi_fake_{_h(json.dumps(form, sort_keys=True)):x}"
+        return 200, {"id": pid, "object": "payment_intent", "status": "succeeded",
+                     "amount": int((form.get("amount") or ["0"])[0]), "currency": (form.get("currency") or ["usd"])[0],
+                     "metadata": _form_metadata(form)}
+    return 404, {"error": {"type": "invalid_request_error", "message": f"no fake for {method} {path}"}}
+
+
+HANDLERS = {"google": google, "tavily": tavily, "nominatim": nominatim,
+            "gemini": gemini, "openai": openai, "stripe": stripe}
+
+
+def stripe_signature(payload: bytes, secret: str, ts: int = None) -> str:
+    """Stripe-Signature header value for payload, as stripe.Webhook.construct_event expects."""
+    ts = ts or int(time.time())
+    sig = hmac.new(secret.encode(), f"{ts}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={ts},v1={sig}"
+
+
+# ---------- server ----------
+class FakeProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, profiles=None, seed=0, quiet=True):
+        super().__init__(addr, _Handler)
+        self.profiles = profiles or load_profiles()
+        self.quiet = quiet
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.counts = {p: 0 for p in PROVIDERS}
+
+    def draw(self, profile):
+        with self._rng_lock:
+            return profile.sample_ms(self._rng), self._rng.random() < profile.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        if not raw:
+            return None
+        if "json" in (self.headers.get("Content-Type") or ""):
+            try:
+                return json.loads(raw)
+            except ValueError:
+                return None
+        return parse_qs(raw.decode())
+
+    def _send(self, status, body):
+        if isinstance(body, tuple):
+            ctype, data = body
+        else:
+            ctype, data = "application/json", json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        provider, _, rest = url.path.lstrip("/").partition("/")
+        handler = HANDLERS.get(provider)
+        body = self._body()
+        if handler is None:
+            return self._send(404, {"error": f"unknown provider {provider!r}"})
+        profile = self.server.profiles[provider]
+        self.server.counts[provider] += 1
+        delay_ms, fail = self.server.draw(profile)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if fail:
+            return self._send(profile.error_status, {"error": {"message": f"injected {provider} failure"}})
+        status, out = handler(method, "/" + rest, parse_qs(url.query), body)
+        if profile.payload is not None and status == 200 and not isinstance(out, tuple):
+            out = profile.payload
+        self._send(status, out)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+def serve(host="127.0.0.1", port=8765, profiles=None, seed=0, quiet=True) -> FakeProviderServer:
+    """Start the fakes in a background thread and return the server (call .shutdown() to stop)."""
+    srv = FakeProviderServer((host, port), profiles=profiles, seed=seed, quiet=quiet)
+    threading.Thread(target=srv.serve_forever, name="fake-providers", daemon=True).start()
+    return srv
@@ -0,0 +1,215 @@
+# dining/geocoding.py
+"""
+Reverse geocoding (lat/lng -> postal address) in front of Nominatim.
+
+Coordinates are rounded to GEOCODE_PRECISION decimals (4 ≈ 11 m), so
+nearby clicks share one cached address: a per-process LRU first, then
+GeocodeCache rows shared by every worker, both for GEOCODE_CACHE_TTL.
+Misses go out at most GEOCODE_RATE per second per process (Nominatim's
+policy is 1 req/s per application) through a token bucket; identical
+lookups already in flight wait for that one call instead of making their
+own. When no token is free within GEOCODE_MAX_WAIT_MS the lookup fails
+fast as "throttled" rather than holding the worker. GEOCODE_RATE = 0 turns
+the limiter off (e.g. for a self-hosted Nominatim).
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+from . import metrics, outbound
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cell(lat: float, lng: float) -> str:
+    p = _setting("GEOCODE_PRECISION", 4)
+    return f"{round(lat, p):.{p}f},{round(lng, p):.{p}f}"
+
+
+# ---------- rate limit ----------
+class TokenBucket:
+    """rate tokens/s (<= 0: unlimited), up to burst banked; acquire() waits at most max_wait seconds."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token now (-> 0.0) or say how long until one is free."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, max_wait: float = 0.0) -> bool:
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._reserve()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+def _get_bucket() -> TokenBucket:
+    global _bucket
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:
+                _bucket = TokenBucket(_setting("GEOCODE_RATE", 1.0), _setting("GEOCODE_BURST", 1))
+    return _bucket
+
+
+# ---------- cache ----------
+_mem = OrderedDict()   # cell -> (expires_at, address)
+_mem_lock = threading.Lock()
+
+
+def _ttl():
+    return _setting("GEOCODE_CACHE_TTL", 30 * 24 * 3600)
+
+
+def _mem_get(key):
+    with _mem_lock:
+        hit = _mem.get(key)
+        if hit and hit[0] > time.time():
+            _mem.move_to_end(key)
+            return hit[1]
+        if hit:
+            del _mem[key]
+    return None
+
+
+def _mem_put(key, address, expires_at):
+    with _mem_lock:
+        _mem[key] = (expires_at, address)
+        _mem.move_to_end(key)
+        while len(_mem) > _setting("GEOCODE_CACHE_SIZE", 5000):
+            _mem.popitem(last=False)
+
+
+def _db_get(key):
+    from django.utils import timezone
+    from .models import GeocodeCache
+    try:
+        row = GeocodeCache.objects.filter(cell=key, expires_at__gt=timezone.now()) \
+            .values_list("address", "expires_at").first()
+    except Exception:
+        metrics.incr("geocode.db_read_error")   # treat as a miss; the provider still answers
+        return None
+    return (row[0], row[1].timestamp()) if row else None
+
+
+def _db_put(key, address):
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import GeocodeCache
+    try:
+        GeocodeCache.objects.bulk_create(
+            [GeocodeCache(cell=key, address=address, expires_at=timezone.now() + timedelta(seconds=_ttl()))],
+            update_conflicts=True, unique_fields=["cell"], update_fields=["address", "expires_at"],
+        )
+    except Exception:
+        metrics.incr("geocode.db_write_error")
+
+
+# ---------- Nominatim ----------
+def _fetch(lat: float, lng: float) -> dict:
+    r = outbound.get(
+        "nominatim",
+        f"{_setting('NOMINATIM_BASE_URL', 'https://nominatim.openstreetmap.org')}/reverse",
+        params={"format": "jsonv2", "lat": lat, "lon": lng, "addressdetails": 1},
+        retries=0,  # a retry would spend another token of the 1 req/s budget
+    )
+    r.raise_for_status()
+    a = r.json().get("address", {})
+    return {
+        "address_line1": f"{a.get('house_number', '')} {a.get('road', '')}".strip(),
+        "address_line2": "",
+        "city": a.get("city") or a.get("town") or a.get("village") or "",
+        "state": a.get("state") or "",
+        "postal_code": a.get("postcode") or "",
+    }
+
+
+_inflight = {}   # cell -> Future of (address or None, state)
+_inflight_lock = threading.Lock()
+
+
+def reverse_geocode(lat: float, lng: float):
+    """
+    (address dict or None, state); state is "memory" | "db" | "fetched" |
+    "coalesced" | "throttled" | "error".
+    """
+    key = cell(lat, lng)
+    address = _mem_get(key)
+    if address is not None:
+        metrics.incr("geocode.memory_hit")
+        return address, "memory"
+    hit = _db_get(key)
+    if hit is not None:
+        metrics.incr("geocode.db_hit")
+        _mem_put(key, hit[0], hit[1])
+        return hit[0], "db"
+
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+    if not leader:
+        metrics.incr("geocode.coalesced")
+        try:
+            # The leader's whole budget: token wait + connect + read
+            address, state = fut.result(timeout=_setting("GEOCODE_MAX_WAIT_MS", 250) / 1000.0 + sum(outbound.timeouts()))
+        except FutureTimeout:
+            return None, "error"
+        return address, ("coalesced" if address is not None else state)
+
+    metrics.incr("geocode.miss")
+    result = (None, "error")
+    try:
+        if not _get_bucket().acquire(_setting("GEOCODE_MAX_WAIT_MS", 250) / 1000.0):
+            metrics.incr("geocode.throttled")
+            result = (None, "throttled")
+        else:
+            # Round the query too, so the cached answer is the one for the cell
+            p = _setting("GEOCODE_PRECISION", 4)
+            address = _fetch(round(lat, p), round(lng, p))
+            _mem_put(key, address, time.time() + _ttl())
+            result = (address, "fetched")
+    except Exception:
+        metrics.incr("geocode.error")
+    finally:
+        # Release followers as soon as the outcome is known, error or not
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        fut.set_result(result)
+    if result[1] == "fetched":
+        _db_put(key, result[0])
+    return result
+
+
+def retry_after() -> int:
+    """Whole seconds until the limiter frees a token (for Retry-After)."""
+    rate = _setting("GEOCODE_RATE", 1.0)
+    return max(1, int(round(1 / rate))) if rate > 0 else 60
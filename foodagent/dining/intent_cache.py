@@ -0,0 +1,109 @@
+# dining/intent_cache.py
+"""
+Two-tier cache for LLM intent parses.
+
+Keyed by sha256(model + normalized prompt). A per-process LRU answers
+repeat prompts in microseconds; IntentCacheEntry rows survive restarts and
+are shared between workers. Both tiers honour INTENT_CACHE_TTL. Works
+without Django configured (memory tier only), like nlp.py.
+"""
+import copy
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+_WORD = re.compile(r"[\w$']+")
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Case, spacing and punctuation don't change intent; "$$" does
+    return " ".join(_WORD.findall((prompt or "").lower()))
+
+
+def make_key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_prompt(prompt)}".encode()).hexdigest()
+
+
+class IntentCache:
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or _setting("INTENT_CACHE_SIZE", 10000)
+        self.ttl = ttl or _setting("INTENT_CACHE_TTL", 7 * 24 * 3600)
+        self._mem = OrderedDict()   # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def _mem_put(self, key, payload, expires_at):
+        with self._lock:
+            self._mem[key] = (expires_at, payload)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.maxsize:
+                self._mem.popitem(last=False)
+
+    def get(self, key):
+        """Cached payload (a private copy) or None."""
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and hit[0] > now:
+                self._mem.move_to_end(key)
+                metrics.incr("intent_cache.memory_hit")
+                return copy.deepcopy(hit[1])
+            if hit:
+                del self._mem[key]
+
+        payload = self._db_get(key)
+        if payload is not None:
+            metrics.incr("intent_cache.db_hit")
+            self._mem_put(key, payload[0], payload[1])
+            return copy.deepcopy(payload[0])
+        metrics.incr("intent_cache.miss")
+        return None
+
+    def set(self, key, model, prompt, payload):
+        expires_at = time.time() + self.ttl
+        self._mem_put(key, copy.deepcopy(payload), expires_at)
+        self._db_set(key, model, prompt, payload)
+
+    # ---------- DB tier ----------
+    def _db_get(self, key):
+        try:
+            from django.utils import timezone
+            from .models import IntentCacheEntry
+            row = IntentCacheEntry.objects.filter(key=key, expires_at__gt=timezone.now()) \
+                .values_list("payload", "expires_at").first()
+        except Exception:
+            return None
+        if not row:
+            return None
+        return row[0], row[1].timestamp()
+
+    def _db_set(self, key, model, prompt, payload):
+        try:
+            from datetime import timedelta
+            from django.utils import timezone
+            from .models import IntentCacheEntry
+            IntentCacheEntry.objects.bulk_create(
+                [IntentCacheEntry(key=key, model=model, prompt=prompt[:2000], payload=payload,
+                                  expires_at=timezone.now() + timedelta(seconds=self.ttl))],
+                update_conflicts=True, unique_fields=["key"], update_fields=["payload", "expires_at"],
+            )
+        except Exception:
+            metrics.incr("intent_cache.db_write_error")
+
+    def clear_memory(self):
+        with self._lock:
+            self._mem.clear()
+
+
+intent_cache = IntentCache()
@@ -0,0 +1,67 @@
+# dining/management/commands/bench_recommender.py
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dining.benchmark import STRATEGIES, actors_from_history, history_split, run, synthetic_actors
+
+
+class Command(BaseCommand):
+    help = ("Replay historical (or synthetic) activity against each recommender strategy and "
+            "print latency percentiles, queries per call and hit-rate@k as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--strategies", default="",
+                            help=f"Comma-separated subset of: {', '.join(STRATEGIES)}")
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Generate N synthetic actors instead of replaying EventLog.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--cutoff", type=float, default=0.8,
+                            help="Quantile of event time that splits history from ground truth.")
+        parser.add_argument("--include-adds", action="store_true",
+                            help="Count later add-to-cart events as hits, not just purchases.")
+        parser.add_argument("--max-actors", type=int, default=None)
+        parser.add_argument("--out", default="", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **opts):
+        names = [s.strip() for s in opts["strategies"].split(",") if s.strip()] or list(STRATEGIES)
+        unknown = [n for n in names if n not in STRATEGIES]
+        if unknown:
+            raise CommandError(f"Unknown strategies: {', '.join(unknown)}")
+
+        as_of = None
+        if opts["synthetic"]:
+            source = "synthetic"
+            actors = synthetic_actors(opts["synthetic"], seed=opts["seed"])
+        else:
+            source = "eventlog"
+            as_of = history_split(opts["cutoff"])
+            targets = ("buy", "add") if opts["include_adds"] else ("buy",)
+            actors = actors_from_history(cutoff=opts["cutoff"], max_actors=opts["max_actors"],
+                                         target_events=targets)
+
+        report = {
+            "commit": _git_commit(),
+            "generated_at": timezone.now().isoformat(),
+            "source": source,
+            "k": opts["k"],
+            "actors": len(actors),
+            "as_of": as_of.isoformat() if as_of else None,
+            "strategies": run(actors, k=opts["k"], names=names, as_of=as_of),
+        }
+        out = json.dumps(report, indent=2)
+        if opts["out"]:
+            with open(opts["out"], "w") as f:
+                f.write(out + "\n")
+        self.stdout.write(out)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ""
@@ -0,0 +1,87 @@
+# dining/management/commands/fake_providers.py
+import json
+import random
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dining.fakes import PROVIDERS, load_profiles, serve, stripe_signature
+
+
+class Command(BaseCommand):
+    help = ("Run deterministic local stand-ins for Google Places, Tavily, Nominatim, Gemini, "
+            "OpenAI and Stripe. Point the app at them with FAKE_PROVIDERS_URL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--seed", type=int, default=0, help="Seed for latency and error draws.")
+        parser.add_argument("--config", help='JSON file: {"google": {"latency": "lognormal:150:0.4", '
+                                             '"error_rate": 0.02, "error_status": 503, "payload": {...}}, ...}')
+        parser.add_argument("--latency", action="append", default=[], metavar="PROVIDER=SPEC",
+                            help="fixed:MS | uniform:LO:HI | normal:MEAN:SD | lognormal:MEDIAN:SIGMA (repeatable).")
+        parser.add_argument("--error-rate", action="append", default=[], metavar="PROVIDER=P",
+                            help="Fraction of requests answered with an error (repeatable).")
+        parser.add_argument("--verbose-log", action="store_true", help="Log every request.")
+        parser.add_argument("--emit-webhook", metavar="URL",
+                            help="Instead of serving, POST one signed checkout.session.completed to URL and exit.")
+        parser.add_argument("--order-id", default="")
+        parser.add_argument("--cart-id", default="")
+
+    def _overrides(self, items, key, cast):
+        out = {}
+        for item in items:
+            name, sep, value = item.partition("=")
+            if not sep or name not in PROVIDERS:
+                raise CommandError(f"expected PROVIDER=VALUE with PROVIDER in {', '.join(PROVIDERS)}: {item!r}")
+            out[name] = {key: cast(value)}
+        return out
+
+    def handle(self, *args, **opts):
+        if opts["emit_webhook"]:
+            return self._emit_webhook(opts)
+
+        config = {}
+        if opts["config"]:
+            with open(opts["config"]) as f:
+                config = json.load(f)
+        for extra in (self._overrides(opts["latency"], "latency", str),
+                      self._overrides(opts["error_rate"], "error_rate", float)):
+            for name, cfg in extra.items():
+                config.setdefault(name, {}).update(cfg)
+        try:
+            profiles = load_profiles(config)
+            for p in profiles.values():
+                p.sample_ms(random.Random(0))  # validate specs up front
+        except (TypeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        srv = serve(opts["host"], opts["port"], profiles=profiles, seed=opts["seed"], quiet=not opts["verbose_log"])
+        base = f"http://{opts['host']}:{opts['port']}"
+        self.stdout.write(f"Fake providers on {base} — run the app with FAKE_PROVIDERS_URL={base}")
+        for name, p in profiles.items():
+            self.stdout.write(f"  {name:<10} latency={p.latency} error_rate={p.error_rate}"
+                              + (" (canned payload)" if p.payload is not None else ""))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            srv.shutdown()
+            self.stdout.write(f"Requests served: {srv.counts}")
+
+    def _emit_webhook(self, opts):
+        secret = getattr(settings, "STRIPE_WEBHOOK_SECRET", "")
+        if not secret:
+            raise CommandError("STRIPE_WEBHOOK_SECRET is not set.")
+        event = {
+            "id": f"evt_fake_{int(time.time())}", "object": "event", "type": "checkout.session.completed",
+            "data": {"object": {"id": f"cs_test_fake_{opts['order_id'] or opts['cart_id']}", "object": "checkout.session",
+                                "payment_status": "paid",
+                                "metadata": {"order_id": opts["order_id"], "cart_id": opts["cart_id"]}}},
+        }
+        body = json.dumps(event).encode()
+        r = requests.post(opts["emit_webhook"], data=body, timeout=10, headers={
+            "Content-Type": "application/json", "Stripe-Signature": stripe_signature(body, secret)})
+        self.stdout.write(f"{r.status_code} {r.text[:200]}")
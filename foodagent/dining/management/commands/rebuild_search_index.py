@@ -0,0 +1,18 @@
+# dining/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from dining.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text menu search index from MenuItem and Tag rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        if not fts_enabled():
+            self.stdout.write("No FTS5 index on this database; search uses the ORM fallback.")
+            return
+        n = rebuild_index(chunk_size=opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} menu items."))
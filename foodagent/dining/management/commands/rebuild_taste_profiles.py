@@ -0,0 +1,16 @@
+# dining/management/commands/rebuild_taste_profiles.py
+from django.core.management.base import BaseCommand
+
+from dining.recommender import rebuild_taste_profiles
+
+
+class Command(BaseCommand):
+    help = "Rebuild every TasteProfile from the full EventLog history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="EventLog rows fetched per round trip.")
+
+    def handle(self, *args, **opts):
+        n = rebuild_taste_profiles(chunk_size=opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {n} taste profiles."))
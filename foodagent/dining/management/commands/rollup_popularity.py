@@ -0,0 +1,33 @@
+# dining/management/commands/rollup_popularity.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dining.popularity import reset_popularity, rollup_popularity
+
+
+class Command(BaseCommand):
+    help = "Fold new EventLog rows into time-decayed MenuItem.popularity_score."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--reset", action="store_true",
+                            help="Drop the high-water mark and rebuild scores from all history.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep running every POPULARITY_ROLLUP_INTERVAL seconds.")
+
+    def handle(self, *args, **opts):
+        if opts["reset"]:
+            reset_popularity()
+        while True:
+            t0 = time.perf_counter()
+            stats = rollup_popularity(chunk_size=opts["chunk_size"])
+            ms = (time.perf_counter() - t0) * 1000
+            self.stdout.write(
+                f"Folded {stats['events']} events into {stats['items']} items "
+                f"(high-water {stats['last_id']}, {stats['gaps']} gaps open) in {ms:.0f} ms."
+            )
+            if not opts["loop"]:
+                break
+            time.sleep(getattr(settings, "POPULARITY_ROLLUP_INTERVAL", 300))
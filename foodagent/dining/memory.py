@@ -0,0 +1,161 @@
+# dining/memory.py
+"""
+Server-side conversation memory for the agent.
+
+Each request appends its turns in one bulk insert. Reads load only the
+last AGENT_MEMORY_TURNS messages through the (session, -id) index plus the
+session's rolling summary; older messages are folded into that summary once
+the live window doubles, so the prompt stays inside AGENT_CONTEXT_TOKENS no
+matter how long the conversation runs.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AgentMessage, AgentSession
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENC = None
+
+SUMMARY_LINE_CHARS = 160
+
+
+def _turns():
+    return getattr(settings, "AGENT_MEMORY_TURNS", 12)
+
+
+def _budget():
+    return getattr(settings, "AGENT_CONTEXT_TOKENS", 1500)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENC is not None:
+        return len(_ENC.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1  # ~4 chars per token for English
+
+
+# ---------- sessions ----------
+def get_session(user=None, guest_token: str = "", session_id=None) -> AgentSession:
+    """The caller's session: the one asked for (if it's theirs), else their latest, else a new one."""
+    qs = AgentSession.objects.filter(user=user) if user is not None else \
+        AgentSession.objects.filter(user__isnull=True, guest_token=guest_token)
+    if session_id:
+        try:
+            s = qs.filter(id=int(session_id)).first()
+        except (TypeError, ValueError):
+            s = None
+        if s:
+            return s
+    elif user is not None or guest_token:
+        s = qs.order_by("-updated_at").first()
+        if s:
+            return s
+    return AgentSession.objects.create(user=user, guest_token="" if user is not None else guest_token)
+
+
+def session_for_request(request, session_id=None) -> AgentSession:
+    from .views import get_guest_token
+    if request.user.is_authenticated:
+        return get_session(user=request.user, session_id=session_id)
+    return get_session(guest_token=get_guest_token(request), session_id=session_id)
+
+
+# ---------- writes ----------
+def append_turns(session: AgentSession, turns):
+    """
+    Store one request's turns with a single INSERT.
+    turns: [{"role": ..., "content": ..., "tool_name"?: ..., "payload"?: ...}]
+    """
+    rows = [AgentMessage(session=session, role=t["role"], content=t.get("content", ""),
+                         tool_name=t.get("tool_name", ""), payload=t.get("payload"))
+            for t in turns]
+    if not rows:
+        return
+    AgentMessage.objects.bulk_create(rows)
+    AgentSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    maybe_summarize(session)
+
+
+def _summary_line(role, content, payload):
+    text = " ".join((content or "").split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 1] + "…"
+    ids = (payload or {}).get("suggestions") or (payload or {}).get("added")
+    if ids:
+        text += f" [items {', '.join(f'#{i}' for i in ids[:6])}]"
+    return f"{role}: {text}"
+
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """Keep the newest lines of text that fit in budget tokens."""
+    kept, used = [], 0
+    for line in reversed(text.splitlines()):
+        n = count_tokens(line)
+        if used + n > budget:
+            break
+        kept.append(line)
+        used += n
+    return "\n".join(reversed(kept))
+
+
+def maybe_summarize(session: AgentSession):
+    """Fold everything older than the live window into the rolling summary, once it's 2x the window."""
+    k = _turns()
+    live = AgentMessage.objects.filter(session=session, id__gt=session.summarized_upto)
+    # Keyset probe: is there a message 2k back from the newest?
+    edge = list(live.order_by("-id").values_list("id", flat=True)[k:2 * k + 1])
+    if len(edge) <= k:
+        return
+    upto = edge[0]
+    old = live.filter(id__lte=upto).order_by("id").values_list("role", "content", "payload")
+    lines = [_summary_line(r, c, p) for r, c, p in old if r != "tool"]
+    summary = "\n".join(filter(None, [session.summary, *lines]))
+    session.summary = trim_to_tokens(summary, _budget() // 3)
+    session.summarized_upto = upto
+    AgentSession.objects.filter(pk=session.pk).update(summary=session.summary, summarized_upto=upto)
+
+
+# ---------- reads ----------
+def recent_messages(session: AgentSession, k=None) -> list:
+    """Last k messages not yet summarised, oldest first (one indexed query)."""
+    k = k or _turns()
+    rows = AgentMessage.objects.filter(session=session, id__gt=session.summarized_upto) \
+        .order_by("-id").values("id", "role", "content", "tool_name", "payload")[:k]
+    return list(reversed(rows))
+
+
+def build_context(session: AgentSession, budget=None) -> list:
+    """
+    [{"role", "content"}] for the LLM: the rolling summary, then as many of
+    the most recent turns as fit in the token budget.
+    """
+    budget = budget or _budget()
+    out, used = [], 0
+    if session.summary:
+        summary = trim_to_tokens(session.summary, budget // 3)
+        used += count_tokens(summary)
+        out.append({"role": "system", "content": "Earlier in this conversation:\n" + summary})
+    turns = []
+    for m in reversed(recent_messages(session)):
+        if m["role"] == "tool":
+            continue
+        n = count_tokens(m["content"])
+        if used + n > budget:
+            break
+        turns.append({"role": m["role"], "content": m["content"]})
+        used += n
+    return out + list(reversed(turns))
+
+
+def last_suggestions(session: AgentSession) -> list:
+    """Item ids the assistant last suggested in this session, in the order shown."""
+    for m in reversed(recent_messages(session)):
+        ids = (m["payload"] or {}).get("suggestions") if m["role"] == "assistant" else None
+        if ids:
+            return ids
+    return []
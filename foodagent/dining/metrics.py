@@ -0,0 +1,65 @@
+# dining/metrics.py
+"""
+Tiny in-process metrics: counters and latency summaries.
+
+Per worker process (no external backend); exported as JSON at /api/metrics/.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = defaultdict(lambda: deque(maxlen=1024))   # recent samples per name, in ms
+
+
+def incr(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def observe(name: str, ms: float):
+    with _lock:
+        _timings[name].append(ms)
+
+
+class timer:
+    """with metrics.timer("provider.google"): ...  -> records elapsed ms."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self._t0) * 1000
+        observe(self.name, self.ms)
+        return False
+
+
+def _pct(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(p / 100 * (len(sorted_vals) - 1))))
+    return round(sorted_vals[i], 3)
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        samples = {k: sorted(v) for k, v in _timings.items()}
+    return {
+        "counters": counters,
+        "timings_ms": {
+            k: {"n": len(v), "p50": _pct(v, 50), "p95": _pct(v, 95), "p99": _pct(v, 99)}
+            for k, v in samples.items()
+        },
+    }
+
+
+def ratio(hits: str, misses: str) -> float:
+    with _lock:
+        h, m = _counters.get(hits, 0), _counters.get(misses, 0)
+    return round(h / (h + m), 4) if (h + m) else 0.0
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def seed_scores(apps, schema_editor):
+    # Start the decayed score from the hand-seeded prior
+    MenuItem = apps.get_model('dining', 'MenuItem')
+    MenuItem.objects.update(popularity_score=models.F('popularity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0002_tasteprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('as_of', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(seed_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0003_popularity_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationSlate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_key', models.CharField(max_length=80, unique=True)),
+                ('item_ids', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
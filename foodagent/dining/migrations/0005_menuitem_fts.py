@@ -0,0 +1,40 @@
+from django.db import migrations
+
+FTS_TABLE = 'dining_menuitem_fts'
+
+
+def create_fts(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'sqlite':
+        return  # search.py falls back to icontains on other backends
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, description, tags, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cur.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, tags) "
+            "SELECT m.id, m.name, m.description, COALESCE(("
+            "  SELECT group_concat(t.name, ' ') FROM dining_menuitem_tags mt"
+            "  JOIN dining_tag t ON t.id = mt.tag_id WHERE mt.menuitem_id = m.id), '') "
+            "FROM dining_menuitem m"
+        )
+
+
+def drop_fts(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0004_recommendationslate'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0006_intentcacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guest_token', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('summarized_upto', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AgentMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('user', 'user'), ('assistant', 'assistant'), ('tool', 'tool')], max_length=16)),
+                ('content', models.TextField(blank=True, default='')),
+                ('tool_name', models.CharField(blank=True, default='', max_length=64)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dining.agentsession')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allergens', models.ManyToManyField(blank=True, limit_choices_to={'kind__in': ['allergen', 'feature']}, related_name='avoided_by', to='dining.tag')),
+                ('diets', models.ManyToManyField(blank=True, limit_choices_to={'kind': 'diet'}, related_name='preferred_by', to='dining.tag')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='agentsession',
+            index=models.Index(fields=['user', '-updated_at'], name='dining_agen_user_id_251733_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentsession',
+            index=models.Index(fields=['guest_token', '-updated_at'], name='dining_agen_guest_t_2f430d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentmessage',
+            index=models.Index(fields=['session', '-id'], name='dining_agen_session_2fb1c7_idx'),
+        ),
+    ]
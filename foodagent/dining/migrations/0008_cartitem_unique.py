@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Older code could create the same dish twice in a cart; fold them into one line
+    CartItem = apps.get_model("dining", "CartItem")
+    dupes = CartItem.objects.values("cart_id", "menu_item_id") \
+        .annotate(n=Count("id"), keep=Min("id"), total=Sum("qty")).filter(n__gt=1)
+    for d in dupes.iterator():
+        CartItem.objects.filter(id=d["keep"]).update(qty=d["total"])
+        CartItem.objects.filter(cart_id=d["cart_id"], menu_item_id=d["menu_item_id"]).exclude(id=d["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0007_agent_memory'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'menu_item'), name='uniq_cart_menu_item'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0009_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=16)),
+                ('external_id', models.CharField(max_length=255, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('rating', models.FloatField(blank=True, null=True)),
+                ('price_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('address', models.CharField(blank=True, default='', max_length=255)),
+                ('maps_url', models.URLField(blank=True, default='', max_length=500)),
+                ('photo_url', models.CharField(blank=True, default='', max_length=1200)),
+                ('highlights', models.TextField(blank=True, default='')),
+                ('terms', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlaceCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=12)),
+                ('keyword', models.CharField(max_length=255)),
+                ('results', models.PositiveIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'keyword'), name='uniq_place_coverage')],
+            },
+        ),
+    ]
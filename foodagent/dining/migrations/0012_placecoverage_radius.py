@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0011_rollupcheckpoint_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placecoverage',
+            name='radius',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0012_placecoverage_radius'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationslate',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
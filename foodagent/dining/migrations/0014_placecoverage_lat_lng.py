@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dining', '0013_recommendationslate_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placecoverage',
+            name='lat',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='placecoverage',
+            name='lng',
+            field=models.FloatField(null=True),
+        ),
+    ]
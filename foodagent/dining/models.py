@@ -26,7 +26,8 @@ class MenuItem(models.Model):
     description = models.TextField(blank=True)
     tags = models.ManyToManyField(Tag, blank=True)
     is_available = models.BooleanField(default=True)
-    popularity = models.PositiveIntegerField(default=0)  # quick signal
+    popularity = models.PositiveIntegerField(default=0)  # hand-seeded prior
+    popularity_score = models.FloatField(default=0, db_index=True)  # decayed, from EventLog (popularity.py)
 
     def __str__(self):
         return self.name
@@ -41,6 +42,10 @@ class CartItem(models.Model):
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     qty = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        # One line per dish; lets cartops.py upsert with ON CONFLICT
+        constraints = [models.UniqueConstraint(fields=["cart", "menu_item"], name="uniq_cart_menu_item")]
+
 class Order(models.Model):
     STATUS = [('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('canceled', 'Canceled')]
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
@@ -64,6 +69,78 @@ class EventLog(models.Model):
     event_type = models.CharField(max_length=16, choices=EVENT)
     ts = models.DateTimeField(auto_now_add=True)
 
+class TasteProfile(models.Model):
+    # One row per user ("u:<id>") or guest ("g:<token>"); kept current by signals.
+    actor_key = models.CharField(max_length=80, unique=True)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    guest_token = models.CharField(max_length=64, blank=True)
+    tag_scores = models.JSONField(default=dict)   # {tag name: decayed weight} as of updated_at
+    top_tags = models.JSONField(default=list)     # pre-sorted, what infer_user_taste returns
+    updated_at = models.DateTimeField()
+
+class RecommendationSlate(models.Model):
+    # Precomputed top-N item ids per actor (see slates.py); marked stale when the actor's taste changes
+    actor_key = models.CharField(max_length=80, unique=True)
+    item_ids = models.JSONField(default=list)
+    computed_at = models.DateTimeField()
+    stale = models.BooleanField(default=False)
+
+class IntentCacheEntry(models.Model):
+    # Persistent tier of the LLM intent cache (intent_cache.py)
+    key = models.CharField(max_length=64, unique=True)   # sha256(model + normalized prompt)
+    model = models.CharField(max_length=64)
+    prompt = models.TextField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+class GeocodeCache(models.Model):
+    # Shared tier of the reverse-geocode cache (geocoding.py)
+    cell = models.CharField(max_length=32, unique=True)   # "lat,lng" rounded to GEOCODE_PRECISION
+    address = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+class Place(models.Model):
+    # Every provider result with coordinates, kept for local-first search (places.py)
+    source = models.CharField(max_length=16)                      # "google", ...
+    external_id = models.CharField(max_length=255, unique=True)   # provider place id
+    name = models.CharField(max_length=255)
+    lat = models.FloatField()
+    lng = models.FloatField()
+    rating = models.FloatField(null=True, blank=True)
+    price_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    address = models.CharField(max_length=255, blank=True, default="")
+    maps_url = models.URLField(max_length=500, blank=True, default="")
+    photo_url = models.CharField(max_length=1200, blank=True, default="")
+    highlights = models.TextField(blank=True, default="")
+    # Lowercased name + types + every keyword that returned this place
+    terms = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class PlaceCoverage(models.Model):
+    # When a provider last answered `keyword` within `radius` metres of (lat, lng), a point in geohash `cell`
+    cell = models.CharField(max_length=12)
+    keyword = models.CharField(max_length=255)
+    lat = models.FloatField(null=True)
+    lng = models.FloatField(null=True)
+    radius = models.PositiveIntegerField(default=0)
+    results = models.PositiveIntegerField(default=0)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["cell", "keyword"], name="uniq_place_coverage")]
+
+class RollupCheckpoint(models.Model):
+    # High-water mark for incremental batch jobs over EventLog
+    name = models.CharField(max_length=64, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    gaps = models.JSONField(default=list, blank=True)  # skipped ids below last_id that may still commit
+    as_of = models.DateTimeField(null=True, blank=True)
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -78,6 +155,15 @@ class AgentSession(models.Model):
     guest_token = models.CharField(max_length=64, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Rolling summary of every message with id <= summarized_upto (see memory.py)
+    summary = models.TextField(blank=True, default="")
+    summarized_upto = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-updated_at"]),
+            models.Index(fields=["guest_token", "-updated_at"]),
+        ]
 
 class AgentMessage(models.Model):
     ROLE_CHOICES = (("user","user"),("assistant","assistant"),("tool","tool"))
@@ -86,4 +172,8 @@ class AgentMessage(models.Model):
     content = models.TextField(blank=True, default="")
     tool_name = models.CharField(max_length=64, blank=True, default="")
     payload = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Keyset reads: last K messages of a session, newest first
+        indexes = [models.Index(fields=["session", "-id"])]
@@ -1,5 +1,10 @@
 # dining/nlp.py
-import os, re, json
+import os, re, json, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from . import metrics
+from .intent_cache import intent_cache, make_key
+from .nlu import Matcher
 
 # Optional Django settings (works even if Django not loaded in early scripts)
 try:
@@ -16,16 +21,20 @@ CUISINE_WORDS = [
     "seafood","breakfast",
 ]
 
+MOOD_WORDS = ["comfort","spicy","cozy","quick","date","study","quiet","trendy"]
+
+# Compiled once: one pass over the prompt finds every cuisine and mood word
+_RULES = Matcher({"cuisine": CUISINE_WORDS, "mood": MOOD_WORDS}, plurals=False)
+_HEALTHY = re.compile(r"\b(healthy|light|low[- ]cal|keto|low[- ]carb|salad)\b")
+_BUDGET = re.compile(r"(\${1,4})")
+
 def parse_intent_rules(prompt: str):
     p = (prompt or "").lower().strip()
-    healthy = bool(re.search(r"\b(healthy|light|low[- ]cal|keto|low[- ]carb|salad)\b", p))
-    mood = None
-    for m in ["comfort","spicy","cozy","quick","date","study","quiet","trendy"]:
-        if re.search(rf"\b{re.escape(m)}\b", p):
-            mood = m
-            break
-    cuisines = [w for w in CUISINE_WORDS if re.search(rf"\b{re.escape(w)}\b", p)]
-    m = re.search(r"(\${1,4})", p)
+    healthy = bool(_HEALTHY.search(p))
+    hits = {phrase for _, phrase in _RULES.find(p)}
+    mood = next((m for m in MOOD_WORDS if m in hits), None)
+    cuisines = [w for w in CUISINE_WORDS if w in hits]
+    m = _BUDGET.search(p)
     budget = len(m.group(1)) if m else None
 
     parts = []
@@ -54,33 +63,39 @@ try:
 except Exception:
     _GENAI_OK = False
 
-def parse_intent_with_gemini(prompt: str):
-    """
-    Best effort: returns a dict. Falls back to rules if anything goes wrong.
-    """
-    base = parse_intent_rules(prompt)
-
-    if not _GENAI_OK or not _GEMINI_API_KEY:
-        return base
-
+_SYS_PROMPT = (
+    "Extract user dining intent as strict JSON with keys:\n"
+    "{healthy: boolean, mood: string|null, cuisines: string[], budget: integer|null, keyword: string}.\n"
+    "budget is number of $ (1..4) if present, else null. Only output JSON."
+)
+
+_model = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    """Configured Gemini client, created once per process."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                base = _get_setting("GEMINI_BASE_URL", "")
+                # REST transport so a plain-HTTP base URL (dining/fakes.py) works too
+                genai.configure(api_key=_GEMINI_API_KEY,
+                                **({"transport": "rest", "client_options": {"api_endpoint": base}} if base else {}))
+                # Force JSON out (requires google-generativeai >= 0.7.x)
+                _model = genai.GenerativeModel(
+                    _GEMINI_MODEL,
+                    generation_config={
+                        "response_mime_type": "application/json",
+                        "temperature": 0.2,
+                    },
+                )
+    return _model
+
+def _gemini_parse(prompt: str, base: dict):
+    """One Gemini round trip merged over the rules result; None on any failure."""
     try:
-        genai.configure(api_key=_GEMINI_API_KEY)
-
-        # Force JSON out (requires google-generativeai >= 0.7.x)
-        model = genai.GenerativeModel(
-            _GEMINI_MODEL,
-            generation_config={
-                "response_mime_type": "application/json",
-                "temperature": 0.2,
-            },
-        )
-
-        sys = (
-            "Extract user dining intent as strict JSON with keys:\n"
-            "{healthy: boolean, mood: string|null, cuisines: string[], budget: integer|null, keyword: string}.\n"
-            "budget is number of $ (1..4) if present, else null. Only output JSON."
-        )
-        resp = model.generate_content([sys, prompt], request_options={"timeout": 10})
+        resp = _get_model().generate_content([_SYS_PROMPT, prompt], request_options={"timeout": 10})
 
         raw = getattr(resp, "text", "") or ""
         # Some older client versions wrap JSON in code fences — strip safely:
@@ -94,17 +109,84 @@ def parse_intent_with_gemini(prompt: str):
 
         data = json.loads(raw or "{}")
         # Merge with base so we always have all fields
-        out = {
+        return {
             "healthy": bool(data.get("healthy", base["healthy"])),
             "mood": (data.get("mood") if data.get("mood") not in ("", "null", None) else base["mood"]),
             "cuisines": data.get("cuisines") or base["cuisines"],
             "budget": (int(data["budget"]) if str(data.get("budget","")).isdigit() else base["budget"]),
             "keyword": data.get("keyword") or base["keyword"],
         }
-        return out
     except Exception:
-        # Any Gemini issue -> safe fallback
+        return None
+
+# ---------- Hedged LLM call ----------
+# The LLM runs in a small thread pool; callers wait at most the deadline and
+# otherwise go with the rules parse. A late answer still lands in the cache.
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = {}   # cache key -> Future, so concurrent identical prompts share one call
+_inflight_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=int(_get_setting("INTENT_LLM_WORKERS", 4)),
+                                           thread_name_prefix="intent-llm")
+    return _pool
+
+def _llm_task(key: str, prompt: str, base: dict):
+    try:
+        with metrics.timer("intent.llm"):
+            out = _gemini_parse(prompt, base)
+        if out is None:
+            # Not cached, so we retry next time
+            metrics.incr("intent.llm_error")
+        else:
+            intent_cache.set(key, _GEMINI_MODEL, prompt, out)
+        return out
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        if _HAS_DJANGO:
+            from django.db import close_old_connections
+            close_old_connections()
+
+def _submit(key: str, prompt: str, base: dict):
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        if fut is None:
+            fut = _inflight[key] = _get_pool().submit(_llm_task, key, prompt, base)
+    return fut
+
+def parse_intent_with_gemini(prompt: str, deadline_ms=None):
+    """
+    Best effort: returns a dict. Falls back to rules if anything goes wrong.
+    Successful LLM parses are cached (memory + DB) by normalized prompt and model.
+    Waits at most deadline_ms (INTENT_LLM_DEADLINE_MS) for the LLM; <= 0 waits for it.
+    """
+    base = parse_intent_rules(prompt)
+
+    if not _GENAI_OK or not _GEMINI_API_KEY:
+        return base
+
+    key = make_key(prompt, _GEMINI_MODEL)
+    hit = intent_cache.get(key)
+    if hit is not None:
+        return hit
+
+    if deadline_ms is None:
+        deadline_ms = int(_get_setting("INTENT_LLM_DEADLINE_MS", 300))
+    fut = _submit(key, prompt, base)
+    try:
+        out = fut.result(timeout=deadline_ms / 1000 if deadline_ms > 0 else None)
+    except FuturesTimeout:
+        # Rules answer now; the LLM keeps going and warms the cache
+        metrics.incr("intent.deadline_miss")
         return base
+    metrics.incr("intent.deadline_hit")
+    return out if out is not None else base
 
 
 def parse_intent(prompt: str):
@@ -0,0 +1,254 @@
+# dining/nlu.py
+"""
+Vocabulary matching and message parsing shared by the chat agent and the
+websearch intent rules.
+
+A Matcher compiles a whole vocabulary into one word-bounded regex
+alternation, so a prompt is scanned once instead of once per word, and
+"pizzazz" no longer matches "pizza". The chat vocabulary is the built-in
+word lists merged with the Tag table, loaded once per process and
+refreshed when tags change (see signals.py). parse() turns a message into
+an immutable ParsedMessage that is memoised, so every caller handling the
+same request shares one parse.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# ---------- matcher ----------
+class Matcher:
+    """One compiled alternation over many phrases, each mapped to its categories."""
+
+    def __init__(self, vocab: dict, plurals: bool = True):
+        self.categories = {}
+        for cat, words in vocab.items():
+            for w in words:
+                w = (w or "").lower().strip()
+                if w:
+                    self.categories.setdefault(w, [])
+                    if cat not in self.categories[w]:
+                        self.categories[w].append(cat)
+        # Longest first so "gluten-free" wins over "gluten" at the same position
+        alts = "|".join(re.escape(w) for w in sorted(self.categories, key=len, reverse=True))
+        suffix = r"(?:e?s)?" if plurals else ""
+        self._re = re.compile(rf"\b({alts}){suffix}\b" if alts else r"(?!x)x")
+
+    def find(self, text: str) -> list:
+        """[(category, phrase)] in order of first appearance; text must be lowercase."""
+        out, seen = [], set()
+        for phrase in self._re.findall(text):
+            if phrase in seen:
+                continue
+            seen.add(phrase)
+            out.extend((cat, phrase) for cat in self.categories[phrase])
+        return out
+
+
+# ---------- chat vocabulary ----------
+BASE_VOCAB = {
+    "cuisine": ["thai", "indian", "mexican", "italian", "japanese", "chinese", "korean", "mediterranean"],
+    "diet": ["vegan", "vegetarian", "halal", "gluten-free", "keto", "low-carb", "high-protein"],
+    "features": ["spicy", "mild", "dessert", "salad", "bowl", "grilled", "noodles", "soup", "burger",
+                 "pizza", "wrap", "sushi", "taco", "burrito", "sandwich", "fries"],
+    "allergens": ["nuts", "peanut", "dairy", "egg", "shellfish", "gluten"],
+}
+# Tag.kind -> prefs key
+KIND_TO_CATEGORY = {"cuisine": "cuisine", "diet": "diet", "feature": "features", "allergen": "allergens"}
+# "gluten-free" also means "avoid gluten-tagged items"
+IMPLIED = {"gluten-free": ("allergens", "gluten"), "dairy-free": ("allergens", "dairy"),
+           "nut-free": ("allergens", "nuts")}
+
+_vocab = None          # (Matcher, version, built_at)
+_vocab_lock = threading.Lock()
+_vocab_version = 0
+
+
+def _vocab_ttl():
+    try:
+        from django.conf import settings
+        return getattr(settings, "NLU_VOCAB_TTL", 300)
+    except Exception:
+        return 300
+
+
+def _load_vocabulary() -> Matcher:
+    vocab = {cat: list(words) for cat, words in BASE_VOCAB.items()}
+    try:
+        from .models import Tag
+        for kind, name in Tag.objects.values_list("kind", "name"):
+            cat = KIND_TO_CATEGORY.get(kind)
+            if cat and name:
+                vocab[cat].append(name)
+    except Exception:
+        pass  # no DB yet (early scripts, migrations): built-in words only
+    return Matcher(vocab)
+
+
+def get_vocabulary():
+    """(Matcher, version) for chat messages; rebuilt after invalidate_vocabulary() or TTL."""
+    global _vocab, _vocab_version
+    cur = _vocab
+    ttl = _vocab_ttl()
+    if cur is None or (ttl > 0 and time.monotonic() - cur[2] > ttl):
+        with _vocab_lock:
+            if _vocab is None or (ttl > 0 and time.monotonic() - _vocab[2] > ttl):
+                _vocab_version += 1
+                _vocab = (_load_vocabulary(), _vocab_version, time.monotonic())
+            cur = _vocab
+    return cur[0], cur[1]
+
+
+def invalidate_vocabulary():
+    global _vocab
+    _vocab = None
+
+
+# ---------- add / remove by ID ----------
+ADD_VERBS = ("order", "add", "buy", "get", "take", "i'll take", "i will take")
+REMOVE_VERBS = ("remove", "delete", "drop")
+
+_ADD_RE = re.compile(r"\b(?:" + "|".join(ADD_VERBS) + r")\b(.*)$", re.I)
+_REMOVE_RE = re.compile(r"\b(?:" + "|".join(REMOVE_VERBS) + r")\b(.*)$", re.I)
+_ID_QTY_RE = re.compile(r"#?\b(\d{1,6})\b(?:\s*(?:x|qty)\s*(\d{1,3}))?", re.I)
+_ID_RE = re.compile(r"#?\b(\d{1,6})\b")
+_PRICE_PHRASE = re.compile(r"(?:under|below|less\s*than|<=?)\s*\$?\s*\d+(?:\.\d{1,2})?", re.I)
+_PRICE_CAP = re.compile(r"(?:under|below|<=?)\s*\$?(\d+(?:\.\d{1,2})?)")
+
+
+# ---------- ordinals ("the first two", "the second one", "the last") ----------
+_ORDINAL = {"first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2,
+            "fourth": 3, "4th": 3, "fifth": 4, "5th": 4, "last": -1}
+_COUNT = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+_ORDINAL_RANGE = re.compile(r"\b(?:first|top)\s+(one|two|three|four|five|[1-9])\b", re.I)
+_ORDINAL_REF = re.compile(
+    r"\b(?:(the)\s+)?(?:(?:first|top)\s+(one|two|three|four|five|[1-9])|(both)"
+    r"|(" + "|".join(_ORDINAL) + r")(\s+(?:one|item|dish|option)s?)?)\b", re.I)
+_LEAD = re.compile(r"\s*(?:me\s+|us\s+)?$", re.I)   # "get me both"
+_JOIN = re.compile(r"\s*(?:,|and|&|,\s*and)\s*$", re.I)
+
+
+def extract_ordinals(msg: str):
+    """
+    Positions (0-based, -1 = last) into the previous suggestion list, for
+    "order the first two", "add the second and the last one", "get both".
+    msg is the text after the add verb. A bare "first"/"last" only counts
+    right after "the" or as part of a list ("the second and third"); a
+    range, "both" or "second one" also counts right after the verb. So
+    "what should I get first?" and "what did I get last time?" aren't orders.
+    """
+    out, prev_end = [], None
+    for m in _ORDINAL_REF.finditer(msg):
+        the, count, both, word, noun = m.groups()
+        before = msg[prev_end:m.start()] if prev_end is not None else None
+        chained = before is not None and _JOIN.match(before)
+        leading = _LEAD.match(msg[:m.start()]) and (count or both or noun)
+        if not (the or chained or leading):
+            continue
+        if count:
+            out.extend(range(_COUNT.get(count.lower()) or int(count)))
+        elif both:
+            out.extend((0, 1))
+        else:
+            out.append(_ORDINAL[word.lower()])
+        prev_end = m.end()
+    return list(dict.fromkeys(out))
+
+
+def _strip_price_phrases(s: str) -> str:
+    # Avoid treating prices as IDs (e.g., "order under $12 ramen")
+    # or ordinal counts as IDs ("order the first 2")
+    return _ORDINAL_RANGE.sub("", _PRICE_PHRASE.sub("", s))
+
+
+def extract_add_items(msg: str):
+    """
+    Returns list of (item_id, qty). Supports:
+      "add 23", "order 23 and 45", "buy #12, 19", "get item 7 x2", "add 31 qty 3"
+    Ignores price phrases like 'under $12'.
+    """
+    m = _ADD_RE.search(msg)
+    if not m:
+        return []
+    merged = {}  # de-dup IDs by summing quantities
+    for iid, q in _ID_QTY_RE.findall(_strip_price_phrases(m.group(1))):
+        merged[int(iid)] = merged.get(int(iid), 0) + (int(q) if q else 1)
+    return list(merged.items())
+
+
+def extract_remove_items(msg: str):
+    m = _REMOVE_RE.search(msg)
+    if not m:
+        return []
+    return list(dict.fromkeys(int(i) for i in _ID_RE.findall(m.group(1))))  # unique, keep order
+
+
+# ---------- parsed message ----------
+@dataclass(frozen=True)
+class ParsedMessage:
+    text: str
+    intents: tuple
+    cuisine: tuple = ()
+    diet: tuple = ()
+    features: tuple = ()
+    allergens: tuple = ()
+    price_cap: Optional[float] = None
+    add_items: tuple = ()       # ((item_id, qty), ...)
+    remove_items: tuple = ()
+    ordinals: tuple = ()        # positions in the last suggestions, after an add verb
+
+    @property
+    def is_order(self) -> bool:
+        """Only an order if we saw numeric IDs or "the first two"-style references."""
+        return bool(self.add_items or self.ordinals)
+
+    def prefs(self) -> dict:
+        """A fresh, mutable prefs dict in the shape the agent/serializers expect."""
+        return {"cuisine": list(self.cuisine), "diet": list(self.diet), "features": list(self.features),
+                "price_cap": self.price_cap, "allergens": list(self.allergens)}
+
+
+def parse(msg: str) -> ParsedMessage:
+    matcher, version = get_vocabulary()
+    return _parse(msg or "", version, matcher)
+
+
+@lru_cache(maxsize=2048)
+def _parse(msg: str, version: int, matcher: Matcher) -> ParsedMessage:
+    low = msg.lower()
+    found = {"cuisine": [], "diet": [], "features": [], "allergens": []}
+    for cat, phrase in matcher.find(low):
+        if phrase not in found[cat]:
+            found[cat].append(phrase)
+        implied = IMPLIED.get(phrase)
+        if implied and implied[1] not in found[implied[0]]:
+            found[implied[0]].append(implied[1])
+
+    # price like: "under 15", "below $12", "<= 10.99"
+    m = _PRICE_CAP.search(low)
+    price_cap = float(m.group(1)) if m else None
+
+    add_items = tuple(extract_add_items(low))
+    remove_items = tuple(extract_remove_items(low))
+    m = _ADD_RE.search(low)
+    ordinals = tuple(extract_ordinals(m.group(1))) if m else ()
+    intents = []
+    if add_items or ordinals:
+        intents.append("add_to_cart")
+    if "checkout" in low:
+        intents.append("checkout")
+    if "show cart" in low or "view cart" in low:
+        intents.append("show_cart")
+    if remove_items:
+        intents.append("remove_item")
+    if not intents:
+        intents.append("discover")
+
+    return ParsedMessage(
+        text=msg, intents=tuple(intents),
+        cuisine=tuple(found["cuisine"]), diet=tuple(found["diet"]),
+        features=tuple(found["features"]), allergens=tuple(found["allergens"]),
+        price_cap=price_cap, add_items=add_items, remove_items=remove_items, ordinals=ordinals,
+    )
@@ -0,0 +1,125 @@
+# dining/outbound.py
+"""
+One HTTP client for every third-party call (Google, Tavily, Nominatim, Stripe).
+
+A single requests.Session per process keeps a keep-alive pool per host, so
+repeat calls skip the TCP/TLS handshake. Every call gets the same
+(connect, read) timeouts; idempotent calls are retried a bounded number of
+times on connection errors, 429 and 5xx, with full-jitter exponential
+backoff. Latency and outcomes are recorded per provider in metrics.py
+(outbound.<provider>, outbound.<provider>.ok|error|retry).
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+USER_AGENT = "OSU-Dining/1.0 (contact@example.com)"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def timeouts():
+    return (_setting("OUTBOUND_CONNECT_TIMEOUT", 3.05), _setting("OUTBOUND_READ_TIMEOUT", 10.0))
+
+
+def session() -> requests.Session:
+    """The shared, pooled session (built once per process)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                size = _setting("OUTBOUND_POOL_SIZE", 16)
+                # Retries are done in request() so they can be jittered and counted
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=size, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers["User-Agent"] = USER_AGENT
+                _session = s
+    return _session
+
+
+def _backoff(attempt: int, resp=None) -> float:
+    base = _setting("OUTBOUND_BACKOFF_MS", 200) / 1000.0
+    delay = random.uniform(0, base * (2 ** attempt))  # full jitter
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), 5.0))
+    return delay
+
+
+def request(provider: str, method: str, url: str, *, idempotent=None, retries=None, timeout=None, **kwargs):
+    """
+    session().request() with the shared timeouts, retries and metrics.
+    idempotent defaults from the method; pass True for POSTs that are safe
+    to repeat (e.g. search APIs). Returns the last Response (callers still
+    raise_for_status()), or raises the last connection error.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retries = _setting("OUTBOUND_RETRIES", 2) if retries is None else retries
+    attempts = 1 + (retries if idempotent else 0)
+    timeout = timeout or timeouts()
+    name = f"outbound.{provider}"
+
+    for attempt in range(attempts):
+        resp = None
+        try:
+            with metrics.timer(name):
+                resp = session().request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.incr(f"{name}.error")
+            if attempt + 1 >= attempts:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                metrics.incr(f"{name}.ok" if resp.status_code < 400 else f"{name}.error")
+                return resp
+            metrics.incr(f"{name}.error")
+            resp.close()
+        metrics.incr(f"{name}.retry")
+        time.sleep(_backoff(attempt, resp))
+
+
+def get(provider: str, url: str, **kwargs):
+    return request(provider, "GET", url, **kwargs)
+
+
+def post(provider: str, url: str, **kwargs):
+    return request(provider, "POST", url, **kwargs)
+
+
+# ---------- Stripe ----------
+def configure_stripe():
+    """Route the stripe library through the shared session, timeouts and metrics."""
+    import stripe
+
+    class _Client(stripe.RequestsClient):
+        def request(self, method, url, headers, post_data=None):
+            name = "outbound.stripe"
+            try:
+                with metrics.timer(name):
+                    out = super().request(method, url, headers, post_data)
+            except Exception:
+                metrics.incr(f"{name}.error")
+                raise
+            metrics.incr(f"{name}.ok" if out[1] < 400 else f"{name}.error")
+            return out
+
+    stripe.default_http_client = _Client(timeout=timeouts(), session=session())
+    # Stripe sends idempotency keys on retried POSTs, so its own retry loop is safe
+    stripe.max_network_retries = _setting("OUTBOUND_RETRIES", 2)
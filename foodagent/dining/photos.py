@@ -0,0 +1,222 @@
+# dining/photos.py
+"""
+Local thumbnail cache for Google place photos (/media/place-photo/<ref>).
+
+A photo is fetched from Google once, with the API key kept server-side,
+and resized with Pillow to each of WIDTHS. The variants are stored under
+PLACE_PHOTO_DIR by content hash, so identical photos behind different
+refs share files; a small ref -> hash index points at them. Concurrent
+requests for the same ref share one fetch. When the directory grows past
+PLACE_PHOTO_CACHE_MB, the least recently served files (variants and index
+entries alike) are evicted down to 80% of the limit.
+
+Every fetch is billed to our key, so only refs we handed out are served:
+photo URLs carry an HMAC of the ref (sign()), checked before any fetch.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image
+
+from . import metrics, outbound
+
+WIDTHS = (160, 400, 800)
+REF_RE = re.compile(r"^[A-Za-z0-9_-]{8,1024}$")
+TOUCH_EVERY = 24 * 3600   # refresh a served file's mtime (its LRU stamp) at most daily
+BLOCK = 4096              # index entries are tiny but each still takes a disk block
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _root() -> Path:
+    return Path(_setting("PLACE_PHOTO_DIR", Path(settings.BASE_DIR) / "var" / "place-photos"))
+
+
+def snap_width(w) -> int:
+    """Smallest stored width >= w (the largest if w is bigger than all)."""
+    try:
+        w = int(w)
+    except (TypeError, ValueError):
+        return WIDTHS[1]
+    return next((x for x in WIDTHS if x >= w), WIDTHS[-1])
+
+
+def sign(ref: str) -> str:
+    """Signature put in photo URLs we issue; get_photo() refuses refs without it."""
+    return salted_hmac("dining.photos.ref", ref).hexdigest()[:20]
+
+
+def _ref_path(ref: str) -> Path:
+    return _root() / "refs" / hashlib.sha1(ref.encode()).hexdigest()
+
+
+def _variant_path(digest: str, width: int) -> Path:
+    return _root() / digest[:2] / f"{digest}_{width}.jpg"
+
+
+def _write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)   # readers never see a half-written file
+
+
+# ---------- fetch + resize ----------
+def _resize(raw: bytes) -> dict:
+    """{width: jpeg bytes} for every width in WIDTHS (never upscaled)."""
+    with Image.open(io.BytesIO(raw)) as im:
+        im = im.convert("RGB")
+        out = {}
+        for w in WIDTHS:
+            copy = im.copy()
+            copy.thumbnail((w, w * 4), Image.LANCZOS)
+            buf = io.BytesIO()
+            copy.save(buf, "JPEG", quality=82, optimize=True, progressive=True)
+            out[w] = buf.getvalue()
+    return out
+
+
+def _fetch(ref: str) -> str:
+    """Download, resize and store ref; returns its content hash."""
+    r = outbound.get(
+        "google_photo",
+        f"{_setting('GOOGLE_PLACES_BASE_URL', 'https://maps.googleapis.com/maps/api')}/place/photo",
+        params={"maxwidth": WIDTHS[-1], "photoreference": ref, "key": _setting("GOOGLE_PLACES_API_KEY", "")},
+    )
+    r.raise_for_status()
+    digest = hashlib.sha256(r.content).hexdigest()
+    if not all(_variant_path(digest, w).exists() for w in WIDTHS):
+        written = 0
+        for w, data in _resize(r.content).items():
+            _write(_variant_path(digest, w), data)
+            written += len(data)
+        _track(written, keep=(digest,))
+    _write(_ref_path(ref), digest.encode())
+    _track(BLOCK, keep=(digest, _ref_path(ref).name))
+    metrics.incr("photos.fetch")
+    return digest
+
+
+_inflight = {}   # ref -> Future of content hash
+_inflight_lock = threading.Lock()
+
+
+def _touch(path: Path, mtime: float):
+    try:
+        if time.time() - mtime > TOUCH_EVERY:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _digest_for(ref: str) -> str:
+    path = _ref_path(ref)
+    try:
+        with open(path) as f:
+            digest = f.read().strip()
+            mtime = os.fstat(f.fileno()).st_mtime
+        if _variant_path(digest, WIDTHS[0]).exists():
+            _touch(path, mtime)
+            return digest
+    except OSError:
+        pass
+    with _inflight_lock:
+        fut = _inflight.get(ref)
+        leader = fut is None
+        if leader:
+            fut = _inflight[ref] = Future()
+    if not leader:
+        return fut.result(timeout=outbound.timeouts()[1] * 2)
+    try:
+        digest = _fetch(ref)
+        fut.set_result(digest)
+        return digest
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(ref, None)
+
+
+def get_photo(ref: str, width, sig: str = "") -> tuple:
+    """
+    (open file, etag) of the stored variant; raises ValueError for a bad or
+    unsigned ref. The file is opened here so a concurrent eviction can't pull
+    it away.
+    """
+    if not REF_RE.match(ref or "") or not constant_time_compare(sig or "", sign(ref)):
+        raise ValueError("bad photo reference")
+    width = snap_width(width)
+    digest = _digest_for(ref)
+    path = _variant_path(digest, width)
+    try:
+        fh = open(path, "rb")
+        metrics.incr("photos.hit")
+    except FileNotFoundError:   # evicted since the index was read
+        digest = _fetch(ref)
+        path = _variant_path(digest, width)
+        fh = open(path, "rb")
+    _touch(path, os.fstat(fh.fileno()).st_mtime)
+    return fh, f'"{digest[:32]}-{width}"'
+
+
+# ---------- size-based eviction ----------
+_size = None   # bytes under _root(), counted lazily
+_size_lock = threading.Lock()
+
+
+def _files():
+    root = _root()
+    if not root.exists():
+        return []
+    return list(root.glob("*/*.jpg")) + list(root.glob("refs/[0-9a-f]*"))
+
+
+def _cost(st) -> int:
+    return max(st.st_size, BLOCK)
+
+
+def _track(added: int, keep: tuple = ()):
+    """Account for added bytes; evict if over the limit, sparing files named with a prefix in keep."""
+    global _size
+    limit = _setting("PLACE_PHOTO_CACHE_MB", 256) * 1024 * 1024
+    with _size_lock:
+        if _size is None:
+            _size = sum(_cost(p.stat()) for p in _files())
+        else:
+            _size += added
+        if _size <= limit:
+            return
+        # Oldest-served first, down to 80% so eviction doesn't run on every write
+        files = []
+        for p in _files():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, _cost(st), p))
+        files.sort(key=lambda x: x[0])
+        total = sum(s for _, s, _ in files)
+        for _, size, p in files:
+            if total <= limit * 0.8:
+                break
+            if keep and p.name.startswith(keep):
+                continue
+            try:
+                p.unlink()
+                total -= size
+                metrics.incr("photos.evicted")
+            except OSError:
+                pass
+        _size = total
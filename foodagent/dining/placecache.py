@@ -0,0 +1,170 @@
+# dining/placecache.py
+"""
+Geo-bucketed cache for websearch provider results.
+
+Nearby callers asking the same thing share one entry, keyed by
+provider, geohash cell (precision picked from the radius), radius bucket,
+normalised keyword, open_now and budget. Entries are served fresh for
+WEBSEARCH_CACHE_TTL (WEBSEARCH_CACHE_OPEN_NOW_TTL when open_now, since
+opening state changes), then served stale for up to
+WEBSEARCH_CACHE_STALE_TTL while one background refresh replaces them.
+Callers re-rank the shared list by their own distance.
+
+Later result pages (Google pagination) live next to an entry under a
+cursor derived from its key, so anyone served that entry can poll them.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+RADIUS_BUCKETS = (500, 1000, 2000, 5000, 10000, 15000)
+
+
+def geohash(lat: float, lng: float, precision: int = 6) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            ch = (ch << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = (ch << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def _precision(radius: int) -> int:
+    # Cell well under the radius: 7 ≈ 150 m, 6 ≈ 1.2 km x 0.6 km, 5 ≈ 4.9 km
+    if radius <= 1000:
+        return 7
+    if radius <= 5000:
+        return 6
+    return 5
+
+
+def _radius_bucket(radius: int) -> int:
+    return next((b for b in RADIUS_BUCKETS if radius <= b), RADIUS_BUCKETS[-1])
+
+
+def normalize_keyword(keyword: str) -> str:
+    from .intent_cache import normalize_prompt
+    # Word order doesn't change a place search: "open ramen" == "ramen open"
+    return " ".join(sorted(set(normalize_prompt(keyword).split())))
+
+
+def cache_key(provider, lat, lng, radius, keyword, open_now, budget) -> str:
+    cell = geohash(lat, lng, _precision(radius))
+    kw = hashlib.sha1(normalize_keyword(keyword).encode()).hexdigest()[:16]  # memcached-safe
+    return f"ws:{provider}:{cell}:{_radius_bucket(radius)}:{int(bool(open_now))}:{budget or 0}:{kw}"
+
+
+# ---------- cache ----------
+def _ttls(open_now: bool):
+    """(fresh, keep) seconds; open_now entries are kept stale only briefly."""
+    if open_now:
+        fresh = getattr(settings, "WEBSEARCH_CACHE_OPEN_NOW_TTL", 120)
+        return fresh, fresh * 3
+    fresh = getattr(settings, "WEBSEARCH_CACHE_TTL", 900)
+    return fresh, max(fresh, getattr(settings, "WEBSEARCH_CACHE_STALE_TTL", 3600))
+
+
+def _cache():
+    return caches[getattr(settings, "WEBSEARCH_CACHE_ALIAS", "default")]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_refreshing = set()   # keys with a background refresh in flight
+_refreshing_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="websearch-refresh")
+    return _pool
+
+
+def _store(key, results, open_now):
+    _, keep = _ttls(open_now)
+    _cache().set(key, {"results": results, "fetched_at": time.time()}, timeout=keep)
+
+
+def _refresh(key, fetch, open_now):
+    try:
+        results = fetch()
+        if results is not None:
+            _store(key, results, open_now)
+            metrics.incr("websearch.cache.refresh")
+    except Exception:
+        metrics.incr("websearch.cache.refresh_error")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def cached_search(key: str, fetch, open_now=False):
+    """
+    Results for key, calling fetch() (-> list, or None on error) only on a
+    miss; stale entries are returned at once and refreshed in the background.
+    Returns (results or None, "fresh" | "stale" | "miss").
+    """
+    if getattr(settings, "WEBSEARCH_CACHE_TTL", 900) <= 0:
+        return fetch(), "miss"
+    entry = _cache().get(key)
+    if entry is not None:
+        fresh, _ = _ttls(open_now)
+        if time.time() - entry["fetched_at"] <= fresh:
+            metrics.incr("websearch.cache.fresh_hit")
+            return entry["results"], "fresh"
+        metrics.incr("websearch.cache.stale_hit")
+        with _refreshing_lock:
+            start = key not in _refreshing
+            _refreshing.add(key)
+        if start:
+            _get_pool().submit(_refresh, key, fetch, open_now)
+        return entry["results"], "stale"
+
+    metrics.incr("websearch.cache.miss")
+    results = fetch()
+    if results is not None:
+        _store(key, results, open_now)
+    return results, "miss"
+
+
+# ---------- result pages ----------
+def cursor_for(key: str) -> str:
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def load_pages(cursor: str):
+    """{"pages": [[...], ...], "done": bool} or None if unknown/expired."""
+    return _cache().get(f"wsp:{cursor}")
+
+
+def save_pages(cursor: str, state: dict, open_now=False):
+    _, keep = _ttls(open_now)
+    _cache().set(f"wsp:{cursor}", state, timeout=keep)
+
+
+def hit_ratio() -> float:
+    snap = metrics.snapshot()["counters"]
+    hits = snap.get("websearch.cache.fresh_hit", 0) + snap.get("websearch.cache.stale_hit", 0)
+    total = hits + snap.get("websearch.cache.miss", 0)
+    return round(hits / total, 4) if total else 0.0
@@ -0,0 +1,237 @@
+# dining/places.py
+"""
+Local store of every place the providers have returned, for offline
+nearest-neighbour search.
+
+Provider results with coordinates are upserted into Place (one query per
+batch). Each worker keeps an in-memory KD-tree over the places' unit-sphere
+positions (scipy's cKDTree; brute-force NumPy without scipy), reloaded every
+PLACE_INDEX_TTL seconds. Places this process writes in between go into a
+small pending set that queries scan directly; the tree is rebuilt early
+only once that holds PLACE_INDEX_MAX_PENDING places. A query takes the
+candidates within the radius, filters them by keyword, computes exact
+haversine distances with NumPy in one go and returns the nearest N.
+
+PlaceCoverage records when a provider last answered a keyword around a
+geohash cell, from which point and for what radius; search_places answers
+locally only while that is younger than PLACE_COVERAGE_TTL, the query's
+circle lies inside the fetched one, and the local result set (after the
+budget filter) still has PLACE_MIN_RESULTS.
+"""
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import Place, PlaceCoverage
+from .placecache import geohash, normalize_keyword
+
+try:
+    from scipy.spatial import cKDTree
+except Exception:   # optional: NumPy brute force below
+    cKDTree = None
+
+EARTH_R = 6371000.0
+COVERAGE_PRECISION = 6   # ≈ 1.2 km x 0.6 km cells
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _unit_xyz(lat, lng):
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+def haversine_m(lat, lng, lats, lngs):
+    """Distances in metres from one point to arrays of points."""
+    p1, p2 = np.radians(lat), np.radians(lats)
+    dp = p2 - p1
+    dl = np.radians(lngs) - np.radians(lng)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_R * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# ---------- in-memory index ----------
+class PlaceIndex:
+    FIELDS = ("id", "name", "lat", "lng", "rating", "price_level", "address", "maps_url",
+              "photo_url", "highlights", "external_id", "terms")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.lat = np.array([r["lat"] for r in rows], dtype=float)
+        self.lng = np.array([r["lng"] for r in rows], dtype=float)
+        self.xyz = _unit_xyz(self.lat, self.lng) if rows else np.empty((0, 3))
+        self.tree = cKDTree(self.xyz) if (cKDTree is not None and rows) else None
+        self.built_at = time.monotonic()
+        # external_id -> row written since the build; replaced (never mutated) so readers need no lock
+        self.pending = {}
+
+    @classmethod
+    def load(cls):
+        return cls(list(Place.objects.values(*cls.FIELDS)))
+
+    def candidates(self, lat, lng, radius):
+        """Row indices within radius metres (a superset is fine; distances are exact later)."""
+        if not self.rows:
+            return np.empty(0, dtype=int)
+        chord = 2 * np.sin(min(radius / EARTH_R, np.pi) / 2)   # great-circle -> straight-line distance
+        centre = _unit_xyz(lat, lng)[0]
+        if self.tree is not None:
+            return np.asarray(self.tree.query_ball_point(centre, chord * 1.000001), dtype=int)
+        return np.flatnonzero(np.linalg.norm(self.xyz - centre, axis=1) <= chord * 1.000001)
+
+    def nearest(self, lat, lng, radius, keyword="", limit=20):
+        idx = self.candidates(lat, lng, radius)
+        tokens = normalize_keyword(keyword).split()
+        tokens = [t for t in tokens if t not in ("restaurant", "restaurants", "food", "near", "me")]
+        pending = self.pending
+        if pending and len(idx):   # the pending copy of a place supersedes the tree's
+            idx = np.array([i for i in idx if self.rows[i]["external_id"] not in pending], dtype=int)
+        if tokens and len(idx):
+            idx = np.array([i for i in idx if any(t in self.rows[i]["terms"] for t in tokens)], dtype=int)
+        rows = [self.rows[i] for i in idx]
+        lats, lngs = self.lat[idx], self.lng[idx]
+        if pending:
+            extra = [r for r in pending.values() if not tokens or any(t in r["terms"] for t in tokens)]
+            rows += extra
+            lats = np.concatenate((lats, [r["lat"] for r in extra]))
+            lngs = np.concatenate((lngs, [r["lng"] for r in extra]))
+        if not rows:
+            return []
+        dist = haversine_m(lat, lng, lats, lngs)
+        inside = np.flatnonzero(dist <= radius)
+        order = inside[np.argsort(dist[inside], kind="stable")[:limit]]
+        return [(rows[o], int(dist[o])) for o in order]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _stale(idx) -> bool:
+    return (idx is None or time.monotonic() - idx.built_at > _setting("PLACE_INDEX_TTL", 60)
+            or len(idx.pending) > _setting("PLACE_INDEX_MAX_PENDING", 500))
+
+
+def get_index() -> PlaceIndex:
+    global _index
+    idx = _index
+    if _stale(idx):
+        with _index_lock:
+            if _stale(_index):
+                with metrics.timer("places.index_build"):
+                    _index = PlaceIndex.load()
+            idx = _index
+    return idx
+
+
+def _add_pending(places):
+    """Make just-written places visible to this worker without rebuilding the tree."""
+    rows = {p.external_id: {f: getattr(p, f) for f in PlaceIndex.FIELDS} for p in places}
+    with _index_lock:   # a build in progress may have loaded before these were committed
+        if _index is not None:
+            _index.pending = {**_index.pending, **rows}
+
+
+# ---------- writes ----------
+def _terms(place: dict, keyword: str) -> str:
+    bits = [place.get("name") or "", place.get("highlights") or "", keyword]
+    return " ".join(sorted(set(" ".join(bits).lower().replace(",", " ").split())))
+
+
+def record(provider: str, keyword: str, lat: float, lng: float, results, cover=True, radius=0) -> int:
+    """
+    Upsert results that have coordinates and (with cover) stamp coverage
+    for (cell, keyword) out to radius metres. Returns the number of places stored.
+    """
+    keyword = normalize_keyword(keyword)
+    rows = {}
+    for r in results or []:
+        if not isinstance(r.get("lat"), (int, float)) or not isinstance(r.get("lng"), (int, float)):
+            continue
+        ext = r.get("place_id") or r.get("maps_url")
+        if not ext:
+            continue
+        rows[ext] = Place(
+            source=provider, external_id=ext[:255], name=(r.get("name") or "")[:255],
+            lat=r["lat"], lng=r["lng"], rating=r.get("rating"), price_level=r.get("price_level"),
+            address=(r.get("address") or "")[:255], maps_url=(r.get("maps_url") or "")[:500],
+            photo_url=(r.get("photo_url") or "")[:1200], highlights=r.get("highlights") or "",
+            terms=_terms(r, keyword),
+        )
+    if rows:
+        # Keep keywords other searches attached to these places
+        old = dict(Place.objects.filter(external_id__in=list(rows)).values_list("external_id", "terms"))
+        for ext, p in rows.items():
+            if old.get(ext):
+                p.terms = " ".join(sorted(set(old[ext].split()) | set(p.terms.split())))
+        Place.objects.bulk_create(
+            list(rows.values()), update_conflicts=True, unique_fields=["external_id"],
+            update_fields=["name", "lat", "lng", "rating", "price_level", "address", "maps_url",
+                           "photo_url", "highlights", "terms", "updated_at"],
+        )
+        _add_pending(rows.values())
+    if cover:
+        PlaceCoverage.objects.bulk_create(
+            [PlaceCoverage(cell=geohash(lat, lng, COVERAGE_PRECISION), keyword=keyword[:255], lat=lat, lng=lng,
+                           radius=int(radius), results=len(rows), fetched_at=timezone.now())],
+            update_conflicts=True, unique_fields=["cell", "keyword"],
+            update_fields=["lat", "lng", "radius", "results", "fetched_at"],
+        )
+    metrics.incr("places.recorded", len(rows))
+    return len(rows)
+
+
+# ---------- reads ----------
+def _as_result(row, dist):
+    return {
+        "place_id": row["external_id"],
+        "name": row["name"],
+        "lat": row["lat"],
+        "lng": row["lng"],
+        "rating": row["rating"],
+        "price_level": row["price_level"],
+        "address": row["address"],
+        "distance_m": dist,
+        "maps_url": row["maps_url"],
+        "photo_url": row["photo_url"],
+        "highlights": row["highlights"],
+        "menus": [],
+    }
+
+
+def nearby(lat: float, lng: float, radius: int, keyword: str = "", limit: int = 20) -> list:
+    """Nearest places matching keyword within radius metres, closest first, as search results."""
+    with metrics.timer("places.nearby"):
+        return [_as_result(row, d) for row, d in get_index().nearest(lat, lng, radius, keyword, limit)]
+
+
+def local_search(lat: float, lng: float, radius: int, keyword: str, limit: int = 20, budget=None):
+    """
+    Results (within budget, if given) if a fresh provider answer for this
+    keyword covered the whole query circle and local results are thick
+    enough, else None.
+    """
+    fresh_after = timezone.now() - timedelta(seconds=_setting("PLACE_COVERAGE_TTL", 7 * 24 * 3600))
+    row = PlaceCoverage.objects.filter(
+        cell=geohash(lat, lng, COVERAGE_PRECISION), keyword=normalize_keyword(keyword)[:255],
+        radius__gte=radius, fetched_at__gte=fresh_after, lat__isnull=False,
+    ).values_list("lat", "lng", "radius").first()
+    # The fetch was centred anywhere in the cell: the query circle must fit inside it
+    if row is None or haversine_m(lat, lng, row[0], row[1]) + radius > row[2]:
+        metrics.incr("places.local_miss")
+        return None
+    results = nearby(lat, lng, radius, keyword, limit)
+    if budget:
+        results = [r for r in results if r["price_level"] is None or r["price_level"] <= budget]
+    if len(results) < _setting("PLACE_MIN_RESULTS", 8):
+        metrics.incr("places.local_thin")
+        return None
+    metrics.incr("places.local_hit")
+    return results
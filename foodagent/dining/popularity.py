@@ -0,0 +1,92 @@
+# dining/popularity.py
+"""
+Time-decayed item popularity from EventLog.
+
+Each run ages every MenuItem.popularity_score by the time since the last
+run, then folds in EventLog rows above the stored high-water mark, weighted
+by event type. Ranking reads the scores through the in-process engine, so
+requests never ORDER BY the whole menu.
+
+Ids are handed out at insert but rows appear at commit, so a concurrent
+transaction can commit a row below the high-water mark after a run has
+passed it. Each run records the ids it skipped (gaps) within the last
+POPULARITY_GAP_WINDOW ids and looks for them again next time; a gap that
+never fills (a rolled-back insert) ages out of the window.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .engine import invalidate_engine
+from .models import EventLog, MenuItem, RollupCheckpoint
+from .recommender import EVENT_WEIGHTS, _decay_factor
+
+JOB_NAME = "popularity"
+
+
+def _half_life_days():
+    return getattr(settings, "POPULARITY_HALF_LIFE_DAYS", 7)
+
+
+def _gap_window():
+    return getattr(settings, "POPULARITY_GAP_WINDOW", 10000)
+
+
+def rollup_popularity(chunk_size: int = 5000) -> dict:
+    """Fold new events into popularity_score. Safe to run repeatedly."""
+    now = timezone.now()
+    hl = _half_life_days()
+    with transaction.atomic():
+        cp, created = RollupCheckpoint.objects.select_for_update().get_or_create(name=JOB_NAME)
+        if created or cp.as_of is None:
+            # First run: start from the hand-seeded prior and replay all history
+            MenuItem.objects.update(popularity_score=F("popularity"))
+        else:
+            f = _decay_factor(cp.as_of, now, hl)
+            if f < 1.0:
+                MenuItem.objects.update(popularity_score=F("popularity_score") * f)
+
+        gains = defaultdict(float)
+        window = _gap_window()
+        gaps = set(cp.gaps or [])
+        last_id = cp.last_id
+        # A range from the oldest gap rather than id IN (gaps): up to a window of
+        # ids would blow past SQLite's bind-parameter limit
+        start = min(gaps) if gaps else cp.last_id + 1
+        events = EventLog.objects.filter(id__gte=start).order_by("id") \
+            .values_list("id", "menu_item_id", "event_type", "ts")
+        n_events = 0
+        for eid, iid, etype, ts in events.iterator(chunk_size=chunk_size):
+            if eid <= cp.last_id:
+                if eid not in gaps:
+                    continue        # folded by an earlier run
+                gaps.discard(eid)   # committed late: fold it now
+            else:
+                gaps.update(range(max(last_id + 1, eid - window), eid))
+                last_id = eid
+            n_events += 1
+            if iid:
+                gains[iid] += EVENT_WEIGHTS.get(etype, 1.0) * _decay_factor(ts, now, hl)
+
+        ids = list(gains)
+        for i in range(0, len(ids), chunk_size):
+            batch = list(MenuItem.objects.filter(id__in=ids[i:i + chunk_size]).only("id", "popularity_score"))
+            for it in batch:
+                it.popularity_score += gains[it.id]
+            MenuItem.objects.bulk_update(batch, ["popularity_score"], batch_size=1000)
+
+        cp.last_id = last_id
+        cp.gaps = sorted(g for g in gaps if g > last_id - window)
+        cp.as_of = now
+        cp.save(update_fields=["last_id", "gaps", "as_of"])
+
+    invalidate_engine()
+    return {"events": n_events, "items": len(ids), "last_id": last_id, "gaps": len(cp.gaps)}
+
+
+def reset_popularity():
+    """Forget the high-water mark; the next rollup replays from scratch."""
+    RollupCheckpoint.objects.filter(name=JOB_NAME).delete()
@@ -0,0 +1,226 @@
+# dining/ranking.py
+"""
+Multi-signal ranking for websearch results.
+
+Each registered feature turns the whole result list into one NumPy column
+(rating, log-distance, price gap to the budget, keyword/cuisine match,
+mood, healthy, open now). The columns form an n x k matrix, and one
+matrix-vector product with the weights scores every result. Weights
+default to those passed to @feature; WEBSEARCH_RANK_WEIGHTS overrides
+any of them, and 0 turns a feature off. With debug=True each result
+carries its per-feature contributions, and per-feature build times come
+back alongside.
+
+Add a signal by decorating fn(batch, ctx) -> array of len(batch).
+"""
+import re
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from operator import itemgetter
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+EARTH_R = 6371000.0
+HEALTHY_TERMS = ("healthy", "salad", "vegan", "vegetarian", "bowl", "poke", "grill", "mediterranean",
+                 "juice", "smoothie", "organic", "fresh", "greek")
+_STOP = {"restaurant", "restaurants", "food", "near", "me", "open", "now", "best", "good", "place", "places"}
+_WORD = re.compile(r"[a-z0-9]+")
+
+FEATURES = {}   # name -> (fn, default weight), in registration (= matrix column) order
+
+
+def feature(name: str, weight: float):
+    def register(fn):
+        FEATURES[name] = (fn, weight)
+        return fn
+    return register
+
+
+@dataclass
+class RankContext:
+    lat: float
+    lng: float
+    intent: dict = field(default_factory=dict)
+    budget: Optional[int] = None
+    open_now: bool = False
+    radius: int = 2000
+
+
+_OPEN = {True: 1.0, False: -1.0}
+_COLUMNS = ("lat", "lng", "rating", "price_level", "open_now", "name", "highlights", "address")
+_get_columns = itemgetter(*_COLUMNS)
+
+
+class Batch:
+    """Columns shared by the features, extracted from the results in one pass."""
+
+    def __init__(self, results, ctx: RankContext):
+        self.n = len(results)
+        try:
+            rows = [_get_columns(r) for r in results]   # normalized results carry every key
+        except KeyError:
+            rows = [tuple(r.get(k) for k in _COLUMNS) for r in results]
+        lat, lng, rating, price, open_now, name, highlights, address = list(zip(*rows)) or [()] * len(_COLUMNS)
+        self.lat = _num(lat)
+        self.lng = _num(lng)
+        self.rating = _num(rating)
+        self.price = _num(price)
+        self.open = np.array([_OPEN.get(v, 0.0) for v in open_now], dtype=float)
+        self.text = Corpus(name, [f"{n or ''}\t{h or ''} {a or ''}" for n, h, a in zip(name, highlights, address)])
+        self.distance = _haversine(ctx.lat, ctx.lng, self.lat, self.lng)   # nan where unknown
+
+    def __len__(self):
+        return self.n
+
+
+class Corpus:
+    """
+    Each result's name and text joined into one lowercase string, so
+    looking for a term is one str.find scan over all results (skipping to
+    the next result after a hit) that also tells a name hit from a text one.
+    """
+
+    def __init__(self, names, rows):
+        # rows: "<name>\t<text>" per result
+        self.n = len(rows)
+        self.joined = "\n".join(rows).lower()
+        self.starts = list(accumulate((len(r) + 1 for r in rows), initial=0))   # + end sentinel
+        self.name_ends = [s + len(n or "") for s, n in zip(self.starts, names)]
+
+    def matches(self, terms):
+        """(fraction of terms in each name, fraction anywhere in each result)."""
+        if not terms or not self.n:
+            return np.zeros(self.n), np.zeros(self.n)
+        in_name, anywhere = [0] * self.n, [0] * self.n
+        find, starts, name_ends = self.joined.find, self.starts, self.name_ends
+        for t in terms:
+            i = find(t)
+            while i >= 0:
+                row = bisect_right(starts, i) - 1
+                anywhere[row] += 1
+                if i < name_ends[row]:
+                    in_name[row] += 1
+                i = find(t, starts[row + 1])
+        k = float(len(terms))
+        return np.array(in_name) / k, np.array(anywhere) / k
+
+
+def _num(values):
+    try:
+        return np.array(values, dtype=float)   # None -> nan
+    except (TypeError, ValueError):
+        return np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                         for v in values], dtype=float)
+
+
+def _haversine(lat, lng, lats, lngs):
+    p1, p2 = np.radians(lat), np.radians(lats)
+    dl = np.radians(lngs) - np.radians(lng)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_R * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# ---------- features ----------
+@feature("rating", 1.0)
+def rating(b: Batch, ctx: RankContext):
+    # Centred on a typical 3.5; unrated places sit at the middle
+    return np.nan_to_num((b.rating - 3.5) / 1.5, nan=0.0)
+
+
+@feature("distance", 0.6)
+def distance(b: Batch, ctx: RankContext):
+    # log: 200 m vs 1 km matters more than 5 km vs 6 km; unknown counts as the edge of the radius
+    d = np.where(np.isnan(b.distance), ctx.radius, b.distance)
+    return -np.log1p(d / 1000.0)
+
+
+@feature("price_fit", 0.8)
+def price_fit(b: Batch, ctx: RankContext):
+    if not ctx.budget:
+        return np.zeros(len(b))
+    return np.nan_to_num(-np.abs(b.price - ctx.budget) / 3.0, nan=0.0)
+
+
+@feature("keyword", 1.2)
+def keyword(b: Batch, ctx: RankContext):
+    words = set(_WORD.findall((ctx.intent.get("keyword") or "").lower()))
+    words |= {c.lower() for c in ctx.intent.get("cuisines") or []}
+    words = sorted(words - _STOP)
+    # A match in the name counts fully; in a description/snippet, half
+    in_name, anywhere = b.text.matches(words)
+    return np.maximum(in_name, 0.5 * anywhere)
+
+
+@feature("mood", 0.3)
+def mood(b: Batch, ctx: RankContext):
+    m = (ctx.intent.get("mood") or "").lower()
+    return b.text.matches([m] if m else [])[1]
+
+
+@feature("healthy", 0.6)
+def healthy(b: Batch, ctx: RankContext):
+    if not ctx.intent.get("healthy"):
+        return np.zeros(len(b))
+    return np.minimum(b.text.matches(HEALTHY_TERMS)[1] * 4, 1.0)
+
+
+@feature("open_now", 1.0)
+def open_now(b: Batch, ctx: RankContext):
+    return b.open if ctx.open_now else np.zeros(len(b))
+
+
+# ---------- scoring ----------
+def weights() -> dict:
+    overrides = getattr(settings, "WEBSEARCH_RANK_WEIGHTS", {}) or {}
+    return {name: float(overrides.get(name, w)) for name, (_, w) in FEATURES.items()}
+
+
+def rank(results, ctx: RankContext, debug=False):
+    """
+    (ranked copies of results, debug info or None). Copies carry a fresh
+    distance_m; with debug also "score": {"total", <feature>: contribution}.
+    """
+    t0 = time.perf_counter()
+    out = [dict(r) for r in results]
+    if not out:
+        return out, ({"n": 0} if debug else None)
+    b = Batch(out, ctx)
+    w = weights()
+    names = [n for n in FEATURES if w[n]]
+    timings = {"batch": (time.perf_counter() - t0) * 1e6}
+
+    X = np.empty((len(b), len(names)))
+    for j, name in enumerate(names):
+        t = time.perf_counter()
+        X[:, j] = FEATURES[name][0](b, ctx)
+        timings[name] = (time.perf_counter() - t) * 1e6
+    t = time.perf_counter()
+    wv = np.array([w[n] for n in names])
+    scores = X @ wv
+    order = np.argsort(-scores, kind="stable")   # ties keep provider order
+    timings["score"] = (time.perf_counter() - t) * 1e6
+
+    for r, d in zip(out, b.distance.tolist()):
+        if d == d:   # not nan
+            r["distance_m"] = int(d)
+    if debug:
+        contrib = X * wv
+        for i, r in enumerate(out):
+            r["score"] = {"total": round(float(scores[i]), 4),
+                          **{n: round(float(contrib[i, j]), 4) for j, n in enumerate(names)}}
+    ranked = [out[i] for i in order]
+    total_us = (time.perf_counter() - t0) * 1e6
+    metrics.observe("websearch.rank", total_us / 1000.0)
+    if not debug:
+        return ranked, None
+    return ranked, {
+        "n": len(out),
+        "weights": {n: w[n] for n in names},
+        "timings_us": {k: round(v, 1) for k, v in {**timings, "total": total_us}.items()},
+    }
@@ -1,37 +1,185 @@
-from collections import Counter
-from .models import MenuItem, Tag, EventLog
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import MenuItem, Tag, EventLog, TasteProfile, RecommendationSlate
+from .engine import get_engine, hydrate_available
+from .cooccurrence import get_model as get_cooccurrence_model
+
+# How much each event type says about a user's taste
+EVENT_WEIGHTS = {'view': 1.0, 'click': 2.0, 'add': 3.0, 'buy': 5.0}
+TASTE_TOP_N = 5
+TASTE_MAX_TAGS = 50       # keep profiles compact; long tail decays to nothing anyway
+TASTE_MIN_RATIO = 1e-4    # drop tags this far below the actor's strongest one
 
 def popularity_top_n(n=8):
-    return list(MenuItem.objects.filter(is_available=True).order_by('-popularity')[:n])
+    # Over-fetch: this process's engine may still list items made unavailable elsewhere
+    return hydrate_available(get_engine().top_n(n=n * 2), n)
 
 def content_based_from_tags(preferred_tags: list[str], n=8):
-    if not preferred_tags:
-        return popularity_top_n(n)
-    qs = MenuItem.objects.filter(is_available=True, tags__name__in=preferred_tags).distinct()
-    items = list(qs.order_by('-popularity')[:n])
-    # If not enough, pad with popular
-    if len(items) < n:
-        pad = [x for x in popularity_top_n(n*2) if x not in items][: (n - len(items))]
-        items += pad
-    return items
+    # Items matching the most preferred tags first, padded with popular ones
+    return hydrate_available(get_engine().top_n(preferred_tags, n=n * 2), n)
+
+# --- Taste profiles -----------------------------------------------------------
+def actor_key(user=None, guest_token: str = '') -> str:
+    """Stable key for a user ("u:<id>") or guest ("g:<token>"); '' if neither."""
+    if user is not None and user.is_authenticated:
+        return f'u:{user.pk}'
+    if guest_token:
+        return f'g:{guest_token}'
+    return ''
+
+def _event_actor_key(user_id, guest_token: str) -> str:
+    if user_id:
+        return f'u:{user_id}'
+    if guest_token:
+        return f'g:{guest_token}'
+    return ''
+
+def _decay_factor(since, now, half_life_days=None) -> float:
+    if half_life_days is None:
+        half_life_days = getattr(settings, 'TASTE_HALF_LIFE_DAYS', 30)
+    half_life = half_life_days * 86400
+    age = max(0.0, (now - since).total_seconds())
+    return 0.5 ** (age / half_life)
+
+def _compact(scores: dict) -> tuple[dict, list]:
+    # Relative cut-off: a dormant actor's weights all shrink together, but their ranking still holds
+    floor = max(scores.values(), default=0.0) * TASTE_MIN_RATIO
+    ranked = sorted(((k, v) for k, v in scores.items() if v > 0 and v >= floor),
+                    key=lambda kv: kv[1], reverse=True)[:TASTE_MAX_TAGS]
+    return dict(ranked), [k for k, _ in ranked[:TASTE_TOP_N]]
+
+def _item_tag_names(item_ids) -> dict:
+    out = defaultdict(list)
+    rows = MenuItem.tags.through.objects.filter(menuitem_id__in=set(item_ids)) \
+        .values_list('menuitem_id', 'tag__name')
+    for iid, name in rows:
+        out[iid].append(name)
+    return out
+
+def record_taste_events(events):
+    """
+    Fold EventLog rows into their actors' TasteProfile.
+    One tag lookup + one profile read + one upsert, however many events.
+    """
+    events = [e for e in events if e.menu_item_id and _event_actor_key(e.user_id, e.guest_token)]
+    if not events:
+        return
+    tags_by_item = _item_tag_names(e.menu_item_id for e in events)
+    now = timezone.now()
+
+    deltas = defaultdict(Counter)
+    owners = {}
+    for e in events:
+        key = _event_actor_key(e.user_id, e.guest_token)
+        owners[key] = (e.user_id, '' if e.user_id else e.guest_token)
+        w = EVENT_WEIGHTS.get(e.event_type, 1.0) * _decay_factor(e.ts or now, now)
+        for name in tags_by_item.get(e.menu_item_id, []):
+            deltas[key][name] += w
+
+    with transaction.atomic():
+        existing = {p.actor_key: p for p in
+                    TasteProfile.objects.select_for_update().filter(actor_key__in=list(owners))}
+        rows = []
+        for key, delta in deltas.items():
+            prof = existing.get(key)
+            scores = Counter()
+            if prof:
+                f = _decay_factor(prof.updated_at, now)
+                scores.update({k: v * f for k, v in prof.tag_scores.items()})
+            scores.update(delta)
+            tag_scores, top = _compact(scores)
+            user_id, guest_token = owners[key]
+            rows.append(TasteProfile(actor_key=key, user_id=user_id, guest_token=guest_token,
+                                     tag_scores=tag_scores, top_tags=top, updated_at=now))
+        TasteProfile.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['actor_key'],
+            update_fields=['tag_scores', 'top_tags', 'updated_at'],
+        )
+        # Stored slates were computed from the old taste; keep serving them while
+        # slates.py rebuilds them in the background
+        RecommendationSlate.objects.filter(actor_key__in=list(deltas), stale=False).update(stale=True)
+
+def rebuild_taste_profiles(chunk_size: int = 5000) -> int:
+    """Recompute every TasteProfile from the full EventLog history. Returns profile count."""
+    tags_by_item = defaultdict(list)
+    for iid, name in MenuItem.tags.through.objects.values_list('menuitem_id', 'tag__name').iterator(chunk_size=chunk_size):
+        tags_by_item[iid].append(name)
+
+    now = timezone.now()
+    scores = defaultdict(Counter)
+    owners = {}
+    rows = EventLog.objects.filter(menu_item__isnull=False) \
+        .values_list('user_id', 'guest_token', 'menu_item_id', 'event_type', 'ts')
+    for user_id, guest_token, iid, etype, ts in rows.iterator(chunk_size=chunk_size):
+        key = _event_actor_key(user_id, guest_token)
+        if not key:
+            continue
+        owners[key] = (user_id, '' if user_id else guest_token)
+        w = EVENT_WEIGHTS.get(etype, 1.0) * _decay_factor(ts, now)
+        for name in tags_by_item.get(iid, []):
+            scores[key][name] += w
+
+    profiles = []
+    for key, counts in scores.items():
+        tag_scores, top = _compact(counts)
+        user_id, guest_token = owners[key]
+        profiles.append(TasteProfile(actor_key=key, user_id=user_id, guest_token=guest_token,
+                                     tag_scores=tag_scores, top_tags=top, updated_at=now))
+    with transaction.atomic():
+        TasteProfile.objects.all().delete()
+        TasteProfile.objects.bulk_create(profiles, batch_size=1000)
+    return len(profiles)
 
 def infer_user_taste(user=None, guest_token:str=''):
-    events = EventLog.objects.all()
+    key = actor_key(user, guest_token)
+    if not key:
+        return []
+    top = TasteProfile.objects.filter(actor_key=key).values_list('top_tags', flat=True).first()
+    return list(top or [])
+
+# --- Co-occurrence ("also ordered") -------------------------------------------
+RECENT_SEEDS = 20
+
+def recent_items(user=None, guest_token: str = '', limit=RECENT_SEEDS) -> list[int]:
+    """Menu item ids the actor most recently added or bought, newest first."""
+    events = EventLog.objects.filter(event_type__in=('add', 'buy'), menu_item__isnull=False)
     if user and user.is_authenticated:
         events = events.filter(user=user)
     elif guest_token:
         events = events.filter(guest_token=guest_token)
     else:
         return []
+    ids = events.order_by('-id').values_list('menu_item_id', flat=True)[:limit]
+    return list(dict.fromkeys(ids))
+
+def also_ordered(seed_ids, n=8) -> list[MenuItem]:
+    """Available items most often ordered together with seed_ids."""
+    model = get_cooccurrence_model()
+    if model is None or not seed_ids:
+        return []
+    ids = model.similar(seed_ids, n=n * 2)  # over-fetch; some may be unavailable
+    return hydrate_available(ids, n)
 
-    tag_counts = Counter()
-    for e in events.select_related('menu_item'):
-        if e.menu_item:
-            tag_counts.update([t.name for t in e.menu_item.tags.all()])
-    return [name for (name, _) in tag_counts.most_common(5)]
+def blended_recommendations(user=None, guest_token:str='', n=8, mode='blend', seed_items=None, prefs=None):
+    """
+    mode='blend': taste-profile tags, else popularity.
+    mode='also_ordered': neighbours of seed_items (default: the actor's recent
+    adds/buys) from the co-occurrence model, padded with the blend.
+    prefs overrides the stored taste profile (used by offline replay).
+    """
+    if mode == 'also_ordered':
+        seeds = seed_items if seed_items is not None else recent_items(user, guest_token)
+        items = also_ordered(seeds, n)
+        if len(items) < n:
+            seen = {m.id for m in items} | set(seeds)
+            pad = blended_recommendations(user, guest_token, n=n + len(seen), prefs=prefs)
+            items += [m for m in pad if m.id not in seen][: n - len(items)]
+        return items
 
-def blended_recommendations(user=None, guest_token:str='', n=8):
-    prefs = infer_user_taste(user, guest_token)
+    if prefs is None:
+        prefs = infer_user_taste(user, guest_token)
     if prefs:
         return content_based_from_tags(prefs, n)
-    return popularity_top_n(n)
\ No newline at end of file
+    return popularity_top_n(n)
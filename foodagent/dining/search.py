@@ -0,0 +1,133 @@
+# dining/search.py
+"""
+Full-text menu search.
+
+On SQLite, MenuItem name/description/tag names live in an FTS5 table
+(rowid = MenuItem.id, prefix indexes for type-ahead) kept in sync by
+signals.py and ranked with BM25. Other backends fall back to the old
+icontains query so callers never need to care which one they got.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import MenuItem
+
+FTS_TABLE = "dining_menuitem_fts"
+# BM25 column weights: name, description, tags
+_BM25 = "bm25(dining_menuitem_fts, 10.0, 2.0, 5.0)"
+_TOKEN = re.compile(r"\w+", re.U)
+
+_fts_ready = False
+
+
+def fts_enabled() -> bool:
+    """True when the FTS5 table exists on the current database."""
+    global _fts_ready
+    if _fts_ready:
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cur:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s", [FTS_TABLE])
+        _fts_ready = cur.fetchone() is not None
+    return _fts_ready
+
+
+# ---------- indexing ----------
+def _rows(item_ids=None):
+    qs = MenuItem.objects.all()
+    if item_ids is not None:
+        qs = qs.filter(id__in=item_ids)
+    tags = {}
+    through = MenuItem.tags.through.objects.all()
+    if item_ids is not None:
+        through = through.filter(menuitem_id__in=item_ids)
+    for iid, name in through.values_list("menuitem_id", "tag__name"):
+        tags.setdefault(iid, []).append(name)
+    for iid, name, desc in qs.values_list("id", "name", "description").iterator(chunk_size=2000):
+        yield iid, name or "", desc or "", " ".join(tags.get(iid, []))
+
+
+def index_items(item_ids):
+    """(Re)index the given MenuItems."""
+    item_ids = list(item_ids)
+    if not item_ids or not fts_enabled():
+        return
+    with connection.cursor() as cur:
+        remove_items(item_ids, cur)
+        cur.executemany(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, tags) VALUES (%s, %s, %s, %s)",
+            list(_rows(item_ids)),
+        )
+
+
+def remove_items(item_ids, cur=None):
+    item_ids = list(item_ids)
+    if not item_ids or not fts_enabled():
+        return
+    if cur is None:
+        with connection.cursor() as cur:
+            return remove_items(item_ids, cur)
+    for i in range(0, len(item_ids), 500):
+        batch = item_ids[i:i + 500]
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({','.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild_index(chunk_size=5000) -> int:
+    if not fts_enabled():
+        return 0
+    n = 0
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for row in _rows():
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                cur.executemany(f"INSERT INTO {FTS_TABLE}(rowid, name, description, tags) VALUES (%s, %s, %s, %s)", batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            cur.executemany(f"INSERT INTO {FTS_TABLE}(rowid, name, description, tags) VALUES (%s, %s, %s, %s)", batch)
+            n += len(batch)
+        cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return n
+
+
+# ---------- querying ----------
+def _match_expr(tokens, op):
+    # Every token is a quoted prefix query, so "ram" finds "ramen"
+    return f" {op} ".join('"%s"*' % t.replace('"', "") for t in tokens)
+
+
+def search_ids(query: str, limit=8, available_only=True) -> list[int]:
+    """MenuItem ids matching query, best first (BM25 on SQLite)."""
+    tokens = _TOKEN.findall((query or "").lower())
+    if not tokens or limit <= 0:
+        return []
+    if not fts_enabled():
+        return _search_ids_orm(tokens, limit, available_only)
+
+    sql = (
+        f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN dining_menuitem m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s" + (" AND m.is_available" if available_only else "") +
+        f" ORDER BY {_BM25} LIMIT %s"
+    )
+    with connection.cursor() as cur:
+        cur.execute(sql, [_match_expr(tokens, "AND"), limit])
+        ids = [r[0] for r in cur.fetchall()]
+        if not ids and len(tokens) > 1:
+            # Nothing has every word: fall back to any word, still BM25-ranked
+            cur.execute(sql, [_match_expr(tokens, "OR"), limit])
+            ids = [r[0] for r in cur.fetchall()]
+    return ids
+
+
+def _search_ids_orm(tokens, limit, available_only):
+    qs = MenuItem.objects.all()
+    if available_only:
+        qs = qs.filter(is_available=True)
+    for t in tokens:
+        qs = qs.filter(Q(name__icontains=t) | Q(description__icontains=t) | Q(tags__name__icontains=t))
+    return list(qs.distinct().order_by("-popularity_score").values_list("id", flat=True)[:limit])
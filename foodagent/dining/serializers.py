@@ -10,7 +10,7 @@ class MenuItemSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     class Meta:
         model = MenuItem
-        fields = ['id','name','price','description','tags','is_available','popularity']
+        fields = ['id','name','price','description','tags','is_available','popularity','popularity_score']
 
 class CartItemSerializer(serializers.ModelSerializer):
     menu_item = MenuItemSerializer()
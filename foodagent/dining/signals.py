@@ -0,0 +1,73 @@
+# dining/signals.py
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .engine import invalidate_engine
+from .models import EventLog, MenuItem, Tag
+from .recommender import record_taste_events
+from . import search
+from .nlu import invalidate_vocabulary
+
+
+@receiver(post_save, sender=EventLog)
+def eventlog_created(sender, instance, created, **kwargs):
+    # Keep the user's taste profile current as events are written
+    if created:
+        record_taste_events([instance])
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=MenuItem.tags.through)
+def catalog_changed(sender, **kwargs):
+    # Menu or tags changed: rebuild the in-process engine on next use
+    invalidate_engine()
+
+
+# --- Full-text index (search.py) ---------------------------------------------
+@receiver(post_save, sender=MenuItem)
+def menuitem_saved_index(sender, instance, **kwargs):
+    search.index_items([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+def menuitem_deleted_index(sender, instance, **kwargs):
+    search.remove_items([instance.pk])
+
+
+@receiver(m2m_changed, sender=MenuItem.tags.through)
+def menuitem_tags_changed_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        search.index_items([instance.pk])
+    elif pk_set:
+        search.index_items(pk_set)
+    else:
+        # tag.menuitem_set.clear(): the links are already gone, so reindex everything
+        search.rebuild_index()
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved_index(sender, instance, created, **kwargs):
+    if not created:  # a rename changes the indexed text of every item carrying it
+        search.index_items(instance.menuitem_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting_index(sender, instance, **kwargs):
+    instance._indexed_item_ids = list(instance.menuitem_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted_index(sender, instance, **kwargs):
+    search.index_items(getattr(instance, "_indexed_item_ids", []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed_vocabulary(sender, **kwargs):
+    # New/renamed tags become words the chat parser recognises
+    invalidate_vocabulary()
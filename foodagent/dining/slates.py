@@ -0,0 +1,162 @@
+# dining/slates.py
+"""
+Precomputed recommendation slates.
+
+build_slates() scores every recently active user/guest in a process pool
+and stores their top-N item ids in RecommendationSlate, so the landing page
+is one indexed read plus one hydrate. Live computation only happens on a
+miss (new actor or expired slate). A slate whose actor's taste changed since
+the last build is marked stale: it is still served, and rebuilt for that one
+actor on a background thread.
+"""
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .engine import get_engine, hydrate_available
+from .models import EventLog, RecommendationSlate, TasteProfile
+from .recommender import (_event_actor_key, actor_key, blended_recommendations, content_based_from_tags,
+                          infer_user_taste, popularity_top_n)
+
+
+PAD = 2   # slates store n * PAD ids so items gone unavailable can be skipped at serve time
+
+
+def _slate_ttl():
+    return getattr(settings, "RECOMMENDATION_SLATE_TTL", 24 * 3600)
+
+
+def get_slate(key: str):
+    """(stored item ids, stale) for an actor, or None on a miss."""
+    if not key:
+        return None
+    row = RecommendationSlate.objects.filter(actor_key=key).values_list("item_ids", "computed_at", "stale").first()
+    if not row:
+        return None
+    ids, computed_at, stale = row
+    if (timezone.now() - computed_at).total_seconds() > _slate_ttl():
+        return None
+    return ids, stale
+
+
+def store_slates(slates: dict):
+    """Upsert {actor_key: [item ids]} in one statement."""
+    now = timezone.now()
+    RecommendationSlate.objects.bulk_create(
+        [RecommendationSlate(actor_key=k, item_ids=v, computed_at=now, stale=False) for k, v in slates.items()],
+        update_conflicts=True, unique_fields=["actor_key"], update_fields=["item_ids", "computed_at", "stale"],
+    )
+
+
+# ---------- background refresh of stale slates ----------
+_refresher = None
+_refreshing = set()   # actor keys with a rebuild in flight
+_refresh_lock = threading.Lock()
+
+
+def _get_refresher():
+    global _refresher
+    if _refresher is None:
+        with _refresh_lock:
+            if _refresher is None:
+                _refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="slate-refresh")
+    return _refresher
+
+
+def _refresh(key: str, n: int):
+    from django.db import close_old_connections
+    try:
+        store_slates(compute_slates([key], n=n))
+        metrics.incr("slates.refresh")
+    except Exception:
+        metrics.incr("slates.refresh_error")
+    finally:
+        close_old_connections()
+        with _refresh_lock:
+            _refreshing.discard(key)
+
+
+def refresh_slate(key: str, n=8):
+    """Rebuild one actor's slate off the request path; no-op if one is already running."""
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _get_refresher().submit(_refresh, key, n)
+
+
+def slate_recommendations(user=None, guest_token: str = "", n=8):
+    """Serve the stored slate; compute live (and store it) on a miss."""
+    key = actor_key(user, guest_token)
+    slate = get_slate(key)
+    if slate is not None:
+        ids, stale = slate
+        if stale:
+            refresh_slate(key, n)
+        # Over-fetch, then pad: items can go unavailable after the slate was stored
+        items = hydrate_available(ids[:n * PAD], n)
+        if items:
+            if len(items) < n:
+                seen = {m.id for m in items}
+                pad = blended_recommendations(user, guest_token, n=n + len(seen))
+                items += [m for m in pad if m.id not in seen][: n - len(items)]
+            return items
+    prefs = infer_user_taste(user, guest_token)
+    if not prefs:
+        # No history: the engine's popular list is already O(1), and storing
+        # a slate per anonymous first visit would just fill the table
+        return popularity_top_n(n)
+    items = content_based_from_tags(prefs, n * PAD)
+    store_slates({key: [m.id for m in items]})
+    return items[:n]
+
+
+# ---------- batch ----------
+def active_actor_keys(days: int) -> list[str]:
+    since = timezone.now() - timedelta(days=days)
+    rows = EventLog.objects.filter(ts__gte=since).values_list("user_id", "guest_token").distinct()
+    return sorted({k for k in (_event_actor_key(u, g) for u, g in rows.iterator()) if k})
+
+
+def compute_slates(keys, n=8) -> dict:
+    """Top ids per actor (n * PAD of them) straight from the engine; one profile query per call."""
+    engine = get_engine()
+    prefs = dict(TasteProfile.objects.filter(actor_key__in=keys).values_list("actor_key", "top_tags"))
+    return {k: engine.top_n(prefs.get(k) or (), n=n * PAD) for k in keys}
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _build_chunk(keys, n):
+    slates = compute_slates(keys, n=n)
+    store_slates(slates)
+    return len(slates)
+
+
+def build_slates(workers=4, n=8, active_days=30, chunk_size=500) -> dict:
+    from django.db import connections
+
+    t0 = time.perf_counter()
+    keys = active_actor_keys(active_days)
+    chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+    done = 0
+    if workers <= 1:
+        for chunk in chunks:
+            done += _build_chunk(chunk, n)
+    else:
+        connections.close_all()  # never share a DB socket with forked workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for count in pool.map(_build_chunk, chunks, [n] * len(chunks)):
+                done += count
+    secs = time.perf_counter() - t0
+    return {"actors": done, "seconds": secs, "per_second": done / secs if secs else 0.0}
@@ -1,9 +1,11 @@
 # dining/tavily.py
 import os
-import requests
 from django.conf import settings
 
-TAVILY_URL = "https://api.tavily.com/search"
+from . import outbound
+
+def _tavily_url():
+    return f"{getattr(settings, 'TAVILY_BASE_URL', 'https://api.tavily.com')}/search"
 
 def tavily_enrich(place_name: str, city: str = ""):
     """
@@ -16,13 +18,14 @@ def tavily_enrich(place_name: str, city: str = ""):
 
     q = f"{place_name} {city} menu nutrition calories"
     try:
-        r = requests.post(TAVILY_URL, json={
+        r = outbound.post("tavily", _tavily_url(), idempotent=True, json={
             "api_key": key,
             "query": q,
             "search_depth": "basic",
             "max_results": 5,
             "include_answer": True
-        }, timeout=10)
+        })
+        r.raise_for_status()
         j = r.json()
     except Exception:
         return {}
@@ -1,3 +1,577 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from .nlu import parse
+
+
+class OrdinalParsingTests(TestCase):
+    def test_ordinal_references_are_orders(self):
+        cases = {
+            "add the second": (1,),
+            "order the first two": (0, 1),
+            "get both": (0, 1),
+            "add the second and the last one": (1, -1),
+            "add the second and third": (1, 2),
+            "i'll take the first one": (0,),
+            "order the top 3": (0, 1, 2),
+        }
+        for msg, ordinals in cases.items():
+            with self.subTest(msg=msg):
+                p = parse(msg)
+                self.assertEqual(p.ordinals, ordinals)
+                self.assertTrue(p.is_order)
+
+    def test_ordinal_words_in_questions_are_not_orders(self):
+        for msg in ("what should I get first?",
+                    "what did I get last time?",
+                    "I want to order something spicy, second thoughts maybe not"):
+            with self.subTest(msg=msg):
+                p = parse(msg)
+                self.assertEqual(p.ordinals, ())
+                self.assertFalse(p.is_order)
+                self.assertNotIn("add_to_cart", p.intents)
+
+
+class CartOpsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import MenuItem, Restaurant
+        r = Restaurant.objects.create(name="Test Kitchen", slug="test-kitchen")
+        cls.items = MenuItem.objects.bulk_create(
+            [MenuItem(restaurant=r, name=f"Dish {i}", price=5) for i in range(20)])
+        cls.gone = MenuItem.objects.create(restaurant=r, name="Gone", price=5, is_available=False)
+
+    def setUp(self):
+        from .models import Cart
+        self.cart = Cart.objects.create(guest_token="t-cartops")
+
+    def qtys(self):
+        return dict(self.cart.items.values_list("menu_item_id", "qty"))
+
+    def test_ops_fold_to_one_effect_per_item(self):
+        from .cartops import _normalize
+        a, b = self.items[0].id, self.items[1].id
+        final = _normalize([
+            {"op": "add", "menu_item": a, "qty": 2},
+            {"op": "add", "menu_item": a},
+            {"op": "set", "menu_item": b, "qty": 4},
+            {"op": "add", "menu_item": b, "qty": 1},
+            {"op": "remove", "menu_item": a},
+            {"op": "add", "menu_item": a, "qty": 5},
+        ])
+        self.assertEqual(final, {a: ("abs", 5), b: ("abs", 5)})
+
+    def test_quantities_are_clamped(self):
+        from .cartops import MAX_QTY, CartOpError, apply_ops
+        a, b = self.items[0].id, self.items[1].id
+        apply_ops(self.cart, [{"op": "set", "menu_item": a, "qty": 500}, {"op": "add", "menu_item": b, "qty": 60}])
+        apply_ops(self.cart, [{"op": "add", "menu_item": b, "qty": 60}])
+        self.assertEqual(self.qtys(), {a: MAX_QTY, b: MAX_QTY})
+        for bad in ({"op": "add", "menu_item": a, "qty": 0}, {"op": "add", "menu_item": a, "qty": MAX_QTY + 1},
+                    {"op": "add", "menu_item": 2 ** 70}, {"op": "wipe", "menu_item": a}):
+            with self.subTest(op=bad), self.assertRaises(CartOpError):
+                apply_ops(self.cart, [bad])
+
+    def test_unavailable_items_are_rejected_and_removes_apply(self):
+        from .cartops import apply_ops
+        a = self.items[0].id
+        apply_ops(self.cart, [{"menu_item": a}])
+        out = apply_ops(self.cart, [{"menu_item": self.gone.id}, {"op": "remove", "menu_item": a}])
+        self.assertEqual(out["rejected"], [self.gone.id])
+        self.assertEqual(self.qtys(), {})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .cartops import apply_ops
+        counts = []
+        for n in (3, 9, 18):
+            self.cart.items.all().delete()
+            ids = [m.id for m in self.items[:n]]
+            apply_ops(self.cart, [{"op": "add", "menu_item": i} for i in ids[::2]])
+            # Every path each time: relative adds (existing and new rows), sets, removes
+            ops = [{"op": ("add", "set", "remove")[k % 3], "menu_item": i, "qty": 2} for k, i in enumerate(ids)]
+            with CaptureQueriesContext(connection) as ctx:
+                apply_ops(self.cart, ops)
+            counts.append(len(ctx))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+class EngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import MenuItem, Restaurant, Tag
+        r = Restaurant.objects.create(name="Test Kitchen", slug="test-kitchen")
+        spicy = Tag.objects.create(name="spicy", kind="feature")
+        cls.plain = MenuItem.objects.create(restaurant=r, name="Rice", price=3, popularity=50)
+        cls.hot = MenuItem.objects.create(restaurant=r, name="Vindaloo", price=9, popularity=1)
+        cls.hot.tags.add(spicy)
+
+    def setUp(self):
+        from .engine import invalidate_engine
+        invalidate_engine()
+        self.addCleanup(invalidate_engine)
+
+    def test_engine_is_reused_until_ttl(self):
+        from .engine import get_engine
+        eng = get_engine()
+        self.assertIs(get_engine(), eng)
+        eng.built_at -= 11
+        with override_settings(RECOMMENDER_ENGINE_TTL=10):
+            self.assertIsNot(get_engine(), eng)
+        with override_settings(RECOMMENDER_ENGINE_TTL=0):   # 0: never expires
+            eng = get_engine()
+            eng.built_at -= 10 ** 6
+            self.assertIs(get_engine(), eng)
+
+    def test_catalog_changes_invalidate(self):
+        from .engine import get_engine
+        eng = get_engine()
+        self.assertEqual(eng.top_n(["spicy"], n=1), [self.hot.id])
+        self.hot.is_available = False
+        self.hot.save()
+        self.assertIsNot(get_engine(), eng)
+        self.assertEqual(get_engine().top_n(["spicy"], n=2), [self.plain.id])
+
+    def test_unavailable_item_seen_by_hydrate_resets_stale_engine(self):
+        from .engine import get_engine, hydrate_available
+        from .models import MenuItem
+        eng = get_engine()
+        MenuItem.objects.filter(id=self.hot.id).update(is_available=False)   # no signal, as from another worker
+        self.assertIs(get_engine(), eng)
+        self.assertEqual([m.id for m in hydrate_available([self.hot.id, self.plain.id])], [self.plain.id])
+        self.assertIsNot(get_engine(), eng)
+
+
+class PopularityRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import MenuItem, Restaurant
+        r = Restaurant.objects.create(name="Test Kitchen", slug="test-kitchen")
+        cls.item = MenuItem.objects.create(restaurant=r, name="Dish", price=5)
+
+    def log(self, event_type="add", **kw):
+        from .models import EventLog
+        return EventLog.objects.create(guest_token="t-pop", menu_item=self.item, event_type=event_type, **kw)
+
+    def score(self):
+        self.item.refresh_from_db()
+        return self.item.popularity_score
+
+    def test_events_are_folded_once(self):
+        from .popularity import rollup_popularity
+        from .recommender import EVENT_WEIGHTS
+        self.log("add")
+        self.log("buy")
+        self.assertEqual(rollup_popularity()["events"], 2)
+        self.assertAlmostEqual(self.score(), EVENT_WEIGHTS["add"] + EVENT_WEIGHTS["buy"], places=3)
+        self.assertEqual(rollup_popularity()["events"], 0)
+        self.assertAlmostEqual(self.score(), EVENT_WEIGHTS["add"] + EVENT_WEIGHTS["buy"], places=3)
+
+    def test_late_commit_below_high_water_mark_is_folded(self):
+        from .models import RollupCheckpoint
+        from .popularity import JOB_NAME, rollup_popularity
+        from .recommender import EVENT_WEIGHTS
+        self.log()
+        skipped = self.log()
+        self.log()
+        skipped_id = skipped.id
+        skipped.delete()            # id handed out, row not visible yet
+        out = rollup_popularity()
+        self.assertEqual((out["events"], out["gaps"]), (2, 1))
+        self.assertEqual(RollupCheckpoint.objects.get(name=JOB_NAME).gaps, [skipped_id])
+
+        self.log("buy", id=skipped_id)   # ... and now it commits
+        out = rollup_popularity()
+        self.assertEqual((out["events"], out["gaps"]), (1, 0))
+        self.assertAlmostEqual(self.score(), 2 * EVENT_WEIGHTS["add"] + EVENT_WEIGHTS["buy"], places=3)
+
+    def test_gaps_age_out_of_the_window(self):
+        from .popularity import rollup_popularity
+        gone = self.log()
+        self.log()
+        gone.delete()
+        self.assertEqual(rollup_popularity()["gaps"], 1)
+        with override_settings(POPULARITY_GAP_WINDOW=2):
+            for _ in range(3):
+                self.log()
+            self.assertEqual(rollup_popularity()["gaps"], 0)
+
+
+class RankingTests(SimpleTestCase):
+    LAT, LNG = 36.12, -97.07
+
+    def place(self, name, km=1.0, **kw):
+        return {"name": name, "lat": self.LAT + km / 111.2, "lng": self.LNG, "rating": None,
+                "price_level": None, "open_now": None, "highlights": "", "address": "", **kw}
+
+    def features(self, results, **ctx):
+        from .ranking import Batch, RankContext
+        ctx = RankContext(self.LAT, self.LNG, **ctx)
+        return Batch(results, ctx), ctx
+
+    def test_keyword_counts_name_hits_fully_and_text_hits_half(self):
+        from .ranking import keyword
+        b, ctx = self.features([
+            self.place("Thai Palace"),
+            self.place("Golden Spoon", highlights="thai, noodles"),
+            self.place("Burger Barn", address="12 Thai St"),
+            self.place("Pizza Hut"),
+        ], intent={"keyword": "thai food near me"})
+        self.assertEqual(keyword(b, ctx).tolist(), [1.0, 0.5, 0.5, 0.0])
+
+    def test_terms_match_within_one_result_only(self):
+        from .ranking import Corpus
+        c = Corpus(["Sushi Go", "Ramen"], ["Sushi Go\tsushi sushi", "Ramen\tnoodles"])
+        in_name, anywhere = c.matches(["sushi", "noodles"])
+        self.assertEqual(in_name.tolist(), [0.5, 0.0])
+        self.assertEqual(anywhere.tolist(), [0.5, 0.5])
+
+    def test_healthy_mood_price_and_open_columns(self):
+        from .ranking import healthy, mood, open_now, price_fit
+        b, ctx = self.features([
+            self.place("Green Bowl", highlights="fresh vegan salad, cozy", price_level=2, open_now=True),
+            self.place("Fry Shack", price_level=4, open_now=False),
+            self.place("Mystery", price_level=None),
+        ], intent={"healthy": True, "mood": "cozy"}, budget=2, open_now=True)
+        self.assertEqual(healthy(b, ctx).tolist(), [1.0, 0.0, 0.0])
+        self.assertEqual(mood(b, ctx).tolist(), [1.0, 0.0, 0.0])
+        self.assertEqual(open_now(b, ctx).tolist(), [1.0, -1.0, 0.0])
+        self.assertAlmostEqual(price_fit(b, ctx)[1], -2 / 3)
+        self.assertEqual(price_fit(b, ctx)[[0, 2]].tolist(), [0.0, 0.0])
+
+    def test_missing_fields_do_not_break_the_batch(self):
+        from .ranking import rank, RankContext
+        ranked, _ = rank([{"name": "Bare"}, self.place("Full", rating=4.5)], RankContext(self.LAT, self.LNG))
+        self.assertEqual([r["name"] for r in ranked], ["Full", "Bare"])
+        self.assertNotIn("distance_m", ranked[1])
+
+    @override_settings(WEBSEARCH_RANK_WEIGHTS={"rating": 0, "keyword": 0, "open_now": 0})
+    def test_weights_and_debug_contributions(self):
+        from .ranking import RankContext, rank
+        results = [self.place("Far", km=3), self.place("Near", km=0.2), self.place("Near too", km=0.2)]
+        ranked, info = rank(results, RankContext(self.LAT, self.LNG), debug=True)
+        self.assertEqual([r["name"] for r in ranked], ["Near", "Near too", "Far"])   # ties keep provider order
+        self.assertNotIn("rating", info["weights"])
+        for r in ranked:
+            parts = {k: v for k, v in r["score"].items() if k != "total"}
+            self.assertAlmostEqual(sum(parts.values()), r["score"]["total"], places=3)
+
+
+class PlaceCacheTests(SimpleTestCase):
+    KEY = "ws:test:entry"
+
+    def setUp(self):
+        from .placecache import _cache
+        _cache().delete(self.KEY)
+        self.addCleanup(_cache().delete, self.KEY)
+
+    def age(self, seconds):
+        from .placecache import _cache
+        entry = _cache().get(self.KEY)
+        entry["fetched_at"] -= seconds
+        _cache().set(self.KEY, entry)
+
+    def test_nearby_callers_share_a_key(self):
+        from .placecache import cache_key
+        a = cache_key("google", 36.12001, -97.07001, 1500, "Ramen open", False, None)
+        self.assertEqual(a, cache_key("google", 36.12002, -97.07002, 1800, "open  ramen", False, None))
+        self.assertNotEqual(a, cache_key("google", 36.12001, -97.07001, 1500, "ramen open", True, None))
+        self.assertNotEqual(a, cache_key("google", 36.20, -97.07, 1500, "ramen open", False, None))
+
+    @override_settings(WEBSEARCH_CACHE_TTL=60, WEBSEARCH_CACHE_STALE_TTL=600)
+    def test_miss_then_fresh_then_stale_with_one_background_refresh(self):
+        import threading
+        import time
+        from .placecache import _refreshing, cached_search
+        calls, release = [], threading.Event()
+
+        def fetch():
+            calls.append(1)
+            if len(calls) > 1:
+                release.wait(5)
+            return [{"name": f"v{len(calls)}"}]
+
+        self.assertEqual(cached_search(self.KEY, fetch), ([{"name": "v1"}], "miss"))
+        self.assertEqual(cached_search(self.KEY, fetch), ([{"name": "v1"}], "fresh"))
+        self.age(61)
+        for _ in range(3):   # served at once, however many ask, while a single refresh runs
+            self.assertEqual(cached_search(self.KEY, fetch), ([{"name": "v1"}], "stale"))
+        release.set()
+        deadline = time.monotonic() + 5
+        while self.KEY in _refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cached_search(self.KEY, fetch), ([{"name": "v2"}], "fresh"))
+
+    def test_failed_fetch_is_not_cached(self):
+        from .placecache import cached_search
+        self.assertEqual(cached_search(self.KEY, lambda: None), (None, "miss"))
+        self.assertEqual(cached_search(self.KEY, lambda: []), ([], "miss"))
+
+
+class GeocodingTests(TestCase):
+    ADDRESS = {"address_line1": "1 Main St", "address_line2": "", "city": "Stillwater",
+               "state": "OK", "postal_code": "74074"}
+
+    def setUp(self):
+        from unittest import mock
+        from . import geocoding
+        geocoding._mem.clear()
+        self.addCleanup(geocoding._mem.clear)
+        unlimited = mock.patch.object(geocoding, "_get_bucket", return_value=geocoding.TokenBucket(0))
+        unlimited.start()
+        self.addCleanup(unlimited.stop)
+
+    def run_concurrently(self, n, fetch):
+        import threading
+        from unittest import mock
+        from . import geocoding
+        out, start = [], threading.Barrier(n)
+
+        def worker():
+            start.wait()
+            out.append(geocoding.reverse_geocode(36.12, -97.07))
+
+        # Threads would each open their own DB connection: keep the cache tier out of it
+        with mock.patch.object(geocoding, "_fetch", side_effect=fetch) as fetched, \
+                mock.patch.object(geocoding, "_db_get", return_value=None), \
+                mock.patch.object(geocoding, "_db_put"):
+            threads = [threading.Thread(target=worker) for _ in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(10)
+        return out, fetched.call_count
+
+    def test_identical_lookups_share_one_fetch(self):
+        import time
+
+        def fetch(lat, lng):
+            time.sleep(0.2)
+            return self.ADDRESS
+
+        out, calls = self.run_concurrently(4, fetch)
+        self.assertEqual(calls, 1)
+        self.assertEqual(sorted(state for _, state in out), ["coalesced"] * 3 + ["fetched"])
+        self.assertTrue(all(address == self.ADDRESS for address, _ in out))
+
+    def test_followers_are_released_when_the_leader_fails(self):
+        import time
+
+        def fetch(lat, lng):
+            time.sleep(0.2)
+            raise ConnectionError("down")
+
+        t0 = time.monotonic()
+        out, calls = self.run_concurrently(3, fetch)
+        self.assertEqual(calls, 1)
+        self.assertEqual([state for _, state in out], ["error"] * 3)
+        self.assertLess(time.monotonic() - t0, 2)
+
+    def test_db_tier_and_db_errors(self):
+        from unittest import mock
+        from . import geocoding
+        from .models import GeocodeCache
+        with mock.patch.object(geocoding, "_fetch", return_value=self.ADDRESS):
+            self.assertEqual(geocoding.reverse_geocode(36.12, -97.07)[1], "fetched")
+        self.assertEqual(GeocodeCache.objects.get().address, self.ADDRESS)
+        geocoding._mem.clear()
+        self.assertEqual(geocoding.reverse_geocode(36.12001, -97.07001), (self.ADDRESS, "db"))
+        self.assertEqual(geocoding.reverse_geocode(36.12, -97.07)[1], "memory")
+
+        geocoding._mem.clear()
+        with mock.patch.object(GeocodeCache.objects, "filter", side_effect=RuntimeError("db down")), \
+                mock.patch.object(geocoding, "_fetch", return_value=self.ADDRESS):
+            self.assertEqual(geocoding.reverse_geocode(36.12, -97.07), (self.ADDRESS, "fetched"))
+
+    def test_token_bucket(self):
+        from .geocoding import TokenBucket
+        b = TokenBucket(rate=1.0, burst=2)
+        self.assertTrue(b.acquire())
+        self.assertTrue(b.acquire())
+        self.assertFalse(b.acquire(max_wait=0.1))
+        unlimited = TokenBucket(rate=0)
+        self.assertTrue(all(unlimited.acquire() for _ in range(100)))
+
+
+@override_settings(AGENT_MEMORY_TURNS=4, AGENT_CONTEXT_TOKENS=300)
+class AgentMemoryTests(TestCase):
+    def setUp(self):
+        from .memory import get_session
+        self.session = get_session(guest_token="t-memory")
+
+    def say(self, n, start=0):
+        from .memory import append_turns
+        for i in range(start, start + n):
+            append_turns(self.session, [
+                {"role": "user", "content": f"question {i}"},
+                {"role": "tool", "content": "{}", "tool_name": "search_menu"},
+                {"role": "assistant", "content": f"answer {i}", "payload": {"suggestions": [i, i + 100]}},
+            ])
+
+    def test_sessions_are_per_actor(self):
+        from .memory import get_session
+        self.assertEqual(get_session(guest_token="t-memory").id, self.session.id)
+        self.assertEqual(get_session(guest_token="t-memory", session_id=self.session.id).id, self.session.id)
+        self.assertNotEqual(get_session(guest_token="someone-else", session_id=self.session.id).id, self.session.id)
+
+    def test_recent_messages_is_one_keyset_query(self):
+        from .memory import last_suggestions, recent_messages
+        self.say(2)
+        with self.assertNumQueries(1):
+            rows = recent_messages(self.session)
+        self.assertEqual([r["content"] for r in rows], ["answer 0", "question 1", "{}", "answer 1"])
+        self.assertEqual(last_suggestions(self.session), [1, 101])
+
+    def test_old_turns_fold_into_the_summary_once_the_window_doubles(self):
+        from .memory import recent_messages
+        self.say(2)   # 6 messages: under 2 x 4
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.summarized_upto, self.session.summary), (0, ""))
+        self.say(1, start=2)   # 9 messages: everything but the newest 4 is folded
+        self.session.refresh_from_db()
+        self.assertGreater(self.session.summarized_upto, 0)
+        self.assertIn("user: question 0", self.session.summary)
+        self.assertIn("assistant: answer 0 [items #0, #100]", self.session.summary)
+        self.assertNotIn("search_menu", self.session.summary)
+        self.assertLessEqual(len(recent_messages(self.session)), 4)
+        self.assertNotIn("question 0", [m["content"] for m in recent_messages(self.session)])
+
+    def test_context_stays_inside_the_token_budget(self):
+        from .memory import append_turns, build_context, count_tokens
+        self.say(5)
+        append_turns(self.session, [{"role": "user", "content": "long " * 2000}])
+        self.session.refresh_from_db()
+        ctx = build_context(self.session)
+        self.assertEqual(ctx[0]["role"], "system")
+        self.assertTrue(ctx[0]["content"].startswith("Earlier in this conversation:"))
+        self.assertLessEqual(sum(count_tokens(m["content"]) for m in ctx), 300 + 10)   # + the summary's header
+        self.assertNotIn("tool", {m["role"] for m in ctx})
+        self.assertFalse(any(m["content"].startswith("long") for m in ctx))   # too big to fit: dropped
+
+
+class PlaceIndexTests(TestCase):
+    LAT, LNG = 36.1, -97.1
+
+    def setUp(self):
+        from . import places
+        places._index = None
+        self.addCleanup(setattr, places, "_index", None)
+
+    def results(self, ids, name="Thai"):
+        return [{"place_id": f"p{i}", "name": f"{name} {i}", "lat": self.LAT + i * 1e-4, "lng": self.LNG,
+                 "highlights": "thai"} for i in ids]
+
+    def test_writes_are_visible_without_a_rebuild(self):
+        from . import places
+        places.record("google", "thai", self.LAT, self.LNG, self.results(range(5)))
+        idx = places.get_index()
+        places.record("google", "thai", self.LAT, self.LNG, self.results(range(5, 10)))
+        places.record("google", "thai", self.LAT, self.LNG, self.results([0], name="Renamed"), cover=False)
+        self.assertIs(places.get_index(), idx)
+        found = places.nearby(self.LAT, self.LNG, 500, "thai")
+        self.assertEqual(len(found), 10)
+        self.assertEqual(found[0]["name"], "Renamed 0")   # the pending copy wins over the tree's
+        self.assertEqual([r["distance_m"] for r in found], sorted(r["distance_m"] for r in found))
+
+    @override_settings(PLACE_INDEX_MAX_PENDING=3)
+    def test_many_pending_writes_trigger_a_rebuild(self):
+        from . import places
+        idx = places.get_index()
+        places.record("google", "thai", self.LAT, self.LNG, self.results(range(4)))
+        rebuilt = places.get_index()
+        self.assertIsNot(rebuilt, idx)
+        self.assertEqual((len(rebuilt.rows), rebuilt.pending), (4, {}))
+
+    @override_settings(PLACE_MIN_RESULTS=1)
+    def test_coverage_must_contain_the_query_circle(self):
+        from . import places
+        places.record("google", "thai", self.LAT, self.LNG, self.results(range(3)), radius=2000)
+        self.assertIsNotNone(places.local_search(self.LAT, self.LNG, 1900, "thai"))
+        self.assertIsNone(places.local_search(self.LAT, self.LNG, 2500, "thai"))
+        # Same geohash cell, ~450 m from where the provider was asked
+        self.assertIsNotNone(places.local_search(self.LAT, self.LNG - 0.005, 1500, "thai"))
+        self.assertIsNone(places.local_search(self.LAT, self.LNG - 0.005, 1700, "thai"))
+        self.assertIsNone(places.local_search(self.LAT, self.LNG, 1000, "sushi"))
+
+
+@override_settings(TAVILY_API_KEY="")
+class GooglePagingTests(SimpleTestCase):
+    LAT, LNG = 36.12, -97.07
+
+    def place(self, name, dlat):
+        return {"name": name, "lat": self.LAT + dlat, "lng": self.LNG, "rating": None, "price_level": None,
+                "open_now": None, "highlights": "", "address": "", "menus": []}
+
+    def test_more_results_ranks_later_pages_for_the_caller(self):
+        from .placecache import cursor_for, save_pages
+        from .websearch import more_results
+        cursor = cursor_for("ws:test:pages")
+        save_pages(cursor, {"pages": [[self.place("first", 0)],
+                                      [self.place("far", 0.03), self.place("near", 0.001)],
+                                      [self.place("mid", 0.01)]], "done": False, "rank": {}})
+        out = more_results(cursor, 1, self.LAT, self.LNG)
+        self.assertEqual([r["name"] for r in out["results"]], ["near", "mid", "far"])
+        self.assertEqual((out["have"], out["done"]), (3, False))
+        self.assertEqual(more_results(cursor, 3, self.LAT, self.LNG)["results"], [])
+        self.assertIsNone(more_results(cursor_for("ws:test:unknown"), 1, self.LAT, self.LNG))
+
+    def test_one_background_fetch_per_cursor_and_failures_finish_the_cursor(self):
+        from unittest import mock
+        from . import websearch
+        from .placecache import cursor_for, load_pages
+        key = "ws:test:paging"
+        cursor = cursor_for(key)
+        with mock.patch.object(websearch, "_get_pager") as pager:
+            for _ in range(2):
+                websearch._start_paging(key, [self.place("first", 0)], "tok", self.LAT, self.LNG, "k",
+                                        False, "thai", {})
+        self.assertEqual(pager.return_value.submit.call_count, 1)
+        self.assertEqual(load_pages(cursor)["done"], False)
+
+        with mock.patch.object(websearch, "TOKEN_DELAY_S", 0), \
+                mock.patch.object(websearch, "_next_page", side_effect=ConnectionError("down")):
+            websearch._fetch_pages(cursor, "tok", self.LAT, self.LNG, "k", False, "thai")
+        self.assertEqual(load_pages(cursor)["done"], True)
+        self.assertNotIn(cursor, websearch._paging)
+
+
+class FakeProviderTests(SimpleTestCase):
+    def start(self, **config):
+        from .fakes import load_profiles, serve
+        srv = serve(port=0, profiles=load_profiles(config))
+        self.addCleanup(srv.server_close)
+        self.addCleanup(srv.shutdown)
+        return f"http://127.0.0.1:{srv.server_address[1]}"
+
+    def test_google_is_deterministic_and_paginates_like_the_real_api(self):
+        import requests
+        base = self.start()
+        params = {"query": "ramen", "location": "36.12,-97.07"}   # 36 fake results: two pages
+        first = requests.get(f"{base}/google/maps/api/place/textsearch/json", params=params, timeout=5).json()
+        again = requests.get(f"{base}/google/maps/api/place/textsearch/json", params=params, timeout=5).json()
+        self.assertEqual([r["place_id"] for r in first["results"]], [r["place_id"] for r in again["results"]])
+        self.assertEqual((first["status"], len(first["results"])), ("OK", 20))
+        # A fresh next_page_token is not live yet
+        early = requests.get(f"{base}/google/maps/api/place/textsearch/json",
+                             params={"pagetoken": first["next_page_token"]}, timeout=5).json()
+        self.assertEqual(early["status"], "INVALID_REQUEST")
+
+    def test_injected_errors_and_canned_payloads(self):
+        import requests
+        base = self.start(tavily={"error_rate": 1.0, "error_status": 429}, nominatim={"payload": {"canned": True}})
+        self.assertEqual(requests.post(f"{base}/tavily/search", json={"query": "x"}, timeout=5).status_code, 429)
+        self.assertEqual(requests.get(f"{base}/nominatim/reverse", params={"lat": 1, "lon": 2}, timeout=5).json(),
+                         {"canned": True})
+        self.assertEqual(requests.get(f"{base}/nobody/here", timeout=5).status_code, 404)
+
+    def test_profiles_and_webhook_signatures(self):
+        import stripe
+        from .fakes import load_profiles, parse_latency, stripe_signature
+        with self.assertRaises(ValueError):
+            load_profiles({"gogle": {}})
+        with self.assertRaises(ValueError):
+            parse_latency("uniform:10")
+        payload = b'{"id": "evt_1", "object": "event", "type": "checkout.session.completed", "data": {"object": {}}}'
+        event = stripe.Webhook.construct_event(payload, stripe_signature(payload, "whsec_test"), "whsec_test")
+        self.assertEqual(event["id"], "evt_1")
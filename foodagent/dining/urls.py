@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RecommendationAPI, MenuAPI, CartAPI, AgentAPI, landing, AgentOrderAPI, WebSearchAPI
+from .views import RecommendationAPI, MenuAPI, CartAPI, CartBatchAPI, AgentAPI, landing, AgentOrderAPI, WebSearchAPI, WebSearchMoreAPI, WebSearchEnrichAPI
 from .checkout import cart_page, create_checkout_session, qr_for_url, remove_cart_item, set_cart_qty, checkout_success, checkout_cancel
 from . import billing, views
 from .webhooks import stripe_webhook
@@ -29,9 +29,12 @@ urlpatterns = [
 
     path('api/recommendations/', RecommendationAPI.as_view()),
     path('api/cart/', CartAPI.as_view()),
+    path('api/cart/batch/', CartBatchAPI.as_view(), name='cart_batch'),
     path('api/agent/', AgentAPI.as_view(), name='agent'),
     path('api/', include(router.urls)),
+    path('api/agent/stream/', views.agent_stream, name='agent_stream'),
     path("api/agent/order/", AgentOrderAPI.as_view(), name="agent_order"),
+    path("api/agent/order/stream/", views.agent_order_stream, name="agent_order_stream"),
     path("account/profile/", views_account.profile_settings, name="profile_settings"),
     path("orders/history/", views_account.order_history, name="order_history"),
     path("billing/cards/", views_account.billing_cards, name="billing_cards"),
@@ -47,5 +50,9 @@ urlpatterns = [
     path("api/pay-now/",           billing.pay_now,  name="billing-pay-now"),
     path("stripe/webhook/", stripe_webhook, name="stripe-webhook"),
     path('api/websearch/', WebSearchAPI.as_view(), name='api-websearch'),
+    path('api/websearch/more/', WebSearchMoreAPI.as_view(), name='api-websearch-more'),
+    path('api/websearch/enrich/', WebSearchEnrichAPI.as_view(), name='api-websearch-enrich'),
+    path('api/metrics/', views.metrics_view, name='api-metrics'),
+    path('media/place-photo/<str:ref>', views.place_photo, name='place-photo'),
 
 ]
\ No newline at end of file
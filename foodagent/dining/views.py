@@ -9,17 +9,28 @@ from .agent import parse_message, search_candidates, rank
 from .models import MenuItem, Cart, CartItem, EventLog
 from .serializers import MenuItemSerializer, CartSerializer, CartItemCreateSerializer
 from .recommender import blended_recommendations, content_based_from_tags
+from .slates import slate_recommendations
+from .search import search_ids
+from .engine import hydrate
+from .cartops import apply_ops, CartOpError
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 
 
 def get_guest_token(request):
-    tok = request.COOKIES.get('guest_token','')
+    tok = request.COOKIES.get('guest_token','') or getattr(request, '_guest_token', '')
     if not tok:
         import secrets
         tok = secrets.token_hex(16)
+    request._guest_token = tok  # same new token for cart + conversation within one request
     return tok
+
+def _with_guest_cookie(resp, session):
+    # Guests' conversations are keyed by guest_token, so it has to stick
+    if session.guest_token:
+        resp.set_cookie('guest_token', session.guest_token, max_age=60*60*24*365)
+    return resp
 @ensure_csrf_cookie
 def landing(request):
     return render(request, 'landing.html')
@@ -36,8 +47,17 @@ def websearch_page(request):
 class RecommendationAPI(APIView):
     def get(self, request):
         guest_token = get_guest_token(request)
-        items = blended_recommendations(request.user if request.user.is_authenticated else None,
-                                        guest_token=guest_token, n=8)
+        mode = request.query_params.get('mode', 'blend')
+        seed = request.query_params.get('item')
+        user = request.user if request.user.is_authenticated else None
+        q = (request.query_params.get('q') or '').strip()
+        if q:
+            items = hydrate(search_ids(q, limit=8))
+        elif mode == 'blend' and not seed:
+            items = slate_recommendations(user, guest_token=guest_token, n=8)
+        else:
+            items = blended_recommendations(user, guest_token=guest_token, n=8, mode=mode,
+                                            seed_items=[int(seed)] if seed and seed.isdigit() else None)
         data = MenuItemSerializer(items, many=True).data
         resp = Response({'results': data})
         resp.set_cookie('guest_token', guest_token, max_age=60*60*24*365)
@@ -74,36 +94,48 @@ class CartAPI(APIView):
         return Response({'ok': True}, status=201)
 
 
+class CartBatchAPI(APIView):
+    """
+    POST {"ops": [{"op": "add"|"set"|"remove", "menu_item": id, "qty": n}, ...]}
+    Applied atomically in a fixed number of queries (see cartops.py).
+    """
+    def post(self, request):
+        guest_token = get_guest_token(request)
+        cart, _ = Cart.objects.get_or_create(user=request.user if request.user.is_authenticated else None,
+                                             guest_token='' if request.user.is_authenticated else guest_token)
+        ops = request.data.get('ops') if isinstance(request.data, dict) else None
+        if not isinstance(ops, list) or len(ops) > 200:
+            return Response({'error': 'ops must be a list of at most 200 operations'}, status=400)
+        try:
+            result = apply_ops(cart, ops)
+        except CartOpError as e:
+            return Response({'error': str(e)}, status=400)
+        resp = Response({'ok': True, **result, 'cart': CartSerializer(cart).data})
+        resp.set_cookie('guest_token', guest_token, max_age=60*60*24*365)
+        return resp
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class AgentAPI(APIView):
     def post(self, request):
         msg = (request.data.get("message") or "").strip()
-        intents, prefs = parse_message(msg)
-
-        # discovery/refine
-        items = search_candidates(prefs)
-        items = rank(items, prefs) or blended_recommendations(n=8)
-        data = MenuItemSerializer(items, many=True).data
-
-        follow_up = "Want to add one to your cart or refine (e.g., less spicy, under $12)?"
-        return Response({"detected_prefs": prefs, "suggestions": data, "follow_up": follow_up})
+        session = session_for_request(request, request.data.get("conversation_id"))
+        # discovery/refine; same steps /api/agent/stream/ sends one by one
+        out = collect_events(remembered(session, msg, suggest_events(msg)))
+        out.setdefault("suggestions", [])
+        return _with_guest_cookie(Response(out), session)
     
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from .agent_runner import run_order_agent
+from .agent_runner import run_order_agent, order_agent_events, suggest_events, collect_events, remembered
+from .memory import session_for_request
 
 
 def add_items(cart, items, default_qty=1):
-    added = []
-    for x in items:
-        ci, created = CartItem.objects.get_or_create(cart=cart, menu_item=x, defaults={"qty": default_qty})
-        if not created:
-            ci.qty += default_qty
-            ci.save()
-        added.append(x)
-    return added
+    apply_ops(cart, [{"op": "add", "menu_item": x.id, "qty": default_qty} for x in items])
+    return list(items)
 
 from .checkout import create_checkout_session_for_cart
 from django.urls import reverse
@@ -117,7 +149,13 @@ class AgentOrderAPI(APIView):
             return Response({"error":"message required"}, status=400)
 
         # Your agent decides items AND/OR we fallback to recommender inside run_order_agent
-        out = run_order_agent(request, msg)  # should add items to cart internally or return which to add
+        session = session_for_request(request, request.data.get("conversation_id"))
+        from django.conf import settings
+        if getattr(settings, 'AGENT_ENGINE', 'rules') == 'graph':
+            from .agent_graph import run_graph_agent
+            out = run_graph_agent(request, msg, session=session)
+        else:
+            out = run_order_agent(request, msg, session=session)  # should add items to cart internally or return which to add
 
         # If not logged in: DO NOT create Stripe session; guide to login
         if not request.user.is_authenticated:
@@ -129,7 +167,7 @@ class AgentOrderAPI(APIView):
                 "login_url": login_url,
                 "google_login_url": google_url,
             })
-            return Response(out, status=401)
+            return _with_guest_cookie(Response(out, status=401), session)
 
         # Logged in: prepare checkout now
         try:
@@ -139,7 +177,7 @@ class AgentOrderAPI(APIView):
             # Don’t break the chat; cart is updated already, user can pay from cart
             out.update({"error": str(e)})
 
-        return Response(out)
+        return _with_guest_cookie(Response(out), session)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
@@ -175,6 +213,7 @@ class WebSearchAPI(APIView):
 
         try:
             # Preferred signature: (query, lat, lng, radius=..., open_now=..., budget=..., healthy=...)
+            from django.conf import settings
             results = search_places(
     prompt=prompt,
     lat=lat,
@@ -182,6 +221,8 @@ class WebSearchAPI(APIView):
     open_now=open_now,
     budget=budget,
     radius=radius,
+    # Per-feature scores and timings (ranking.py); not for the public
+    debug=bool(data.get("debug")) and (settings.DEBUG or request.user.is_staff),
 )
         except TypeError:
             # If your local function is older and doesn’t accept healthy
@@ -192,6 +233,35 @@ class WebSearchAPI(APIView):
             return Response({"error": str(e)}, status=500)
 
         return Response(results)
+
+
+class WebSearchEnrichAPI(APIView):
+    """Menus/highlights fetched in the background for search results: GET ?keys=k1,k2"""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        from .enrichment import lookup
+        keys = [k for k in (request.query_params.get("keys") or "").split(",") if k][:50]
+        found = lookup(keys)
+        return Response({"enrichments": found, "pending": [k for k in keys if k not in found]})
+
+
+class WebSearchMoreAPI(APIView):
+    """Later Google pages for a search: GET ?cursor=...&have=<pages already shown>&lat=&lng="""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        from .websearch import more_results
+        q = request.query_params
+        try:
+            have = int(q.get("have") or 1)
+            lat, lng = float(q.get("lat")), float(q.get("lng"))
+        except (TypeError, ValueError):
+            return Response({"error": "have, lat and lng are required numbers"}, status=400)
+        out = more_results(q.get("cursor") or "", have, lat, lng)
+        if out is None:
+            return Response({"error": "unknown or expired cursor"}, status=404)
+        return Response(out)
     
 
 # dining/views.py
@@ -217,35 +287,134 @@ def home(request):
         "menu_items": page_obj.object_list,  # the items to render
     })
 
-import requests
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 
 @require_GET
 def reverse_geocode(request):
-    lat = request.GET.get('lat')
-    lng = request.GET.get('lng')
-    if not lat or not lng:
+    try:
+        lat = float(request.GET.get('lat'))
+        lng = float(request.GET.get('lng'))
+    except (TypeError, ValueError):
         return JsonResponse({'error': 'lat/lng required'}, status=400)
 
+    from . import geocoding
+    address, state = geocoding.reverse_geocode(lat, lng)
+    if address is not None:
+        return JsonResponse(address)
+    if state == 'throttled':
+        # Over Nominatim's rate: answer now, the form still works without it
+        resp = JsonResponse({'error': 'reverse-geocode busy, try again shortly'}, status=503)
+        resp['Retry-After'] = str(geocoding.retry_after())
+        return resp
+    return JsonResponse({'error': 'reverse-geocode failed'}, status=502)
+
+
+from . import metrics as _metrics
+
+@require_GET
+def metrics_view(request):
+    """Per-process counters/latencies. Staff only outside DEBUG."""
+    from django.conf import settings
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    data = _metrics.snapshot()
+    c = data['counters']
+    hits = c.get('intent_cache.memory_hit', 0) + c.get('intent_cache.db_hit', 0)
+    lookups = hits + c.get('intent_cache.miss', 0)
+    geo_hits = c.get('geocode.memory_hit', 0) + c.get('geocode.db_hit', 0)
+    geo_lookups = geo_hits + c.get('geocode.miss', 0)
+    from .placecache import hit_ratio
+    data['ratios'] = {
+        'intent_cache_hit': round(hits / lookups, 4) if lookups else 0.0,
+        'websearch_cache_hit': hit_ratio(),
+        'geocode_cache_hit': round(geo_hits / geo_lookups, 4) if geo_lookups else 0.0,
+    }
+    return JsonResponse(data)
+
+
+# ---------- SSE streaming ----------
+import json as _json
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_POST
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {_json.dumps(data, default=str)}\n\n"
+
+
+def _stream_message(request):
+    """(message, conversation_id) from the JSON body."""
+    try:
+        data = _json.loads(request.body or b"{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    return (data.get("message") or "").strip(), data.get("conversation_id")
+
+
+def _sse_response(events):
+    def gen():
+        # Flush something at once so the client sees the connection open
+        yield ": ok\n\n"
+        try:
+            for event, data in events:
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+        yield _sse("done", {})
+
+    resp = StreamingHttpResponse(gen(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return resp
+
+
+# POST with the CSRF header only (agent.html sends X-CSRFToken): these change
+# conversation memory and, for orders, the cart and checkout.
+@require_POST
+def agent_stream(request):
+    """Streaming /api/agent/: prefs, then each suggestion as it's ranked, then follow_up."""
+    msg, conversation_id = _stream_message(request)
+    if not msg:
+        return JsonResponse({"error": "message required"}, status=400)
+    session = session_for_request(request, conversation_id)
+    return _with_guest_cookie(_sse_response(remembered(session, msg, suggest_events(msg))), session)
+
+
+@require_POST
+def agent_order_stream(request):
+    """Streaming /api/agent/order/: prefs, suggestions, cart, then checkout or login_required."""
+    msg, conversation_id = _stream_message(request)
+    if not msg:
+        return JsonResponse({"error": "message required"}, status=400)
+    session = session_for_request(request, conversation_id)
+    from django.conf import settings
+    if getattr(settings, 'AGENT_ENGINE', 'rules') == 'graph':
+        from .agent_graph import graph_agent_events as events
+    else:
+        events = order_agent_events
+    return _with_guest_cookie(_sse_response(remembered(session, msg, events(request, msg, session))), session)
+
+
+# ---------- place photos ----------
+@require_GET
+def place_photo(request, ref):
+    """Resized, locally cached Google place photo (?w=160|400|800&s=<signature>)."""
+    from django.http import FileResponse, HttpResponse
+    from . import photos
     try:
-        r = requests.get(
-            'https://nominatim.openstreetmap.org/reverse',
-            params={'format': 'jsonv2', 'lat': lat, 'lon': lng, 'addressdetails': 1},
-            headers={'User-Agent': 'OSU-Dining/1.0 (contact@example.com)'}
-        )
-        r.raise_for_status()
-        j = r.json()
-        a = j.get('address', {})
-
-        result = {
-            'address_line1': f"{a.get('house_number','')} {a.get('road','')}".strip(),
-            'address_line2': '',
-            'city': a.get('city') or a.get('town') or a.get('village') or '',
-            'state': a.get('state') or '',
-            'postal_code': a.get('postcode') or '',
-        }
-        return JsonResponse(result)
+        fh, etag = photos.get_photo(ref, request.GET.get('w'), request.GET.get('s'))
+    except ValueError:
+        return JsonResponse({'error': 'bad photo reference'}, status=404)
     except Exception:
-        return JsonResponse({'error': 'reverse-geocode failed'}, status=500)
-
+        return JsonResponse({'error': 'photo unavailable'}, status=502)
+    if etag in request.headers.get('If-None-Match', ''):
+        fh.close()
+        resp = HttpResponse(status=304)
+    else:
+        resp = FileResponse(fh, content_type='image/jpeg')
+    resp['ETag'] = etag
+    resp['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return resp
@@ -1,8 +1,20 @@
 # dining/websearch.py
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from difflib import SequenceMatcher
+from urllib.parse import urlparse
+
 import requests
 from django.conf import settings
+from django.urls import reverse
 from .nlp import parse_intent
+from . import metrics, outbound, photos
+from .enrichment import enrich_results
+from .ranking import RankContext, rank
+from .placecache import cache_key, cached_search, cursor_for, load_pages, save_pages
 
 # ---------- settings helpers ----------
 def _setting(name, default=""):
@@ -18,13 +30,11 @@ def _haversine_m(lat1, lon1, lat2, lon2):
     a = m.sin(dp/2)**2 + m.cos(p1)*m.cos(p2)*m.sin(dl/2)**2
     return 2 * R * m.asin(m.sqrt(a))
 
-def _google_photo_url(photo_ref, key, maxwidth=400):
+def _google_photo_url(photo_ref, maxwidth=400):
+    # Served through our thumbnail cache (photos.py), so the API key stays server-side
     if not photo_ref:
         return ""
-    return (
-        "https://maps.googleapis.com/maps/api/place/photo"
-        f"?maxwidth={maxwidth}&photoreference={photo_ref}&key={key}"
-    )
+    return f"{reverse('place-photo', args=[photo_ref])}?w={maxwidth}&s={photos.sign(photo_ref)}"
 
 def _maps_place_url(place_id):
     return f"https://www.google.com/maps/place/?q=place_id:{place_id}" if place_id else ""
@@ -40,14 +50,18 @@ def _normalize_google(items, lat, lng, api_key):
             dist = int(_haversine_m(lat, lng, rlat, rlng))
         photo_ref = (it.get("photos") or [{}])[0].get("photo_reference")
         out.append({
+            "place_id": it.get("place_id") or "",
             "name": it.get("name"),
+            "lat": rlat,
+            "lng": rlng,
             "rating": it.get("rating"),
             "price_level": it.get("price_level"),
             "address": it.get("formatted_address") or it.get("vicinity") or "",
             "distance_m": dist,
             "maps_url": _maps_place_url(it.get("place_id")),
-            "photo_url": _google_photo_url(photo_ref, api_key) if photo_ref else "",
+            "photo_url": _google_photo_url(photo_ref) if photo_ref else "",
             "highlights": ", ".join((it.get("types") or [])[:3]),
+            "open_now": (it.get("opening_hours") or {}).get("open_now"),
             "menus": [],
         })
     return out
@@ -60,6 +74,8 @@ def _normalize_tavily(items):
         snippet = (it.get("content") or "").strip()
         out.append({
             "name": title,
+            "lat": None,
+            "lng": None,
             "rating": None,
             "price_level": None,
             "address": "",
@@ -73,7 +89,8 @@ def _normalize_tavily(items):
 
 # ---------- providers ----------
 def _google_text_search(keyword, lat, lng, radius, open_now, budget, key):
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+    """First page of results and the next_page_token ("" on the last page)."""
+    url = f"{_setting('GOOGLE_PLACES_BASE_URL', 'https://maps.googleapis.com/maps/api')}/place/textsearch/json"
     q = keyword
     if "restaurant" not in q.lower():
         q += " restaurant"
@@ -93,9 +110,10 @@ def _google_text_search(keyword, lat, lng, radius, open_now, budget, key):
         mx = min(4, budget - 1)
         params["minprice"] = mn
         params["maxprice"] = mx
-    r = requests.get(url, params=params, timeout=12)
+    r = outbound.get("google", url, params=params)
     r.raise_for_status()
-    return r.json().get("results", [])
+    j = r.json()
+    return j.get("results", []), j.get("next_page_token") or ""
 
 def _tavily_search(keyword, lat, lng, radius, open_now, budget, key):
     payload = {
@@ -105,10 +123,160 @@ def _tavily_search(keyword, lat, lng, radius, open_now, budget, key):
         "include_answer": False,
         "max_results": 8,
     }
-    r = requests.post("https://api.tavily.com/search", json=payload, timeout=12)
+    # Search is read-only, so the POST is safe to retry
+    r = outbound.post("tavily", f"{_setting('TAVILY_BASE_URL', 'https://api.tavily.com')}/search",
+                      json=payload, idempotent=True)
     r.raise_for_status()
     return r.json().get("results", [])
 
+# ---------- pagination ----------
+# Google hands out 20 places per page (max 3 pages) and a next_page_token
+# that only becomes valid a couple of seconds after it is issued. Page one
+# is returned at once; the rest are fetched in the background into a page
+# state next to the cache entry, which the page polls via the cursor.
+TOKEN_DELAY_S = 2.0
+_pager = None
+_paging = set()   # cursors with a page fetch in flight
+_paging_lock = threading.Lock()
+
+def _get_pager():
+    global _pager
+    if _pager is None:
+        with _pool_lock:
+            if _pager is None:
+                _pager = ThreadPoolExecutor(max_workers=4, thread_name_prefix="websearch-pages")
+    return _pager
+
+def _next_page(token, key):
+    url = f"{_setting('GOOGLE_PLACES_BASE_URL', 'https://maps.googleapis.com/maps/api')}/place/textsearch/json"
+    for _ in range(5):
+        r = outbound.get("google", url, params={"pagetoken": token, "key": key})
+        r.raise_for_status()
+        j = r.json()
+        if j.get("status") != "INVALID_REQUEST":
+            return j.get("results", []), j.get("next_page_token") or ""
+        time.sleep(0.5)  # token not live yet
+    raise RuntimeError("next_page_token never became valid")
+
+def _fetch_pages(cursor, token, lat, lng, key, open_now, keyword):
+    max_pages = _setting("WEBSEARCH_GOOGLE_PAGES", 3)
+    try:
+        pages = 1
+        while token and pages < max_pages:
+            time.sleep(TOKEN_DELAY_S)
+            raw, token = _next_page(token, key)
+            pages += 1
+            state = load_pages(cursor) or {"pages": []}
+            batch = _normalize_google(raw, lat, lng, key)
+            state["pages"].append(batch)
+            _remember(keyword, lat, lng, batch, cover=False)
+            state["done"] = not token or pages >= max_pages
+            save_pages(cursor, state, open_now)
+            metrics.incr("websearch.google.page")
+    except Exception:
+        metrics.incr("websearch.google.page_error")
+        state = load_pages(cursor)
+        if state is not None:
+            state["done"] = True
+            save_pages(cursor, state, open_now)
+    finally:
+        with _paging_lock:
+            _paging.discard(cursor)
+
+def _start_paging(search_key, first, token, lat, lng, key, open_now, keyword, rank_ctx):
+    cursor = cursor_for(search_key)
+    with _paging_lock:
+        if cursor in _paging:
+            return
+        _paging.add(cursor)
+    # rank_ctx: the RankContext fields (bar lat/lng) later pages are ranked with
+    save_pages(cursor, {"pages": [first], "done": False, "rank": rank_ctx}, open_now)
+    _get_pager().submit(_fetch_pages, cursor, token, lat, lng, key, open_now, keyword)
+
+def more_results(cursor: str, have: int, lat: float, lng: float):
+    """
+    Pages after the first `have` for a search cursor, ranked for this caller:
+    {"results": [...], "have": n, "done": bool}, or None for an unknown cursor.
+    """
+    state = load_pages(cursor)
+    if state is None:
+        return None
+    pages = state["pages"]
+    fresh = [r for page in pages[max(1, have):] for r in page]
+    ranked, _ = rank(fresh, RankContext(lat, lng, **(state.get("rank") or {})))
+    results, pending = enrich_results(ranked)
+    out = {"results": results, "have": len(pages), "done": bool(state.get("done"))}
+    if pending:
+        out["enriching"] = pending
+    return out
+
+# ---------- local place store ----------
+def _remember(keyword, lat, lng, results, cover=True, radius=0):
+    # Feed places.py; never let a DB hiccup fail the search
+    try:
+        from .places import record
+        record("google", keyword, lat, lng, results, cover=cover, radius=radius)
+    except Exception:
+        metrics.incr("places.record_error")
+
+def _local_first(payload):
+    flag = payload.get("local_first")
+    return bool(_setting("WEBSEARCH_LOCAL_FIRST", False) if flag is None else flag)
+
+# ---------- fan-out ----------
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_setting("WEBSEARCH_FANOUT_WORKERS", 8),
+                                           thread_name_prefix="websearch")
+    return _pool
+
+_NAME_NOISE = re.compile(r"\s[|\-–—:]\s.*$")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+def _name_key(name):
+    # "Thai House | Menu" / "Thai House - Stillwater" -> "thai house"
+    name = _NAME_NOISE.sub("", (name or "").lower())
+    return " ".join(_NON_WORD.sub(" ", name).split())
+
+def _url_key(url):
+    p = urlparse(url or "")
+    if "google.com" in p.netloc or not p.netloc:
+        return ""  # every Google maps_url shares a host; only place_id tells them apart
+    return p.netloc.lower().removeprefix("www.") + p.path.rstrip("/").lower()
+
+def _same_place(a, b):
+    ua, ub = _url_key(a.get("maps_url")), _url_key(b.get("maps_url"))
+    if ua and ua == ub:
+        return True
+    na, nb = _name_key(a.get("name")), _name_key(b.get("name"))
+    return bool(na and nb) and (na == nb or SequenceMatcher(None, na, nb).ratio() >= 0.88)
+
+def merge_results(lists):
+    """
+    Concatenate provider lists in priority order, folding near-duplicates
+    (same URL, or names ~equal) into the first occurrence.
+    """
+    merged = []
+    for results in lists:
+        for r in results:
+            dup = next((m for m in merged if _same_place(m, r)), None)
+            if dup is None:
+                merged.append(dict(r))
+                continue
+            # Keep the richer record, borrow what it lacks
+            for k, v in r.items():
+                if v and not dup.get(k):
+                    dup[k] = v
+            seen = {m.get("url") for m in dup.get("menus") or []}
+            dup["menus"] = (dup.get("menus") or []) + [m for m in r.get("menus") or [] if m.get("url") not in seen]
+    return merged
+
 # ---------- main entry (now supports dict OR kwargs) ----------
 def search_places(payload=None, **kwargs):
     """
@@ -151,24 +319,110 @@ def search_places(payload=None, **kwargs):
     # Intent parsing (Gemini with fallback is handled inside parse_intent)
     intent = parse_intent(prompt)
     keyword = intent.get("keyword") or (prompt or "restaurant")
+    ctx = RankContext(lat, lng, intent=intent, budget=budget, open_now=open_now, radius=radius)
+    debug = bool(payload.get("debug"))
+
+    def ranked(resp, results):
+        resp["results"], info = rank(results, ctx, debug=debug)
+        if info:
+            resp["rank_debug"] = info
+        return resp
+
+    # Local-first: answer from the Place index while this cell's coverage is fresh
+    # and thick enough. open_now needs live hours, so it always asks a provider.
+    if _local_first(payload) and not open_now:
+        from .places import local_search
+        local = local_search(lat, lng, radius, keyword, limit=20, budget=budget)
+        if local:
+            resp = ranked({"intent": intent, "keyword": keyword, "source": "local"}, local)
+            resp["results"], pending = enrich_results(resp["results"])
+            if pending:
+                resp["enriching"] = pending
+            return resp
 
     g_key = _setting("GOOGLE_PLACES_API_KEY", "")
     t_key = _setting("TAVILY_API_KEY", "")
-    provider = (_setting("WEBSEARCH_PROVIDER", "") or "").lower().strip()  # "", "google", "tavily"
+    provider = (_setting("WEBSEARCH_PROVIDER", "") or "").lower().strip()  # "", "google", "tavily", "all"
 
-    try:
-        if (provider == "google" and g_key) or (not provider and g_key):
-            gres = _google_text_search(keyword, lat, lng, radius, open_now, budget, g_key)
-            out = _normalize_google(gres, lat, lng, g_key)
-            out.sort(key=lambda x: (-(x.get("rating") or 0), x.get("distance_m") or 10**9))
-            return {"results": out, "intent": intent, "keyword": keyword}
-        elif (provider == "tavily" and t_key) or (not provider and t_key):
-            tres = _tavily_search(keyword, lat, lng, radius, open_now, budget, t_key)
-            out = _normalize_tavily(tres)
-            return {"results": out, "intent": intent, "keyword": keyword}
-        else:
-            return {"results": [], "intent": intent, "keyword": keyword, "error": "no provider configured"}
-    except requests.HTTPError as e:
-        return {"results": [], "intent": intent, "keyword": keyword, "error": f"provider error: {e}"}
-    except Exception:
-        return {"results": [], "intent": intent, "keyword": keyword, "error": "search exception"}
\ No newline at end of file
+    def google(key):
+        raw, token = _google_text_search(keyword, lat, lng, radius, open_now, budget, g_key)
+        first = _normalize_google(raw, lat, lng, g_key)
+        if token and _setting("WEBSEARCH_GOOGLE_PAGES", 3) > 1:
+            _start_paging(key, first, token, lat, lng, g_key, open_now, keyword,
+                          {"intent": intent, "budget": budget, "open_now": open_now, "radius": radius})
+        _remember(keyword, lat, lng, first, radius=radius)
+        return first
+
+    fetchers = {}
+    if g_key and provider in ("", "google", "all"):
+        fetchers["google"] = google
+    if t_key and provider in ("", "tavily", "all"):
+        fetchers["tavily"] = lambda key: _normalize_tavily(
+            _tavily_search(keyword, lat, lng, radius, open_now, budget, t_key))
+    if provider != "all":
+        fetchers = dict(list(fetchers.items())[:1])  # single provider, Google first
+    if not fetchers:
+        return {"results": [], "intent": intent, "keyword": keyword, "error": "no provider configured"}
+
+    def run(name):
+        errors = []
+        key = cache_key(name, lat, lng, radius, keyword, open_now, budget)
+        def fetch_or_none():
+            # Errors are reported to this caller but never cached
+            try:
+                return fetchers[name](key)
+            except requests.HTTPError as e:
+                errors.append(f"provider error: {e}")
+            except Exception:
+                errors.append("search exception")
+            return None
+        with metrics.timer(f"websearch.{name}"):
+            out, state = cached_search(key, fetch_or_none, open_now=open_now)
+        if out is None:
+            return None, errors[0] if errors else "search exception"
+        return out, state
+
+    def enriched(resp):
+        # Cached menus inline; the rest are fetched in the background (GET /api/websearch/enrich/)
+        resp["results"], pending = enrich_results(resp["results"])
+        if pending:
+            resp["enriching"] = pending
+        return resp
+
+    def with_cursor(resp):
+        # More Google pages on the way (or already there): GET /api/websearch/more/
+        if "google" in fetchers:
+            cursor = cursor_for(cache_key("google", lat, lng, radius, keyword, open_now, budget))
+            state = load_pages(cursor)
+            if state is not None:
+                resp["cursor"], resp["more"] = cursor, not state.get("done") or len(state["pages"]) > 1
+        return resp
+
+    if len(fetchers) == 1:
+        name = next(iter(fetchers))
+        out, state = run(name)
+        if out is None:
+            return {"results": [], "intent": intent, "keyword": keyword, "error": state}
+        return enriched(with_cursor(ranked({"intent": intent, "keyword": keyword, "cache": state}, out)))
+
+    # Fan-out: every provider at once; take what has arrived by the deadline.
+    # Stragglers keep running and still fill the cache for the next caller.
+    deadline = _setting("WEBSEARCH_DEADLINE_MS", 2500) / 1000.0
+    pool = _get_pool()
+    futures = {pool.submit(run, name): name for name in fetchers}
+    done, _ = wait(futures, timeout=deadline)
+    lists, providers = {}, {}
+    for fut, name in futures.items():
+        if fut not in done:
+            providers[name] = "timeout"
+            metrics.incr(f"websearch.{name}.deadline_miss")
+            continue
+        out, state = fut.result()
+        providers[name] = state if out is not None else f"error: {state}"
+        if out is not None:
+            lists[name] = out
+    merged = merge_results([lists[n] for n in fetchers if n in lists])
+    resp = ranked({"intent": intent, "keyword": keyword, "providers": providers}, merged)
+    if not lists:
+        resp["error"] = "no provider answered in time" if "timeout" in providers.values() else "provider error"
+    return enriched(with_cursor(resp) if "google" in lists else resp)
@@ -85,6 +85,7 @@ TEMPLATES = [
 ]
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 
 # Where Stripe redirects after payment
 SITE_URL = os.getenv("SITE_URL", "http://127.0.0.1:8000")
@@ -142,6 +143,80 @@ ACCOUNT_SIGNUP_FIELDS = ['email*', 'username*', 'password1*', 'password2*']
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY", "")  # or your chosen Places source
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "10000"))          # in-memory LRU entries per worker
+INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", str(7 * 24 * 3600)))  # seconds, memory and DB tiers
+INTENT_LLM_DEADLINE_MS = int(os.getenv("INTENT_LLM_DEADLINE_MS", "300"))   # wait this long for Gemini, else rules; <= 0 blocks
+INTENT_LLM_WORKERS = int(os.getenv("INTENT_LLM_WORKERS", "4"))
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+WEBSEARCH_CACHE_TTL = int(os.getenv("WEBSEARCH_CACHE_TTL", "900"))                  # seconds served fresh; 0 disables the cache
+WEBSEARCH_CACHE_OPEN_NOW_TTL = int(os.getenv("WEBSEARCH_CACHE_OPEN_NOW_TTL", "120"))  # open_now answers go stale fast
+WEBSEARCH_CACHE_STALE_TTL = int(os.getenv("WEBSEARCH_CACHE_STALE_TTL", "3600"))      # served while a background refresh runs
+WEBSEARCH_PROVIDER = os.getenv("WEBSEARCH_PROVIDER", "")  # "", "google", "tavily", or "all" to fan out and merge
+WEBSEARCH_DEADLINE_MS = int(os.getenv("WEBSEARCH_DEADLINE_MS", "2500"))  # fan-out answers with whatever arrived by then
+ENRICH_TOP_K = int(os.getenv("ENRICH_TOP_K", "6"))                      # places per search queued for Tavily menu lookups; 0 disables
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "4"))
+ENRICH_QUEUE_MAX = int(os.getenv("ENRICH_QUEUE_MAX", "64"))              # beyond this, lookups are dropped until a later search
+ENRICH_CACHE_TTL = int(os.getenv("ENRICH_CACHE_TTL", str(3 * 24 * 3600)))
+WEBSEARCH_LOCAL_FIRST = os.getenv("WEBSEARCH_LOCAL_FIRST", "0") == "1"  # answer from the Place table when coverage allows (places.py)
+PLACE_COVERAGE_TTL = int(os.getenv("PLACE_COVERAGE_TTL", str(7 * 24 * 3600)))  # a cell+keyword is re-fetched after this
+PLACE_MIN_RESULTS = int(os.getenv("PLACE_MIN_RESULTS", "8"))             # fewer local matches than this -> ask a provider
+PLACE_INDEX_TTL = int(os.getenv("PLACE_INDEX_TTL", "60"))                # seconds before a worker reloads its KD-tree
+PLACE_INDEX_MAX_PENDING = int(os.getenv("PLACE_INDEX_MAX_PENDING", "500"))  # places written since the build before an early reload
+WEBSEARCH_RANK_WEIGHTS = {}  # ranking.py feature -> weight overrides, e.g. {"distance": 1.0, "mood": 0}
+WEBSEARCH_GOOGLE_PAGES = int(os.getenv("WEBSEARCH_GOOGLE_PAGES", "3"))   # Google pages per search (20 each); later ones load in the background
+GEOCODE_PRECISION = int(os.getenv("GEOCODE_PRECISION", "4"))            # decimals kept for the cache cell (4 ≈ 11 m)
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "5000"))        # in-memory LRU cells per worker
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1"))                     # Nominatim calls/s per process; divide by worker count
+GEOCODE_MAX_WAIT_MS = int(os.getenv("GEOCODE_MAX_WAIT_MS", "250"))       # longer than this for a token -> 503, not a hung worker
+PLACE_PHOTO_DIR = os.getenv("PLACE_PHOTO_DIR", str(BASE_DIR / "var" / "place-photos"))  # resized photo cache (photos.py)
+PLACE_PHOTO_CACHE_MB = int(os.getenv("PLACE_PHOTO_CACHE_MB", "256"))                    # evict least recently served past this
+
+# Outbound HTTP (dining/outbound.py): one pooled session, shared timeouts, jittered retries
+OUTBOUND_CONNECT_TIMEOUT = float(os.getenv("OUTBOUND_CONNECT_TIMEOUT", "3.05"))
+OUTBOUND_READ_TIMEOUT = float(os.getenv("OUTBOUND_READ_TIMEOUT", "10"))
+OUTBOUND_RETRIES = int(os.getenv("OUTBOUND_RETRIES", "2"))         # extra attempts for idempotent calls
+OUTBOUND_BACKOFF_MS = int(os.getenv("OUTBOUND_BACKOFF_MS", "200"))  # jitter ceiling doubles per attempt
+OUTBOUND_POOL_SIZE = int(os.getenv("OUTBOUND_POOL_SIZE", "16"))     # keep-alive connections per host
+
+# Third-party endpoints. FAKE_PROVIDERS_URL points every provider at the local
+# stand-ins from `manage.py fake_providers` (dining/fakes.py) for offline runs and
+# load tests; a per-provider *_BASE_URL env var still wins.
+FAKE_PROVIDERS_URL = os.getenv("FAKE_PROVIDERS_URL", "").rstrip("/")
+
+def _provider_url(env, fake_path, real):
+    return os.getenv(env) or (f"{FAKE_PROVIDERS_URL}{fake_path}" if FAKE_PROVIDERS_URL else real)
+
+GOOGLE_PLACES_BASE_URL = _provider_url("GOOGLE_PLACES_BASE_URL", "/google/maps/api", "https://maps.googleapis.com/maps/api")
+TAVILY_BASE_URL = _provider_url("TAVILY_BASE_URL", "/tavily", "https://api.tavily.com")
+NOMINATIM_BASE_URL = _provider_url("NOMINATIM_BASE_URL", "/nominatim", "https://nominatim.openstreetmap.org")
+GEMINI_BASE_URL = _provider_url("GEMINI_BASE_URL", "/gemini", "")     # "" = client default
+OPENAI_BASE_URL = _provider_url("OPENAI_BASE_URL", "/openai/v1", "")  # "" = client default
+STRIPE_API_BASE = _provider_url("STRIPE_API_BASE", "/stripe", "")     # "" = client default
+if FAKE_PROVIDERS_URL:
+    # The fakes accept any key; code paths that skip a provider without one still run
+    GEMINI_API_KEY = GEMINI_API_KEY or "fake"
+    TAVILY_API_KEY = TAVILY_API_KEY or "fake"
+    GOOGLE_PLACES_API_KEY = GOOGLE_PLACES_API_KEY or "fake"
+    OPENAI_API_KEY = OPENAI_API_KEY or "fake"
+    STRIPE_SECRET_KEY = STRIPE_SECRET_KEY or "sk_test_fake"
+    STRIPE_WEBHOOK_SECRET = STRIPE_WEBHOOK_SECRET or "whsec_fake"
+
+AGENT_ENGINE = os.getenv("AGENT_ENGINE", "rules")  # "rules" (parse + recommender) or "graph" (LLM tool calling, needs OPENAI_API_KEY)
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "4"))  # LLM turns per message in the graph agent
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "4"))
+AGENT_MEMORY_TURNS = int(os.getenv("AGENT_MEMORY_TURNS", "12"))        # live messages per conversation; older ones are summarised
+AGENT_CONTEXT_TOKENS = int(os.getenv("AGENT_CONTEXT_TOKENS", "1500"))  # prompt budget for summary + recent turns
+
+# Recommender
+TASTE_HALF_LIFE_DAYS = float(os.getenv("TASTE_HALF_LIFE_DAYS", "30"))  # how fast old events fade from a taste profile
+RECOMMENDER_ENGINE_TTL = int(os.getenv("RECOMMENDER_ENGINE_TTL", "300"))  # seconds; other workers pick up menu edits within this
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "7"))
+POPULARITY_ROLLUP_INTERVAL = int(os.getenv("POPULARITY_ROLLUP_INTERVAL", "300"))  # seconds between runs with --loop
+POPULARITY_GAP_WINDOW = int(os.getenv("POPULARITY_GAP_WINDOW", "10000"))  # ids below the high-water mark re-checked for late commits
+COOCCURRENCE_MODEL_PATH = os.getenv("COOCCURRENCE_MODEL_PATH", str(BASE_DIR / "var" / "cooccurrence.npz"))
+RECOMMENDATION_SLATE_TTL = int(os.getenv("RECOMMENDATION_SLATE_TTL", str(24 * 3600)))  # seconds before a stored slate counts as a miss
+NLU_VOCAB_TTL = int(os.getenv("NLU_VOCAB_TTL", "300"))  # seconds; chat vocabulary is reloaded from Tag at least this often
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/